@@ -0,0 +1,41 @@
+#
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Flask-Implementierung des Digitalen Buchungsassistenten - Modul A und Modul B in einem Prozess
+# Beschreibung:
+# Startet beide Module als Blueprints in einer Flask-App über einem gemeinsamen Dienste-Container
+# (dpa_services): Konfiguration, LLM- und Embedding-Client, HANA-Verbindungen und Caches werden nur
+# einmal aufgebaut. Indexänderungen aus Modul A übernimmt Modul B im selben Prozess sofort.
+#
+# URLs:
+# - Modul B unter /            (Startseite, /process, /process_stream, /process_batch, /health, ...)
+# - Modul A unter /modulA      (/modulA/, /modulA/upload_pdf, /modulA/process_file, ...)
+#
+# Aufruf:
+# cd /home/user/projects/BE_AI_UC_digital_posting_assistant_build1/BE_AI_DPA_APP && python3 app_dpa.py
+# Port über DPA_PORT (Standard 5000); die Einzel-Apps app_modulA.py und app_modulB.py bleiben nutzbar.
+#
+
+import os, sys
+
+from flask import Flask
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import app_modulA
+import app_modulB
+
+
+# Gemeinsame Flask-App mit beiden Modulen
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = os.urandom(24)
+    app_modulB.init_app(app)
+    app_modulA.init_app(app, url_prefix='/modulA')
+    return app
+
+
+app = create_app()
+
+# Verarbeitung Hauptanwendung
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0', port=int(os.getenv("DPA_PORT", "5000")))
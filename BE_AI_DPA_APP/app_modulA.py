@@ -28,31 +28,54 @@
 #
 
 # Importiere die benötigten Module
-from flask import Flask, render_template, request, jsonify
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 from numpy import save
 from werkzeug.utils import secure_filename
-import os, json, sys
+import os, json, sys, time
 
 # Pfad hinzufügen, um dpa_modules zu importieren
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from dpa_modules.dpa_modulA import setup_hana_connection, setup_llm, setup_embedding_model, setup_hana_vectorstore
-from dpa_modules.dpa_modulA import load_env_variables, load_pdf, semantic_chunking, reload_embeddings
+from dpa_modules.dpa_modulA import setup_hana_vectorstore
+from dpa_modules.dpa_modulA import load_pdf, reload_embeddings_checkpointed, build_rule_index
+from dpa_modules.dpa_modulA import reindex_blue_green
+from dpa_modules.dpa_rule_index import count_rules
+from dpa_modules.dpa_bluegreen import read_pointer, rollback_active_table
+from dpa_modules.dpa_index_version import bump_index_version, read_index_version
+from dpa_modules.dpa_parse_cache import load_pdf_cached
+from dpa_modules.dpa_upload import StreamingUploadRequest, max_upload_bytes, save_upload
+from dpa_modules.dpa_ratelimit import RateLimitedEmbeddings, PRIORITY_BULK
+from dpa_modules.dpa_embedding_cache import CachedEmbeddings
+from dpa_modules.dpa_ledger import get_ledger, usage_scope, DEFAULT_GROUP_BY
+from dpa_modules.dpa_services import get_services
+from dpa_modules.dpa_profiling import admin_authorized, profiled, register_profiling
 
 
-# Flask-App initialisieren
-# Flask-Server für Modul A
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
+# Blueprint für Modul A (eigenständig über app unten oder gemeinsam mit Modul B in app_dpa.py)
+bp = Blueprint('modulA', __name__)
+# Gemeinsame Dienste (Konfiguration, Clients, Verbindungen, Caches) des Prozesses
+services = get_services()
 HISTORY_FILE_MODULA = "input_history_modulA.json"
 history_modula = []
 hana_database = None
+docs = None
+filename = None
+filepath = None
+file_hash = None
+# Extraktionsergebnisse je Dateiinhalt (SHA-256): unveränderte PDFs werden nicht erneut geparst
+parse_cache = services.parse_cache()
+# Dokumentenregister: Hash, Größe, Seiten, Chunks, Dauer, Modell und Indexversion je Datei
+registry = services.registry()
 
 # Speicherort für die hochgeladenen Dateien
 # Sicherstellen, dass der Upload-Ordner existiert   
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'pdf'}
+# Bereits vorhandene Uploads einmalig ins Register übernehmen
+registry.sync_folder(UPLOAD_FOLDER)
+# Blue/Green-Modus: Neuindexierung in eine Schattentabelle, Modul B bleibt währenddessen voll verfügbar
+BLUE_GREEN = os.getenv("DPA_BLUE_GREEN", "false").lower() in ("1", "true", "yes")
 
 # Hilfsfunktion zum Prüfen erlaubter Dateitypen
 def allowed_file(filename):
@@ -76,24 +99,30 @@ def save_history_modula():
         json.dump(history_modula, f, ensure_ascii=False, indent=2)
 
 # Route: Initialisierung System (Laden Umgebungsvariablen, Setup LLM, Embedding, HANA-VectorStore)
-@app.route('/initialize', methods=['POST'])
+@bp.route('/initialize', methods=['POST'])
 def initialize_system():
     global llm, embeddings, hana_connection, hana_database
     try:
-        config_file = os.path.expanduser("~/.aicore/config.json")
-        load_env_variables(config_file)
-        llm = setup_llm()
-        embeddings = setup_embedding_model()
-        hana_connection = setup_hana_connection()
+        # Konfiguration, LLM- und Embedding-Client aus dem gemeinsamen Dienste-Container
+        services.config()
+        llm = services.llm()
+        # Ingestion läuft mit niedriger Priorität über den gemeinsamen Ratenbegrenzer (Vorrang für Modul B)
+        embeddings = RateLimitedEmbeddings(services.embedding_model(), priority=PRIORITY_BULK)
+        # Gemeinsamer Embedding-Cache: unveränderte Texte werden nicht erneut an AI Core gesendet
+        embedding_cache = services.embedding_cache()
+        if embedding_cache is not None:
+            embeddings = CachedEmbeddings(embeddings, embedding_cache)
+        # Eigene Verbindung für die Ingestion (der Bulk-Writer schaltet autocommit um)
+        hana_connection = services.hana_connection("ingest")
         hana_database = setup_hana_vectorstore(embeddings, hana_connection)        
         return jsonify({"success": True, "message": "Initialisierung erfolgreich. Bitte PDF hochladen."})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
 # Route: Upload Datei (PDF)
-@app.route('/upload_pdf', methods=['POST'])
+@bp.route('/upload_pdf', methods=['POST'])
 def upload_pdf():
-    global docs, filename, filepath
+    global docs, filename, filepath, file_hash
     if 'file' not in request.files:
         return jsonify({"success": False, "message": "Keine Datei hochgeladen."})
     file = request.files['file']
@@ -101,49 +130,101 @@ def upload_pdf():
         return jsonify({"success": False, "message": "Keine Datei ausgewählt."})
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        # PDF laden
-        docs = load_pdf(filepath)
-        # Aktuelle Dateiliste nach Upload holen
-        files = os.listdir(app.config['UPLOAD_FOLDER'])
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        # Temporäre Datei atomar übernehmen; Hash und Größe wurden beim Empfang berechnet
+        file_hash, size = save_upload(file, filepath)
+        unchanged = is_unchanged(file_hash)
+        # PDF nur laden, wenn Arbeit ansteht (aus dem Parse-Cache, wenn der Inhalt bereits bekannt ist);
+        # bei unveränderten Dateien lädt process_file sie erst bei einer erzwungenen Verarbeitung
+        docs, cached = None, None
+        if not unchanged:
+            docs, file_hash, cached = load_pdf_cached(filepath, parse_cache, sha256=file_hash)
+        registry.record_upload(filename, file_hash, size, pages=len(docs) if docs is not None else None)
+        # Aktuelle Dateiliste aus dem Register
+        files = [doc["filename"] for doc in registry.documents()]
         return jsonify({
             "success": True,
-            "message": "PDF-Datei erfolgreich geladen.",
+            "message": "PDF-Datei unverändert, nichts zu tun." if unchanged else "PDF-Datei erfolgreich geladen.",
             "filename": filename,
-            "files": files
+            "files": files,
+            "sha256": file_hash,
+            "size": size,
+            "cached": cached,
+            "unchanged": unchanged
         })
     else:
         return jsonify({"success": False, "message": "Ungültiger Dateityp."})
+
+# Zu große Uploads: Abbruch beim Empfang, Antwort als JSON für die Oberfläche
+@bp.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    limit_mb = current_app.config['MAX_UPLOAD_BYTES'] // (1024 * 1024)
+    return jsonify({"success": False, "message": f"Datei zu groß (maximal {limit_mb} MB)."}), 413
     
+# Prüft, ob der Dateiinhalt bereits in der aktiven Vektortabelle steht
+def is_unchanged(sha256):
+    if not hana_database or not sha256:
+        return False
+    return registry.is_ingested(hana_database.table_name, sha256)
+
 # Index-Route: Zeigt Upload von Datei an
-@app.route('/')
+@bp.route('/')
 def index():
-    # Zeige aktuelle Dateiliste im Upload-Ordner an
-    files = os.listdir(app.config['UPLOAD_FOLDER']) if os.path.exists(app.config['UPLOAD_FOLDER']) else []
+    # Zeige aktuelle Dateiliste aus dem Dokumentenregister an (kein Lesen des Upload-Ordners)
+    documents = registry.documents()
+    files = [doc["filename"] for doc in documents]
     # Zeige den zuletzt hochgeladenen Dateinamen an, falls vorhanden
-    last_filename = files[-1] if files else None
-    return render_template('index_modulA.html', files=files, last_filename=last_filename)
+    last = registry.last_uploaded()
+    last_filename = last["filename"] if last else None
+    return render_template('index_modulA.html', files=files, documents=documents, last_filename=last_filename)
 
 
 # Route: Verarbeitung (Chunking & Upload in HANA-DB)
-@app.route('/process_file', methods=['POST'])
+@bp.route('/process_file', methods=['POST'])
+@profiled
 def process_file():
-    global hana_database, docs, embeddings, llm, filename, filepath
-    # filename = request.json.get('filename')
+    global hana_database, hana_connection, docs, embeddings, llm, filename, filepath, file_hash
+    if not hana_database:
+        return jsonify({"success": False, "message": "System nicht initialisiert."})
+    # Eine im Register bekannte Datei kann auch ohne erneuten Upload verarbeitet werden
+    requested = secure_filename((request.get_json(silent=True) or {}).get('filename') or '')
+    if requested and requested != filename and registry.get(requested):
+        requested_path = os.path.join(current_app.config['UPLOAD_FOLDER'], requested)
+        if os.path.exists(requested_path):
+            filename, filepath = requested, requested_path
+            docs, file_hash, _ = load_pdf_cached(filepath, parse_cache)
     if not filename:
         return jsonify({"success": False, "message": "Keine Datei angegeben."})
-    # filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     if not os.path.exists(filepath):
         return jsonify({"success": False, "message": "Datei nicht gefunden."})
-    if not hana_database:
-        return jsonify({"success": False, "message": "System nicht initialisiert."})
+    force = request.values.get('force', 'false').lower() in ("1", "true", "yes")
+    if not force and is_unchanged(file_hash):
+        return jsonify({"success": True, "unchanged": True, "message": "Datei unverändert, nichts zu tun."})
+    if docs is None:
+        docs, file_hash, _ = load_pdf_cached(filepath, parse_cache, sha256=file_hash)
+    blue_green = request.values.get('blue_green', str(BLUE_GREEN)).lower() in ("1", "true", "yes")
+    if blue_green:
+        return process_file_blue_green()
     try:
-        # Chuncks erstellen
-        text_chunks = semantic_chunking(docs, embeddings)
-        anzahl_chunks = len(text_chunks)
-        # Chunks in HANA-DB hochladen
-        reload_embeddings(hana_database, text_chunks)
+        start = time.perf_counter()
+        # Embedding-Tokens der Ingestion im Token- und Kostenbuch (dpa_ledger)
+        with usage_scope("ingest", route='/process_file', source=filename, pages=len(docs)) as usage:
+            # Chunks erstellen und batchweise mit Checkpoint in HANA-DB hochladen
+            # (nach einem Abbruch setzt ein erneuter Aufruf beim letzten geschriebenen Batch fort)
+            ingest = reload_embeddings_checkpointed(hana_database, embeddings, filepath, docs)
+            anzahl_chunks = ingest["chunks"]
+            # Strukturierten Konten-/Regelindex aus dem Handbuch extrahieren und speichern
+            # (die Vektortabelle wurde vollständig ersetzt, daher auch alle Regeln ersetzen)
+            rule_rows = build_rule_index(hana_connection, hana_database, docs, source=filename, replace_all=True)
+            anzahl_regeln = count_rules(rule_rows)
+            usage.tag(chunks=anzahl_chunks)
+        registry.record_ingest(filename, file_hash, hana_database.table_name, chunks=anzahl_chunks,
+                               rules=anzahl_regeln, seconds=round(time.perf_counter() - start, 2), pages=len(docs))
+        # Indexversion erhöhen: Modul B baut Retriever, Regelindex und Caches neu auf
+        # (im selben Prozess sofort, sonst beim nächsten Abfragen der Versionstabelle)
+        version = bump_index_version(hana_connection, str(os.getenv('hdb_table_name')), hana_database.table_name,
+                                     source=filename)
+        services.publish_index_change(hana_database.table_name, version)
         # --- History aktualisieren ---
         global history_modula
         if filename not in history_modula:
@@ -152,20 +233,106 @@ def process_file():
         # ---
         return jsonify({
             "success": True,
-            "message": f"Verarbeitung abgeschlossen. {anzahl_chunks} Chunks wurden in HANA-Datenbank hochgeladen.",
-            "anzahl_chunks": anzahl_chunks
+            "message": f"Verarbeitung abgeschlossen{' (fortgesetzt)' if ingest['resumed'] else ''}. {anzahl_chunks} Chunks wurden in HANA-Datenbank hochgeladen, {anzahl_regeln} Kontierungsregeln indexiert.",
+            "anzahl_chunks": anzahl_chunks,
+            "anzahl_regeln": anzahl_regeln,
+            "batches": ingest["batches"],
+            "embedded_batches": ingest["embedded_batches"],
+            "index_version": version
         })
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
+# Verarbeitung im Blue/Green-Modus: neue Generation aufbauen, prüfen und atomar umschalten
+def process_file_blue_green():
+    try:
+        start = time.perf_counter()
+        with usage_scope("ingest", route='/process_file', source=filename, pages=len(docs), blue_green=True) as usage:
+            result = reindex_blue_green(hana_connection, embeddings, filepath, docs, source=filename)
+            usage.tag(chunks=result["chunks"], switched=result["switched"])
+        anzahl_regeln = count_rules(result["rule_rows"])
+        if not result["switched"]:
+            return jsonify({
+                "success": False,
+                "message": f"Prüfung der neuen Generation {result['table']} fehlgeschlagen, bisheriger Index bleibt aktiv: "
+                           + " ".join(result["validation"]["errors"]),
+                "validation": result["validation"]
+            })
+        global hana_database
+        registry.record_ingest(filename, file_hash, result["table"], chunks=result["chunks"], rules=anzahl_regeln,
+                               seconds=round(time.perf_counter() - start, 2), pages=len(docs))
+        # Weitere Verarbeitungen schreiben in die nun aktive Generation
+        hana_database = setup_hana_vectorstore(embeddings, hana_connection)
+        services.publish_index_change(hana_database.table_name, result["pointer"]["index_version"])
+        global history_modula
+        if filename not in history_modula:
+            history_modula.append(filename)
+            save_history_modula()
+        return jsonify({
+            "success": True,
+            "message": f"Verarbeitung abgeschlossen. {result['chunks']} Chunks in {result['table']} geprüft und aktiviert, "
+                       f"{anzahl_regeln} Kontierungsregeln indexiert. Vorherige Generation: {result['pointer']['previous_table']}.",
+            "anzahl_chunks": result["chunks"],
+            "anzahl_regeln": anzahl_regeln,
+            "batches": result["batches"],
+            "embedded_batches": result["embedded_batches"],
+            "validation": result["validation"],
+            "pointer": result["pointer"]
+        })
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)})
+
+# Route: Auswertung des Token- und Kostenbuchs (dpa_ledger), Parameter und Admin-Token wie /usage in Modul B
+@bp.route('/usage', methods=['GET'])
+def usage_route():
+    if not admin_authorized(request):
+        return jsonify({"success": False, "message": "Nicht berechtigt."}), 403
+    try:
+        top = max(0, int(request.args.get('top', 10)))
+    except ValueError:
+        return jsonify({"success": False, "message": "Parameter top muss eine ganze Zahl sein."}), 400
+    group_by = tuple(filter(None, request.args.get('group_by', ",".join(DEFAULT_GROUP_BY)).split(",")))
+    return jsonify(get_ledger().report(since=request.args.get('since'), group_by=group_by, top=top))
+
+# Route: Einträge des Dokumentenregisters
+@bp.route('/documents', methods=['GET'])
+def documents_route():
+    return jsonify({"success": True, "documents": registry.documents()})
+
+# Route: aktive Generation der Vektortabelle (Zeigertabelle)
+@bp.route('/index_status', methods=['GET'])
+def index_status():
+    if not hana_database:
+        return jsonify({"success": False, "message": "System nicht initialisiert."})
+    try:
+        alias = str(os.getenv('hdb_table_name'))
+        return jsonify({"success": True, "pointer": read_pointer(hana_connection, alias),
+                        "index_version": read_index_version(hana_connection, alias)})
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)})
+
+# Route: sofortiger Rückfall auf die vorherige Generation
+@bp.route('/rollback_index', methods=['POST'])
+def rollback_index():
+    global hana_database
+    if not hana_database:
+        return jsonify({"success": False, "message": "System nicht initialisiert."})
+    try:
+        pointer = rollback_active_table(hana_connection)
+        hana_database = setup_hana_vectorstore(embeddings, hana_connection)
+        services.publish_index_change(hana_database.table_name, pointer["index_version"])
+        return jsonify({"success": True, "message": f"Aktive Tabelle: {pointer['active_table']}.", "pointer": pointer})
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)})
+
 # Route: History laden (inkl. Dateiliste)
-@app.route('/history_modula', methods=['GET'])
+@bp.route('/history_modula', methods=['GET'])
 def get_history_modula():
     load_history_modula()
     return render_template('index_modulA.html', history_modula=history_modula if history_modula is not None else [])
 
 # Route: History speichern (optional, falls benötigt)
-@app.route('/save_history_modula', methods=['POST'])
+@bp.route('/save_history_modula', methods=['POST'])
 def save_history_modula_route():
     global history_modula
     data = request.get_json()
@@ -176,15 +343,34 @@ def save_history_modula_route():
     return jsonify({"success": False, "message": "Keine History-Daten erhalten."})
 
 # Route: History laden (für AJAX-Anfrage)
-@app.route('/load_history_modula', methods=['GET'])
+@bp.route('/load_history_modula', methods=['GET'])
 def load_history_modula_route():
     load_history_modula()
     return jsonify({"success": True, "history_modula": history_modula if history_modula is not None else []})
 
-# Verarbeitung Hauptanwendung
-if __name__ == '__main__':
+# Registriert Modul A in einer Flask-App (eigenständig oder in app_dpa.py unter einem Präfix)
+def init_app(flask_app, url_prefix=None):
+    flask_app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    # Größenbegrenzung je Datei (DPA_MAX_UPLOAD_MB) und je Anfrage (zzgl. Multipart-Overhead)
+    flask_app.config['MAX_UPLOAD_BYTES'] = max_upload_bytes()
+    flask_app.config['MAX_CONTENT_LENGTH'] = flask_app.config['MAX_UPLOAD_BYTES'] + 1024 * 1024
+    # Uploads werden gestreamt in den Upload-Ordner geschrieben und dabei gehasht (dpa_upload)
+    flask_app.request_class = StreamingUploadRequest
+    flask_app.config.setdefault('STREAMING_UPLOAD_ENDPOINTS', set()).add('modulA.upload_pdf')
+    flask_app.register_blueprint(bp, url_prefix=url_prefix)
+    # Admin-Routen für Profile einzelner Anfragen (/admin/profiling, /admin/profiles)
+    register_profiling(flask_app)
     # Stelle sicher, dass die History für Modul A beim Start geladen wird
     load_history_modula()
+
+# Flask-App initialisieren
+# Flask-Server für Modul A
+app = Flask(__name__)
+app.secret_key = os.urandom(24)
+init_app(app)
+
+# Verarbeitung Hauptanwendung
+if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
     # Speichere die History für Modul A beim Beenden der App
     save_history_modula()
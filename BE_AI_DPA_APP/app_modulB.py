@@ -30,10 +30,13 @@
 # python3 app_modulB.py
 
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Blueprint, Flask, render_template, request, jsonify, session, Response, stream_with_context
+import hashlib
+import io
 import json
 import os
 import sys
+import time
 from datetime import datetime
 
 # NEU: RetrievalQA importieren
@@ -43,27 +46,69 @@ from langchain.chains import RetrievalQA
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # NEU: Importiere die benötigten Module
 from dpa_modules.dpa_modulB import (
-    load_env_variables, 
-    init_llm, 
-    init_embedding_model, 
     HanaDB, 
     prompt_template_html,
-    create_qa_chain
+    prompt_template_json,
+    create_qa_chain,
+    load_rule_index,
+    run_posting_pipeline
 )
+from dpa_modules.dpa_rule_index import RuleAwareRetriever
+from dpa_modules.dpa_model_router import ModelRouter
+from dpa_modules.dpa_singleflight import SingleFlight, normalize_question
+from dpa_modules.dpa_resilience import ResiliencePolicy
+from dpa_modules.dpa_ratelimit import RateLimitedEmbeddings, get_rate_limiter, PRIORITY_INTERACTIVE
+from dpa_modules.dpa_embedding_cache import CachedEmbeddings
+from dpa_modules.dpa_prefetch import RetrievalPrefetcher
+from dpa_modules.dpa_warmup import AnswerCache, WarmupJob, load_warmup_cases
+from dpa_modules.dpa_ledger import get_ledger, usage_scope, DEFAULT_GROUP_BY
+from dpa_modules.dpa_tracing import chain_verbose, get_tracer, trace_request, waterfall
+from dpa_modules.dpa_batch import read_cases, load_completed, run_batch, summarize, batch_lock, BatchLocked
+from dpa_modules.dpa_bluegreen import ActiveTableWatcher, resolve_active_table
+from dpa_modules.dpa_index_version import IndexVersionWatcher
+from dpa_modules.dpa_snapshot import load_snapshot_store
+from dpa_modules.dpa_services import get_services
+from dpa_modules.dpa_profiling import admin_authorized, profiled, register_profiling
 
-# Initialisiere Flask
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
+# Blueprint für Modul B (eigenständig über app unten oder gemeinsam mit Modul A in app_dpa.py)
+bp = Blueprint('modulB', __name__)
+# Gemeinsame Dienste (Konfiguration, Clients, Verbindungen) des Prozesses
+services = get_services()
 
 # Speicherort für die Eingabehistorie
 HISTORY_FILE = "input_history_modulB.json"
+# Speicherort für Ergebnisse der Stapelverarbeitung (je Batch eine JSONL-Datei, Grundlage für das Fortsetzen)
+BATCH_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_results")
+# Optionaler Snapshot der Vektortabelle (dpa_snapshot): Kaltstart per mmap statt Retrieval über HANA
+SNAPSHOT_DIR = os.getenv("DPA_SNAPSHOT_DIR")
+# Vorwärmung auch mit LLM-Antworten (sonst nur Embedding und Retrieval, siehe dpa_warmup)
+WARMUP_ANSWERS = os.getenv("DPA_WARMUP_ANSWERS", "false").strip().lower() in ("1", "true", "yes", "on")
 
 # Globale Variablen für die Anwendung
 input_text = ""
 history = []
 qa_chain = None
+qa_chain_json = None
 llm = None
 hana_database = None
+hana_connection = None
+embeddings = None
+# Beobachtet die Zeigertabelle (Blue/Green-Neuindexierung in Modul A)
+table_watcher = None
+# Beobachtet die Indexversion (jede abgeschlossene Ingestion in Modul A) und die aktuell geladene Version
+index_watcher = None
+index_version = None
+rule_index = None
+model_router = None
+count_retrieved_documents = 10
+# Gleichzeitige identische Anfragen teilen sich Retrieval und LLM-Aufruf
+single_flight = SingleFlight()
+# Timeouts, Wiederholungen und Circuit Breaker für AI Core und HANA (prozessweit geteilt)
+resilience = ResiliencePolicy()
+# Vorab abgerufene Retrieval-Ergebnisse aus /prefetch (während der Eingabe)
+prefetcher = RetrievalPrefetcher()
+# Fertige Ergebnisse je Eingabe, Vektortabelle und Indexversion (aus Anfragen und Vorwärmung)
+answer_cache = AnswerCache()
 
 # Lade die Eingabehistorie
 def load_history():
@@ -81,22 +126,133 @@ def save_history():
         json.dump(history, f, ensure_ascii=False, indent=2)
 
 # Hauptroute - Startseite
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index_modulB.html', history=history)
 
+# Führt die Pipeline für eine Eingabe aus; gleichzeitige identische Eingaben werden zusammengefasst
+# (Tokens und Dauer werden je Ausführung im Token- und Kostenbuch gebucht, eine Stichprobe als Trace
+# aufgezeichnet; force_trace zeichnet immer auf)
+def run_coalesced(flight, text, route='/process', force_trace=False):
+    table_name, version = hana_database.table_name, index_version
+    with usage_scope("process", route=route, template="html", cache="miss", input=text[:200]) as usage, \
+            trace_request("process", force=force_trace, route=route, input_chars=len(text), vector_table=table_name,
+                          index_version=version) as trace:
+        result = run_posting_pipeline(text, qa_chain, hana_database, rule_index, count_retrieved_documents,
+                                      model_router=model_router, callbacks=[flight.callback_handler()], resilience=resilience,
+                                      prefetched=lambda case: prefetcher.lookup(case, table_name, version, count_retrieved_documents))
+        usage.tag(pipeline=result["route"])
+        if trace is not None:
+            trace.attrs["pipeline"] = result["route"]
+            usage.tag(trace_id=trace.trace_id)
+    answer_cache.put(text, table_name, version, result)
+    return dict(result, trace_id=trace.trace_id) if trace is not None else result
+
+# Header "X-DPA-Trace: 1" erzwingt die Aufzeichnung der Anfrage (dpa_tracing)
+def trace_forced():
+    return request.headers.get('X-DPA-Trace', '').lower() in ("1", "true", "yes")
+
+# Bucht eine Anfrage ohne eigene AI-Core-Aufrufe (Antwort-Cache oder an eine laufende Anfrage angehängt)
+def record_served(route, text, cache, seconds):
+    get_ledger().append({"kind": "request", "job": "process", "route": route, "template": "html", "cache": cache,
+                         "input": text[:200], "calls": 0, "tokens": 0, "seconds": round(seconds, 3)})
+
+# Wärmt Embedding-Cache, Retrieval-Spiegel und (mit DPA_WARMUP_ANSWERS) Antwort-Cache für eine Eingabe vor;
+# läuft im Hintergrund mit niedriger Priorität (WarmupJob)
+def warm_input(text):
+    database, chain, rules, version = hana_database, qa_chain, rule_index, index_version
+    if database is None:
+        return
+    with usage_scope("warmup", route="warmup", template="html", cache="miss", input=text[:200]):
+        prefetcher.prefetch(text, database, rules, count_retrieved_documents, resilience=resilience,
+                            index_version=version, persistent=True, wait=True)
+        if WARMUP_ANSWERS and answer_cache.get(text, database.table_name, version) is None:
+            result = run_posting_pipeline(text, chain, database, rules, count_retrieved_documents,
+                                          model_router=model_router, resilience=resilience,
+                                          prefetched=lambda case: prefetcher.lookup(case, database.table_name, version,
+                                                                                    count_retrieved_documents))
+            answer_cache.put(text, database.table_name, version, result)
+
+# Vorwärmung aus Eingabehistorie und Standard-Geschäftsfällen (DPA_WARMUP_CASES)
+warmup = WarmupJob(warm_input, lambda: load_warmup_cases(HISTORY_FILE))
+
+# Baut Vektorspeicher, Regelindex und Ketten für eine Vektortabelle auf und aktiviert sie
+# (laufende Anfragen arbeiten mit den bisherigen Objekten zu Ende)
+def activate_vector_table(vector_table_name, version=None):
+    global qa_chain, qa_chain_json, hana_database, rule_index, index_version
+    # Passender Snapshot (gleiche Tabelle, gleiches Embedding-Modell, aktuelle Indexversion) wird lokal gemappt, sonst HANA
+    database = load_snapshot_store(SNAPSHOT_DIR, embeddings, vector_table_name, index_version=version)
+    rules = database.rule_index() if database is not None else None
+    if database is None:
+        database = HanaDB(embedding=embeddings, connection=hana_connection, table_name=vector_table_name)
+    
+    # Strukturierten Konten-/Regelindex aus Modul A laden
+    if not rules:
+        rules = load_rule_index(hana_connection, vector_table_name)
+    
+    # RetrievalQA Chain erstellen (passende Regelzeilen werden dem Kontext vorangestellt)
+    chain_type_kwargs = {"prompt": prompt_template_html}
+    retriever = database.as_retriever(search_kwargs={"k": count_retrieved_documents})
+    if rules:
+        retriever = RuleAwareRetriever(base_retriever=retriever, rule_index=rules)
+    # Keine Ausgabe der formatierten Prompts je Anfrage mehr (nur mit DPA_CHAIN_VERBOSE); Zeiten und Größen über /traces
+    chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, chain_type="stuff", chain_type_kwargs=chain_type_kwargs, verbose=chain_verbose())
+    # Gleiche Kette mit JSON-Antwortformat für die Stapelverarbeitung
+    chain_json = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, chain_type="stuff", chain_type_kwargs={"prompt": prompt_template_json}, verbose=chain_verbose())
+    
+    hana_database, rule_index, qa_chain, qa_chain_json = database, rules, chain, chain_json
+    if version is not None:
+        index_version = version
+    # Vorab abgerufene Ergebnisse beziehen sich auf den bisherigen Index; Caches für den neuen Index vorwärmen
+    prefetcher.clear()
+    warmup.start(f"{vector_table_name} (index version {index_version})")
+    print(f"Active vector table: {vector_table_name} (index version {index_version})")
+
+# Wechselt auf die neue aktive Tabelle, wenn Modul A eine neue Generation aktiviert hat, und baut
+# Retriever, Regelindex und Ketten neu auf, wenn Modul A eine neue Indexversion gemeldet hat
+def refresh_vector_table():
+    if table_watcher is None:
+        return
+    try:
+        table = table_watcher.poll()
+        change = index_watcher.poll() if index_watcher is not None else None
+        if change and not table:
+            # Neue Version ohne (schon bemerkte) Umschaltung: Zeiger sofort neu lesen
+            table = resolve_active_table(hana_connection, table_watcher.alias)
+            table_watcher.active_table = table
+        if table:
+            activate_vector_table(table, change["version"] if change else None)
+    except Exception as e:
+        print(f"Vector table not refreshed: {e}")
+
+# Übernimmt eine Indexänderung aus Modul A im selben Prozess (dpa_services), ohne auf die Versions- und
+# Zeigertabelle zu warten
+def on_index_change(vector_table_name, version=None):
+    if embeddings is None:
+        return
+    activate_vector_table(vector_table_name, version)
+    if table_watcher is not None:
+        table_watcher.active_table = vector_table_name
+    if index_watcher is not None:
+        index_watcher.acknowledge(version)
+
+services.subscribe(on_index_change)
+
+# Füge die Eingabe zur Historie hinzu
+def add_to_history(text):
+    if text and text not in history:
+        history.append(text)
+        save_history()
+
 # Route für die Verarbeitung der Eingabe
-@app.route('/process', methods=['POST'])
+@bp.route('/process', methods=['POST'])
+@profiled
 def process_input():
-    global input_text, history, qa_chain
+    global input_text, history, qa_chain, hana_database, rule_index, model_router
     
     # Hole die Eingabe aus dem Formular
     input_text = request.form.get('input_text', '')
-    
-    # Füge die Eingabe zur Historie hinzu
-    if input_text and input_text not in history:
-        history.append(input_text)
-        save_history()
+    add_to_history(input_text)
     
     # Wenn qa_chain nicht initialisiert wurde, Fehlermeldung zurückgeben
     if not qa_chain:
@@ -104,14 +260,29 @@ def process_input():
             "success": False,
             "message": "Das System wurde noch nicht initialisiert. Bitte starten Sie die Anwendung neu."
         })
+    refresh_vector_table()
     
     try:
-        # Führe die Anfrage durch
-        answer = qa_chain.run(input_text)
+        # Führe die Anfrage durch (Schnellpfad, Domänen-Gate oder RAG mit LLM der gewählten Modell-Stufe)
+        text = input_text
+        start = time.perf_counter()
+        result = answer_cache.get(text, hana_database.table_name, index_version)
+        cached, coalesced = result is not None, False
+        if not cached:
+            force_trace = trace_forced()
+            result, coalesced = single_flight.run(normalize_question(text),
+                                                  lambda flight: run_coalesced(flight, text, force_trace=force_trace))
+        if cached or coalesced:
+            record_served('/process', text, "answer" if cached else "coalesced", time.perf_counter() - start)
         return jsonify({
             "success": True,
             "input": input_text,
-            "output": answer
+            "output": result["output"],
+            "route": result["route"],
+            "routing": [case.get("routing") for case in result["cases"]],
+            "coalesced": coalesced,
+            "cached": cached,
+            "trace_id": result.get("trace_id")
         })
     except Exception as e:
         return jsonify({
@@ -119,49 +290,241 @@ def process_input():
             "message": f"Fehler bei der Verarbeitung: {str(e)}"
         })
 
+# Route für spekulatives Retrieval während der Eingabe (von main.js nach einer Tipp-Pause aufgerufen)
+# Ruft Embedding und Dokumente der Teileingabe ab; beim Absenden eines ähnlichen Textes beginnt die Pipeline beim LLM.
+@bp.route('/prefetch', methods=['POST'])
+def prefetch_input():
+    if not qa_chain:
+        return jsonify({"success": False, "message": "Das System wurde noch nicht initialisiert."})
+    refresh_vector_table()
+    try:
+        with usage_scope("prefetch", route='/prefetch'):
+            result = prefetcher.prefetch(request.form.get('input_text', ''), hana_database, rule_index,
+                                         count_retrieved_documents, resilience=resilience, index_version=index_version)
+        return jsonify(dict(result, success=True))
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)})
+
+# Route für die Verarbeitung mit Token-Stream (Server-Sent Events)
+# Jede Zeile "data: {...}" enthält ein Token ({"token": ...}) bzw. zum Schluss das Ergebnis
+# ({"done": true, "result": {...}}); identische laufende Anfragen hängen sich an denselben Stream.
+@bp.route('/process_stream', methods=['POST'])
+def process_input_stream():
+    text = request.form.get('input_text', '')
+    add_to_history(text)
+    
+    if not qa_chain:
+        return jsonify({
+            "success": False,
+            "message": "Das System wurde noch nicht initialisiert. Bitte starten Sie die Anwendung neu."
+        })
+    refresh_vector_table()
+    
+    # Bereits beantwortet (Anfrage oder Vorwärmung): nur das Ergebnis senden
+    cached = answer_cache.get(text, hana_database.table_name, index_version)
+    if cached is not None:
+        record_served('/process_stream', text, "answer", 0.0)
+        event = {"done": True, "result": cached, "coalesced": False, "cached": True}
+        return Response(f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n", mimetype="text/event-stream")
+    
+    force_trace = trace_forced()
+    flight, coalesced = single_flight.start(normalize_question(text),
+                                            lambda flight: run_coalesced(flight, text, '/process_stream', force_trace))
+    if coalesced:
+        record_served('/process_stream', text, "coalesced", 0.0)
+    
+    def generate():
+        for event in flight.events():
+            if event.get("done"):
+                event["coalesced"] = coalesced
+            yield f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
+# Route für die Stapelverarbeitung (CSV oder JSONL, Ergebnis als JSONL-Stream mit prompt_template_json)
+# Die Batch-ID ergibt sich aus dem Inhalt der Eingabe (oder Parameter batch_id); ein erneuter Aufruf mit
+# derselben Eingabe setzt einen unterbrochenen Lauf fort und verarbeitet nur die noch offenen Geschäftsfälle.
+@bp.route('/process_batch', methods=['POST'])
+def process_batch():
+    if not qa_chain_json:
+        return jsonify({
+            "success": False,
+            "message": "Das System wurde noch nicht initialisiert. Bitte starten Sie die Anwendung neu."
+        })
+    refresh_vector_table()
+    
+    upload = request.files.get('file')
+    content = (upload.read() if upload else request.get_data()).decode("utf-8-sig")
+    fmt = request.values.get('format')
+    if not fmt and upload and upload.filename:
+        fmt = "jsonl" if upload.filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+    try:
+        cases = read_cases(io.StringIO(content), fmt)
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Ungültige Eingabe: {str(e)}"})
+    
+    # Parallelität je Batch höchstens DPA_BATCH_WORKERS
+    max_workers = int(os.getenv("DPA_BATCH_WORKERS", "4"))
+    try:
+        workers = max(1, min(int(request.values.get('workers', max_workers)), max_workers))
+    except ValueError:
+        return jsonify({"success": False, "message": "Parameter workers muss eine ganze Zahl sein."}), 400
+    
+    batch_id = request.values.get('batch_id') or hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    os.makedirs(BATCH_FOLDER, exist_ok=True)
+    output_path = os.path.join(BATCH_FOLDER, f"{secure_batch_id(batch_id)}.jsonl")
+    # Ein Lauf je Batch-ID; die Sperre gilt bis zum Ende der gestreamten Antwort
+    try:
+        lock = batch_lock(output_path).acquire()
+    except BatchLocked:
+        return jsonify({"success": False, "message": f"Batch {batch_id} wird bereits verarbeitet."}), 409
+    # Bis die Antwort steht, gibt jeder Fehler die Sperre selbst frei (danach call_on_close)
+    try:
+        completed = load_completed(output_path)
+        
+        def pipeline(text):
+            return run_posting_pipeline(text, qa_chain_json, hana_database, rule_index, count_retrieved_documents,
+                                        model_router=model_router, resilience=resilience, output_format="json")
+        
+        def generate():
+            records = []
+            with open(output_path, "a", encoding="utf-8") as f:
+                for record in run_batch(cases, pipeline, workers, completed):
+                    line = json.dumps(record, ensure_ascii=False)
+                    f.write(line + "\n")
+                    f.flush()
+                    records.append(record)
+                    yield line + "\n"
+            summary = summarize(records, skipped=len(cases) - len(records))
+            summary["batch_id"] = batch_id
+            yield json.dumps(summary, ensure_ascii=False) + "\n"
+        
+        response = Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers={"X-Batch-Id": batch_id})
+        response.call_on_close(lock.release)
+    except Exception:
+        lock.release()
+        raise
+    return response
+
+# Route für den Abruf aller Ergebnisse eines Batches (inkl. früherer, fortgesetzter Läufe)
+@bp.route('/process_batch/<batch_id>', methods=['GET'])
+def get_batch_results(batch_id):
+    output_path = os.path.join(BATCH_FOLDER, f"{secure_batch_id(batch_id)}.jsonl")
+    if not os.path.exists(output_path):
+        return jsonify({"success": False, "message": "Batch nicht gefunden."}), 404
+    with open(output_path, "r", encoding="utf-8") as f:
+        return Response(f.read(), mimetype="application/x-ndjson")
+
+# Batch-IDs werden als Dateiname verwendet
+def secure_batch_id(batch_id):
+    return "".join(c for c in batch_id if c.isalnum() or c in "-_")[:64] or "batch"
+
 # Route für den Abruf der Historie
-@app.route('/history')
+@bp.route('/history')
 def get_history():
     return jsonify({"history": history})
 
+# Route für die Auswertung des Modell-Routings (Stufe, Anzahl, mittlere LLM-Latenz)
+@bp.route('/routing')
+def get_routing():
+    if not model_router:
+        return jsonify({"tiers": {}, "recent": []})
+    return jsonify(model_router.stats())
+
+# Route für den Zustand der Dienste (Circuit Breaker, p95-Latenz, gestaffelte Zweitanfragen)
+@bp.route('/health')
+def get_health():
+    return jsonify({
+        "initialized": qa_chain is not None,
+        "vector_table": hana_database.table_name if hana_database is not None else None,
+        "vector_source": "snapshot" if hasattr(hana_database, "manifest") else "hana",
+        "index_version": index_version,
+        "prefetch": prefetcher.stats(),
+        "answer_cache": answer_cache.stats(),
+        "warmup": warmup.status(),
+        "services": resilience.status(),
+        "rate_limits": {name: get_rate_limiter(name).status() for name in ("embedding", "llm")}
+    })
+
+# Route für die Auswertung des Token- und Kostenbuchs (dpa_ledger)
+# Parameter: since (ISO-Zeitpunkt), group_by (kommagetrennt, Standard kind,route,model,template,cache), top;
+# nur mit Admin-Token (X-DPA-Admin-Token), da top_cost/slowest den Anfang der Eingaben enthalten
+@bp.route('/usage')
+def get_usage():
+    if not admin_authorized(request):
+        return jsonify({"success": False, "message": "Nicht berechtigt."}), 403
+    try:
+        top = max(0, int(request.args.get('top', 10)))
+    except ValueError:
+        return jsonify({"success": False, "message": "Parameter top muss eine ganze Zahl sein."}), 400
+    group_by = tuple(filter(None, request.args.get('group_by', ",".join(DEFAULT_GROUP_BY)).split(",")))
+    return jsonify(get_ledger().report(since=request.args.get('since'), group_by=group_by, top=top))
+
+# Routen für aufgezeichnete Traces (dpa_tracing): Übersicht, einzelner Trace als JSON und als Wasserfall
+@bp.route('/traces')
+def get_traces():
+    tracer = get_tracer()
+    try:
+        # Höchstens so viele, wie der Ringpuffer hält (DPA_TRACE_BUFFER)
+        limit = max(0, min(int(request.args.get('limit', 50)), tracer.buffer.maxlen))
+    except ValueError:
+        return jsonify({"success": False, "message": "Parameter limit muss eine ganze Zahl sein."}), 400
+    return jsonify({"sample_rate": tracer.sample_rate, "traces": tracer.recent(limit)})
+
+@bp.route('/traces/<trace_id>')
+def get_trace(trace_id):
+    trace = get_tracer().get(trace_id)
+    if trace is None:
+        return jsonify({"success": False, "message": "Trace nicht gefunden."}), 404
+    return jsonify(trace)
+
+@bp.route('/traces/<trace_id>/waterfall')
+def get_trace_waterfall(trace_id):
+    trace = get_tracer().get(trace_id)
+    if trace is None:
+        return jsonify({"success": False, "message": "Trace nicht gefunden."}), 404
+    return render_template('trace_modulB.html', trace=trace, rows=waterfall(trace))
+
+# Route zum erneuten Starten der Vorwärmung (z.B. nach Pflege der Standard-Geschäftsfälle)
+@bp.route('/warmup', methods=['POST'])
+def start_warmup():
+    if not qa_chain:
+        return jsonify({"success": False, "message": "Das System wurde noch nicht initialisiert."})
+    return jsonify({"success": warmup.start("manual"), "warmup": warmup.status()})
+
 # Route zum Initialisieren des Systems
-@app.route('/initialize', methods=['POST'])
+@bp.route('/initialize', methods=['POST'])
 def initialize_system():
-    global qa_chain, llm, hana_database
+    global llm, embeddings, hana_connection, table_watcher, index_watcher, model_router
     
     # Hier würde die Initialisierungslogik aus BE_AI_DPA_APP_v1.py stehen
     # In einer echten Implementierung würde dies möglicherweise async passieren
     
     try:
-        # Umgebungsvariablen laden
-        config_file = "/home/user/.aicore/config.json"
-        env_variables = load_env_variables(config_file)
+        # Umgebungsvariablen laden (einmal je Prozess, gemeinsamer Dienste-Container)
+        services.config()
         
-        # LLM und Embedding-Modelle initialisieren
-        aicore_model_name = str(os.getenv("AICORE_DEPLOYMENT_MODEL"))
-        llm = init_llm(model_name=aicore_model_name, max_tokens=4000, temperature=0)
+        # LLM und Embedding-Modelle initialisieren (max_tokens=4000, temperature=0)
+        llm = services.llm()
         
-        # HANA-DB und Vector Store initialisieren
-        ai_core_embedding_model_name = str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING"))
-        embeddings = init_embedding_model(ai_core_embedding_model_name)
+        # Interaktive Abfragen haben beim gemeinsamen Ratenbegrenzer Vorrang vor der Ingestion aus Modul A
+        embeddings = RateLimitedEmbeddings(services.embedding_model(), priority=PRIORITY_INTERACTIVE)
+        # Gemeinsamer Embedding-Cache: vorab (Prefetch) oder früher eingebettete Eingaben werden nicht erneut gesendet
+        embedding_cache = services.embedding_cache()
+        if embedding_cache is not None:
+            embeddings = CachedEmbeddings(embeddings, embedding_cache)
         
-        # Verbindung zur HANA-DB herstellen
-        from hdbcli import dbapi
-        hdb_host_address = str(os.getenv("hdb_host_address"))
-        hdb_user = str(os.getenv("hdb_user"))
-        hdb_password = str(os.getenv("hdb_password"))
-        hdb_port = int(os.getenv("hdb_port"))
-        hana_connection = dbapi.connect(address=hdb_host_address, port=hdb_port, user=hdb_user, password=hdb_password, autocommit=True)
+        # Verbindung zur HANA-DB (autocommit=True)
+        hana_connection = services.hana_connection()
         
-        # Vector Store initialisieren
-        vector_table_name = str(os.getenv("hdb_table_name"))
-        hana_database = HanaDB(embedding=embeddings, connection=hana_connection, table_name=vector_table_name)
+        # Modell-Routing: einfache Geschäftsfälle über das kleine Deployment (falls konfiguriert)
+        model_router = ModelRouter(default_llm=llm)
         
-        # RetrievalQA Chain erstellen
-        count_retrieved_documents = 10
-        chain_type_kwargs = {"prompt": prompt_template_html}
-        retriever = hana_database.as_retriever(search_kwargs={"k": count_retrieved_documents})
-        qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, chain_type="stuff", chain_type_kwargs=chain_type_kwargs, verbose=True)
+        # Vector Store, Regelindex und Ketten für die aktive Tabelle (Zeigertabelle, sonst hdb_table_name);
+        # danach startet die Vorwärmung
+        index_watcher = IndexVersionWatcher(hana_connection, str(os.getenv("hdb_table_name")))
+        table_watcher = ActiveTableWatcher(hana_connection, str(os.getenv("hdb_table_name")))
+        activate_vector_table(table_watcher.active_table, index_watcher.version)
         
         return jsonify({
             "success": True,
@@ -173,10 +536,20 @@ def initialize_system():
             "message": f"Fehler bei der Initialisierung: {str(e)}"
         })
 
-# Starte die Anwendung, wenn das Skript direkt ausgeführt wird
-if __name__ == '__main__':
+# Registriert Modul B in einer Flask-App (eigenständig oder in app_dpa.py)
+def init_app(flask_app, url_prefix=None):
+    flask_app.register_blueprint(bp, url_prefix=url_prefix)
+    # Admin-Routen für Profile einzelner Anfragen (/admin/profiling, /admin/profiles)
+    register_profiling(flask_app)
     # Lade die Eingabehistorie beim Start
     load_history()
-    
+
+# Initialisiere Flask
+app = Flask(__name__)
+app.secret_key = os.urandom(24)
+init_app(app)
+
+# Starte die Anwendung, wenn das Skript direkt ausgeführt wird
+if __name__ == '__main__':
     # Starte den Flask-Server im Debug-Modus
     app.run(debug=True, host='0.0.0.0', port=5000)
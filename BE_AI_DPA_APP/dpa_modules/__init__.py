@@ -17,5 +17,53 @@ from .dpa_modulB import (
     test_llm_connection,
     init_embedding_model_connection,
     create_vector_store,
-    verify_embeddings
+    verify_embeddings,
+    load_rule_index,
+    run_posting_pipeline,
+    answer_business_case
 )
+from .dpa_fastpath import (
+    fast_path_answer,
+    evaluate_fast_path,
+    parse_amounts
+)
+from .dpa_rule_index import (
+    RuleIndex,
+    RuleAwareRetriever,
+    extract_rule_rows,
+    count_rules
+)
+from .dpa_domain_gate import (
+    check_domain,
+    classify_domain
+)
+from .dpa_splitter import split_business_cases, case_contexts, with_context
+from .dpa_model_router import ModelRouter, score_complexity, load_model_tiers
+from .dpa_singleflight import SingleFlight, normalize_question
+from .dpa_resilience import (
+    ResiliencePolicy,
+    ResilientCall,
+    CircuitBreaker,
+    Deadline,
+    DeadlineExceeded,
+    CircuitOpenError
+)
+from .dpa_ratelimit import (
+    RateLimiter,
+    RateLimitedEmbeddings,
+    get_rate_limiter,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BULK
+)
+from .dpa_embedding_cache import EmbeddingCache, CachedEmbeddings, open_embedding_cache
+from .dpa_bluegreen import (resolve_active_table, switch_active_table, rollback_active_table, validate_shadow,
+                            ActiveTableWatcher)
+from .dpa_parse_cache import ParseCache, load_pdf_cached, open_parse_cache
+from .dpa_registry import DocumentRegistry, open_registry
+from .dpa_upload import StreamingUploadRequest, HashingUploadStream, save_upload
+from .dpa_index_version import read_index_version, bump_index_version, IndexVersionWatcher
+from .dpa_services import ServiceContainer, get_services
+from .dpa_prefetch import RetrievalPrefetcher
+from .dpa_warmup import AnswerCache, WarmupJob, load_warmup_cases
+from .dpa_ledger import UsageLedger, get_ledger, usage_scope, meter_llm, UsageCallbackHandler
+from .dpa_tracing import Tracer, get_tracer, trace_request, span, waterfall
@@ -0,0 +1,367 @@
+# dpa_batch.py
+# Stapelverarbeitung von Geschäftsfällen für Modul B (z.B. Monatsabschluss mit hunderten Fällen).
+#
+# Eingabe: CSV (Spalten "id" optional, "input_text" bzw. "text" oder erste Spalte) oder JSONL
+# ({"id": ..., "input_text": ...}). Jeder Geschäftsfall läuft durch run_posting_pipeline mit
+# prompt_template_json; die Ergebnisse werden als JSONL geschrieben (eine Zeile je Geschäftsfall mit
+# Status und Laufzeit). Bereits erfolgreich verarbeitete IDs in der Ausgabedatei werden bei einem
+# erneuten Aufruf übersprungen, sodass ein unterbrochener Lauf fortgesetzt werden kann. Solange ein Lauf
+# eine Ergebnisdatei schreibt, ist sie gesperrt (batch_lock); ein zweiter Lauf derselben Datei wird abgewiesen.
+#
+# Aufruf (aus BE_AI_DPA_APP):
+#   python -m dpa_modules.dpa_batch faelle.csv -o ergebnisse.jsonl --workers 4
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from .dpa_ledger import usage_scope
+from .dpa_tracing import span, trace_request
+from .dpa_ratelimit import PRIORITY_BULK, priority_scope
+
+try:
+    import fcntl
+except ImportError:  # Windows: Sperre nur innerhalb des Prozesses
+    fcntl = None
+
+DEFAULT_WORKERS = 4
+TEXT_COLUMNS = ("input_text", "text", "geschaeftsfall", "question")
+
+
+def read_cases(source, fmt=None):
+    """
+    Liest Geschäftsfälle aus CSV oder JSONL.
+
+    Args:
+        source (str | file): Pfad oder geöffnete Textdatei.
+        fmt (str, optional): "csv" oder "jsonl" (Standard: aus der Dateiendung bzw. dem Inhalt).
+
+    Returns:
+        list: [{"id": str, "input_text": str}] in der Reihenfolge der Eingabe; ohne ID-Spalte
+              wird die laufende Nummer als ID verwendet.
+
+    Raises:
+        ValueError: Bei ungültigem JSON, fehlender Textspalte oder zu kurzen CSV-Zeilen.
+    """
+    if isinstance(source, str):
+        if fmt is None:
+            fmt = "jsonl" if source.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+        with open(source, "r", encoding="utf-8-sig") as f:
+            content = f.read()
+    else:
+        content = source.read()
+    if fmt is None:
+        fmt = "jsonl" if content.lstrip().startswith("{") else "csv"
+    cases = []
+    if fmt == "jsonl":
+        for nummer, line in enumerate(content.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Ungültiges JSON in Zeile {nummer}: {e}")
+            if not isinstance(item, dict):
+                raise ValueError(f"Zeile {nummer} ist kein JSON-Objekt.")
+            text = next((item[c] for c in TEXT_COLUMNS if item.get(c)), None)
+            if text is None:
+                raise ValueError(f"Zeile {nummer} enthält kein Feld {'/'.join(TEXT_COLUMNS)}.")
+            cases.append({"id": str(item.get("id", len(cases) + 1)), "input_text": text})
+    else:
+        sample = content[:4096]
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(io.StringIO(content), dialect)
+        rows = [row for row in reader if any(cell.strip() for cell in row)]
+        if not rows:
+            return cases
+        header = [cell.strip().lower() for cell in rows[0]]
+        text_index = next((header.index(c) for c in TEXT_COLUMNS if c in header), None)
+        if text_index is None:
+            # Ohne Kopfzeile: erste Spalte ist der Geschäftsfall
+            text_index, id_index, rows = 0, None, rows
+        else:
+            id_index = header.index("id") if "id" in header else None
+            rows = rows[1:]
+        for nummer, row in enumerate(rows, start=1):
+            if len(row) <= max(text_index, id_index or 0):
+                raise ValueError(f"Datenzeile {nummer} hat zu wenige Spalten ({len(row)}).")
+            cases.append({
+                "id": row[id_index].strip() if id_index is not None else str(len(cases) + 1),
+                "input_text": row[text_index],
+            })
+    return cases
+
+
+def load_completed(output_path):
+    """
+    Liest die IDs bereits erfolgreich verarbeiteter Geschäftsfälle aus einer Ergebnisdatei.
+
+    Returns:
+        set: IDs mit Status "ok" (fehlerhafte Fälle werden beim Fortsetzen erneut verarbeitet).
+    """
+    completed = set()
+    if not output_path or not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Unvollständige letzte Zeile nach einem Abbruch
+                continue
+            if record.get("status") == "ok":
+                completed.add(str(record.get("id")))
+    return completed
+
+
+def parse_json_output(output):
+    """
+    Wandelt die LLM-Antwort im Format von prompt_template_json in ein Python-Objekt.
+
+    Entfernt ggf. Markdown-Codeblöcke, die das LLM trotz Anweisung ausgibt.
+
+    Returns:
+        dict | list: Geparstes JSON.
+
+    Raises:
+        ValueError: Wenn die Antwort kein gültiges JSON ist.
+    """
+    text = (output or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Antwort ist kein gültiges JSON: {e}")
+
+
+def process_case(case, pipeline):
+    """
+    Verarbeitet einen Geschäftsfall und liefert den Ergebnis-Datensatz.
+
+    Args:
+        case (dict): {"id", "input_text"}.
+        pipeline (callable): Erhält den Text und liefert das Ergebnis von run_posting_pipeline.
+
+    Returns:
+        dict: {"id", "input_text", "status": "ok" | "invalid_json" | "error", "route", "result",
+               "raw_output", "error", "duration_ms", "finished_at"}
+    """
+    record = {"id": case["id"], "input_text": case["input_text"], "status": "ok", "route": None,
+              "result": None, "raw_output": None, "error": None}
+    start = time.perf_counter()
+    try:
+        result = pipeline(case["input_text"])
+        record["route"] = result["route"]
+        try:
+            with span("parse_json", chars=len(result["output"] or "")):
+                record["result"] = parse_json_output(result["output"])
+        except ValueError as e:
+            record["status"] = "invalid_json"
+            record["raw_output"] = result["output"]
+            record["error"] = str(e)
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["duration_ms"] = round((time.perf_counter() - start) * 1000)
+    record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    return record
+
+
+class BatchLocked(RuntimeError):
+    """Die Ergebnisdatei wird bereits von einem anderen Lauf geschrieben."""
+
+
+# Im Prozess gehaltene Sperren (flock sperrt nur zwischen Prozessen bzw. Dateideskriptoren zuverlässig)
+_held_locks = set()
+_held_locks_lock = threading.Lock()
+
+
+class batch_lock:
+    """
+    Exklusive Sperre einer Ergebnisdatei (Sperrdatei <output>.lock, prozessübergreifend per flock), z.B.
+
+        with batch_lock(output):
+            completed = load_completed(output)
+            ...
+
+    Für gestreamte Antworten kann die Sperre auch mit acquire()/release() gehalten werden.
+
+    Raises:
+        BatchLocked: Wenn ein anderer Lauf die Datei bereits gesperrt hat (es wird nicht gewartet).
+    """
+
+    def __init__(self, output_path):
+        self.path = output_path + ".lock"
+        self._file = None
+
+    def acquire(self):
+        with _held_locks_lock:
+            if self.path in _held_locks:
+                raise BatchLocked(self.path)
+            _held_locks.add(self.path)
+        if fcntl:
+            self._file = open(self.path, "a", encoding="utf-8")
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._file.close()
+                self._file = None
+                with _held_locks_lock:
+                    _held_locks.discard(self.path)
+                raise BatchLocked(self.path)
+        return self
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        with _held_locks_lock:
+            _held_locks.discard(self.path)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def run_batch(cases, pipeline, max_workers=DEFAULT_WORKERS, completed=None):
+    """
+    Verarbeitet Geschäftsfälle mit begrenzter Parallelität und liefert die Ergebnisse, sobald sie vorliegen.
+
+    Es sind höchstens max_workers Geschäftsfälle gleichzeitig in Bearbeitung; Embedding- und
+    LLM-Aufrufe laufen mit Massen-Priorität über den gemeinsamen Ratenbegrenzer, damit
+    interaktive Anfragen in /process Vorrang behalten.
+
+    Args:
+        cases (list): Geschäftsfälle aus read_cases.
+        pipeline (callable): Erhält den Text und liefert das Ergebnis von run_posting_pipeline
+            (mit output_format="json").
+        max_workers (int): Maximal gleichzeitig bearbeitete Geschäftsfälle.
+        completed (set, optional): Bereits verarbeitete IDs (werden übersprungen).
+
+    Yields:
+        dict: Ergebnis-Datensatz je Geschäftsfall (Reihenfolge der Fertigstellung).
+    """
+    completed = completed or set()
+    offen = iter([case for case in cases if case["id"] not in completed])
+
+    def bulk_case(case):
+        # Je Geschäftsfall ein Auftrag im Token- und Kostenbuch (dpa_ledger)
+        with priority_scope(PRIORITY_BULK), usage_scope("batch", route="batch", template="json", cache="miss",
+                                                        case_id=case["id"], input=case["input_text"][:200]) as usage:
+            with trace_request("batch", case_id=case["id"], input_chars=len(case["input_text"])) as trace:
+                record = process_case(case, pipeline)
+                if trace is not None:
+                    trace.attrs.update(route=record["route"], status=record["status"])
+            usage.tag(pipeline=record["route"], status=record["status"])
+            return record
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        laufend = set()
+        for case in offen:
+            laufend.add(executor.submit(bulk_case, case))
+            if len(laufend) >= max_workers:
+                break
+        while laufend:
+            fertig, laufend = wait(laufend, return_when=FIRST_COMPLETED)
+            for future in fertig:
+                yield future.result()
+                naechster = next(offen, None)
+                if naechster is not None:
+                    laufend.add(executor.submit(bulk_case, naechster))
+
+
+def summarize(records, skipped=0):
+    """Zusammenfassung eines Laufs: Anzahl je Status, übersprungene Fälle und Laufzeit."""
+    status = {}
+    for record in records:
+        status[record["status"]] = status.get(record["status"], 0) + 1
+    durations = [record["duration_ms"] for record in records]
+    return {
+        "summary": True,
+        "processed": len(records),
+        "skipped": skipped,
+        "status": status,
+        "avg_duration_ms": round(sum(durations) / len(durations)) if durations else None,
+    }
+
+
+def main(argv=None):
+    """Kommandozeile: verarbeitet eine CSV-/JSONL-Datei und schreibt die Ergebnisse als JSONL."""
+    parser = argparse.ArgumentParser(description="Stapelverarbeitung von Geschäftsfällen (Modul B, JSON-Ausgabe)")
+    parser.add_argument("input", help="CSV- oder JSONL-Datei mit Geschäftsfällen")
+    parser.add_argument("-o", "--output", help="JSONL-Ergebnisdatei (Standard: <input>.results.jsonl)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Eingabeformat (Standard: aus Dateiendung)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("DPA_BATCH_WORKERS", DEFAULT_WORKERS)))
+    parser.add_argument("--restart", action="store_true", help="Ergebnisdatei verwerfen statt fortzusetzen")
+    parser.add_argument("--config", default=os.path.expanduser("~/.aicore/config.json"))
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    try:
+        lock = batch_lock(output).acquire()
+    except BatchLocked:
+        print(f"{output} wird bereits von einem anderen Lauf geschrieben.", file=sys.stderr)
+        return 2
+    try:
+        return run_locked(args, output)
+    finally:
+        lock.release()
+
+
+def run_locked(args, output):
+    """Verarbeitung aus main, während die Ergebnisdatei gesperrt ist."""
+    if args.restart and os.path.exists(output):
+        os.remove(output)
+    cases = read_cases(args.input, args.format)
+    completed = load_completed(output)
+    print(f"{len(cases)} Geschäftsfälle gelesen, {len(completed & {c['id'] for c in cases})} bereits verarbeitet.", file=sys.stderr)
+
+    # Modul B initialisieren (wie /initialize in app_modulB.py, aber mit prompt_template_json)
+    from .dpa_modulB import (
+        load_env_variables, init_llm_connection, init_embedding_model_connection, connect_to_hana_db,
+        create_vector_store, load_rule_index, create_qa_chain, prompt_template_json, run_posting_pipeline,
+    )
+    from .dpa_ratelimit import RateLimitedEmbeddings
+    from .dpa_resilience import ResiliencePolicy
+    load_env_variables(args.config)
+    llm = init_llm_connection()
+    embeddings = RateLimitedEmbeddings(init_embedding_model_connection(), priority=PRIORITY_BULK)
+    hana_connection = connect_to_hana_db()
+    hana_database = create_vector_store(embeddings, hana_connection)
+    rule_index = load_rule_index(hana_connection, hana_database.table_name)
+    qa_chain = create_qa_chain(llm, hana_database, prompt_template_json, rule_index=rule_index)
+    resilience = ResiliencePolicy()
+
+    def pipeline(text):
+        return run_posting_pipeline(text, qa_chain, hana_database, rule_index,
+                                    resilience=resilience, output_format="json")
+
+    records = []
+    with open(output, "a", encoding="utf-8") as f:
+        for record in run_batch(cases, pipeline, args.workers, completed):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            records.append(record)
+            print(f"[{len(records)}] {record['id']}: {record['status']} ({record['duration_ms']} ms)", file=sys.stderr)
+    summary = summarize(records, skipped=len(cases) - len(records))
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 0 if summary["status"].get("error", 0) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
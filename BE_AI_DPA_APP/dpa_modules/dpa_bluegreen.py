@@ -0,0 +1,382 @@
+# dpa_bluegreen.py
+# Blue/Green-Neuindexierung der Vektortabelle ohne Ausfallzeit für Modul B.
+#
+# Bisher löscht Modul A die Vektortabelle und lädt sie neu; währenddessen findet Modul B keine oder
+# nur einen Teil der Chunks. Im Blue/Green-Modus wird jede Neuindexierung in eine neue Generation
+# (Schattentabelle <hdb_table_name>_G<Nummer>) geschrieben, geprüft (Zeilenzahl, Stichproben-Abfragen)
+# und erst dann über die Zeigertabelle aktiviert:
+#
+#   DPA_INDEX_POINTER (ALIAS, ACTIVE_TABLE, PREVIOUS_TABLE, GENERATION, SWITCHED_AT)
+#
+# ALIAS ist der konfigurierte Tabellenname (hdb_table_name). Das Umschalten ist ein einzelnes UPSERT
+# und damit atomar; Modul B liest den Zeiger und verwendet die aktive Tabelle. Die vorherige
+# Generation bleibt erhalten und kann sofort wieder aktiviert werden (rollback_active_table);
+# ältere Generationen werden nach dem Umschalten gelöscht. Ohne Zeigereintrag gilt wie bisher
+# die Tabelle hdb_table_name selbst.
+#
+# Wird nur ein Teil der Handbücher neu eingelesen, übernimmt copy_other_sources die Chunks und
+# Regelzeilen aller übrigen Handbücher aus der aktiven Tabelle, bevor die Schattentabelle geprüft wird.
+#
+# Konfiguration: DPA_POINTER_TABLE (Standard DPA_INDEX_POINTER), DPA_BLUEGREEN_SAMPLE_QUERIES
+# (JSON-Liste), DPA_BLUEGREEN_MIN_SCORE (Standard 0.5), DPA_BLUEGREEN_MIN_RATIO (Standard 0.5),
+# DPA_POINTER_REFRESH (Sekunden, Standard 15)
+
+import json
+import os
+import re
+import threading
+import time
+
+from langchain_community.vectorstores.hanavector import HanaDB
+
+from .dpa_rule_index import rule_index_file, rule_table_name
+
+DEFAULT_SAMPLE_QUERIES = [
+    "Eingangsrechnung für Büromaterial",
+    "Bildung einer Rückstellung für ausstehende Rechnungen",
+    "Abschreibung auf Sachanlagen",
+]
+
+
+def pointer_table_name():
+    """Name der Zeigertabelle (DPA_POINTER_TABLE)."""
+    return os.getenv("DPA_POINTER_TABLE", "DPA_INDEX_POINTER")
+
+
+def generation_table_name(alias, generation):
+    """Name der Schattentabelle einer Generation, z.B. DPA_VECTORS_G003."""
+    return f"{alias}_G{generation:03d}"
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT COUNT(*) FROM SYS.TABLES WHERE SCHEMA_NAME = CURRENT_SCHEMA AND TABLE_NAME = ?", (table,))
+    return cursor.fetchone()[0] > 0
+
+
+def _commit(hana_connection):
+    # Verbindungen der Apps laufen mit autocommit=True; sonst explizit festschreiben
+    try:
+        if not hana_connection.getautocommit():
+            hana_connection.commit()
+    except AttributeError:
+        hana_connection.commit()
+
+
+def ensure_pointer_table(hana_connection):
+    """Legt die Zeigertabelle an, falls sie noch nicht existiert."""
+    table = pointer_table_name()
+    cursor = hana_connection.cursor()
+    try:
+        if not _table_exists(cursor, table):
+            cursor.execute(
+                f'CREATE TABLE "{table}" (ALIAS NVARCHAR(256) PRIMARY KEY, ACTIVE_TABLE NVARCHAR(256), '
+                f'PREVIOUS_TABLE NVARCHAR(256), GENERATION INTEGER, SWITCHED_AT TIMESTAMP)'
+            )
+    finally:
+        cursor.close()
+
+
+def read_pointer(hana_connection, alias):
+    """
+    Liest den Zeigereintrag zu einem Tabellennamen.
+
+    Returns:
+        dict | None: {"alias", "active_table", "previous_table", "generation", "switched_at"} oder
+                     None, wenn es (noch) keinen Eintrag bzw. keine Zeigertabelle gibt.
+    """
+    table = pointer_table_name()
+    cursor = hana_connection.cursor()
+    try:
+        if not _table_exists(cursor, table):
+            return None
+        cursor.execute(
+            f'SELECT ALIAS, ACTIVE_TABLE, PREVIOUS_TABLE, GENERATION, SWITCHED_AT FROM "{table}" WHERE ALIAS = ?',
+            (alias,),
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row is None:
+        return None
+    return {"alias": row[0], "active_table": row[1], "previous_table": row[2], "generation": row[3],
+            "switched_at": str(row[4]) if row[4] is not None else None}
+
+
+def resolve_active_table(hana_connection, alias=None):
+    """
+    Ermittelt die aktive Vektortabelle (Ziel des Zeigers, sonst der Tabellenname selbst).
+
+    Args:
+        hana_connection: Aktive HANA-Datenbankverbindung.
+        alias (str, optional): Konfigurierter Tabellenname (Standard: hdb_table_name).
+
+    Returns:
+        str: Name der Tabelle, die Modul B abfragen soll.
+    """
+    alias = alias or str(os.getenv("hdb_table_name"))
+    try:
+        pointer = read_pointer(hana_connection, alias)
+    except Exception as e:
+        print(f"Index pointer not readable, using {alias}: {e}")
+        return alias
+    return pointer["active_table"] if pointer and pointer["active_table"] else alias
+
+
+def count_rows(hana_connection, table):
+    """Anzahl der Zeilen einer Tabelle (0, wenn sie nicht existiert)."""
+    cursor = hana_connection.cursor()
+    try:
+        if not _table_exists(cursor, table):
+            return 0
+        cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def _drop_table(cursor, table):
+    if _table_exists(cursor, table):
+        cursor.execute(f'DROP TABLE "{table}"')
+
+
+def create_shadow_store(hana_connection, embeddings, alias=None):
+    """
+    Legt die Schattentabelle der nächsten Generation an (Reste eines abgebrochenen Laufs werden verworfen).
+
+    Returns:
+        tuple: (generation, HanaDB) für die neue, leere Schattentabelle.
+    """
+    alias = alias or str(os.getenv("hdb_table_name"))
+    pointer = read_pointer(hana_connection, alias)
+    generation = (pointer["generation"] if pointer else 0) + 1
+    table = generation_table_name(alias, generation)
+    cursor = hana_connection.cursor()
+    try:
+        _drop_table(cursor, table)
+        _drop_table(cursor, rule_table_name(table))
+    finally:
+        cursor.close()
+    _commit(hana_connection)
+    # HanaDB legt die Tabelle beim Initialisieren an
+    shadow = HanaDB(embedding=embeddings, connection=hana_connection, table_name=table)
+    print(f"Shadow table ready: {table} (generation {generation})")
+    return generation, shadow
+
+
+def copy_other_sources(hana_connection, active_table, shadow, exclude_sources):
+    """
+    Übernimmt Chunks und Regelzeilen aller Handbücher außer exclude_sources aus der aktiven Tabelle
+    in die Schattentabelle (Chunks ohne Quelle werden ebenfalls übernommen).
+
+    Args:
+        hana_connection: Aktive HANA-Datenbankverbindung.
+        active_table (str): Derzeit aktive Vektortabelle.
+        shadow (HanaDB): Vektorspeicher der Schattentabelle.
+        exclude_sources (list): Quellen, die neu eingelesen wurden (Metadatum "source" bzw. Spalte SOURCE).
+
+    Returns:
+        int: Anzahl übernommener Chunks.
+    """
+    sources = sorted(set(exclude_sources))
+    platzhalter = ", ".join("?" * len(sources))
+    source = f"JSON_VALUE({shadow.metadata_column}, '$.source')"
+    columns = f"{shadow.content_column}, {shadow.metadata_column}, {shadow.vector_column}"
+    cursor = hana_connection.cursor()
+    try:
+        if not active_table or active_table == shadow.table_name or not _table_exists(cursor, active_table):
+            return 0
+        where = f"{source} IS NULL OR {source} NOT IN ({platzhalter})" if sources else "1 = 1"
+        cursor.execute(f'SELECT COUNT(*) FROM "{active_table}" WHERE {where}', tuple(sources))
+        copied = cursor.fetchone()[0]
+        if copied:
+            cursor.execute(f'INSERT INTO "{shadow.table_name}" ({columns}) '
+                           f'SELECT {columns} FROM "{active_table}" WHERE {where}', tuple(sources))
+        rules, shadow_rules = rule_table_name(active_table), rule_table_name(shadow.table_name)
+        if _table_exists(cursor, rules) and _table_exists(cursor, shadow_rules):
+            where = f"SOURCE IS NULL OR SOURCE NOT IN ({platzhalter})" if sources else "1 = 1"
+            cursor.execute(f'INSERT INTO "{shadow_rules}" SELECT * FROM "{rules}" WHERE {where}', tuple(sources))
+    finally:
+        cursor.close()
+    _commit(hana_connection)
+    print(f"Copied {copied} chunks of unchanged handbooks from {active_table} to {shadow.table_name}.")
+    return copied
+
+
+def sample_queries():
+    """Stichproben-Abfragen für die Prüfung (DPA_BLUEGREEN_SAMPLE_QUERIES oder Standardliste)."""
+    configured = os.getenv("DPA_BLUEGREEN_SAMPLE_QUERIES")
+    return json.loads(configured) if configured else list(DEFAULT_SAMPLE_QUERIES)
+
+
+def validate_shadow(hana_connection, shadow, expected_rows, queries=None, active_table=None,
+                    min_score=None, min_ratio=None):
+    """
+    Prüft die Schattentabelle vor dem Umschalten.
+
+    Geprüft werden: Zeilenzahl gleich der Anzahl geschriebener Chunks, mindestens min_ratio der
+    Zeilen der aktiven Tabelle (Schutz vor abgeschnittenen Handbüchern) und je Stichproben-Abfrage
+    mindestens ein Treffer mit einer Ähnlichkeit von min_score.
+
+    Args:
+        hana_connection: Aktive HANA-Datenbankverbindung.
+        shadow (HanaDB): Vektorspeicher der Schattentabelle.
+        expected_rows (int): Anzahl der geschriebenen Chunks.
+        queries (list, optional): Stichproben-Abfragen (Standard: sample_queries()).
+        active_table (str, optional): Derzeit aktive Tabelle für den Vergleich der Zeilenzahl.
+        min_score (float, optional): Mindestähnlichkeit (Standard: DPA_BLUEGREEN_MIN_SCORE).
+        min_ratio (float, optional): Mindestanteil der Zeilen (Standard: DPA_BLUEGREEN_MIN_RATIO).
+
+    Returns:
+        dict: {"valid", "rows", "expected_rows", "active_rows", "queries", "errors"}
+    """
+    min_score = float(os.getenv("DPA_BLUEGREEN_MIN_SCORE", "0.5")) if min_score is None else min_score
+    min_ratio = float(os.getenv("DPA_BLUEGREEN_MIN_RATIO", "0.5")) if min_ratio is None else min_ratio
+    queries = sample_queries() if queries is None else queries
+    errors = []
+
+    rows = count_rows(hana_connection, shadow.table_name)
+    if rows != expected_rows:
+        errors.append(f"{rows} Zeilen in {shadow.table_name}, erwartet {expected_rows}.")
+    active_rows = count_rows(hana_connection, active_table) if active_table else None
+    if active_rows and rows < active_rows * min_ratio:
+        errors.append(f"Nur {rows} Zeilen gegenüber {active_rows} in der aktiven Tabelle {active_table}.")
+
+    checks = []
+    for query in queries:
+        try:
+            results = shadow.similarity_search_with_score(query, k=3)
+        except Exception as e:
+            errors.append(f"Abfrage '{query}' fehlgeschlagen: {e}")
+            checks.append({"query": query, "hits": 0, "top_score": None, "ok": False})
+            continue
+        top_score = max((score for _, score in results), default=None)
+        ok = bool(results) and top_score >= min_score
+        if not ok:
+            errors.append(f"Abfrage '{query}' ohne ausreichenden Treffer (Ähnlichkeit {top_score}).")
+        checks.append({"query": query, "hits": len(results), "top_score": top_score, "ok": ok})
+
+    return {"valid": not errors, "rows": rows, "expected_rows": expected_rows, "active_rows": active_rows,
+            "queries": checks, "errors": errors}
+
+
+def _upsert_pointer(cursor, alias, active_table, previous_table, generation):
+    cursor.execute(
+        f'UPSERT "{pointer_table_name()}" (ALIAS, ACTIVE_TABLE, PREVIOUS_TABLE, GENERATION, SWITCHED_AT) '
+        f'VALUES (?, ?, ?, ?, CURRENT_UTCTIMESTAMP) WITH PRIMARY KEY',
+        (alias, active_table, previous_table, generation),
+    )
+
+
+def switch_active_table(hana_connection, alias, table, generation):
+    """
+    Aktiviert eine geprüfte Schattentabelle (ein UPSERT auf die Zeigertabelle, damit atomar).
+
+    Die bisher aktive Tabelle wird zur vorherigen Generation; ältere Generationen werden gelöscht.
+    Die Indexversion (dpa_index_version) wird erhöht.
+
+    Returns:
+        dict: Neuer Zeigereintrag (siehe read_pointer) mit "index_version".
+    """
+    from .dpa_index_version import bump_index_version
+    ensure_pointer_table(hana_connection)
+    pointer = read_pointer(hana_connection, alias)
+    previous = pointer["active_table"] if pointer else alias
+    cursor = hana_connection.cursor()
+    try:
+        _upsert_pointer(cursor, alias, table, previous, generation)
+    finally:
+        cursor.close()
+    _commit(hana_connection)
+    print(f"Active vector table switched: {alias} -> {table} (previous {previous}).")
+    drop_old_generations(hana_connection, alias, keep={table, previous})
+    pointer = read_pointer(hana_connection, alias)
+    pointer["index_version"] = bump_index_version(hana_connection, alias, table, source="switch")
+    return pointer
+
+
+def rollback_active_table(hana_connection, alias=None):
+    """
+    Aktiviert wieder die vorherige Generation (aktive und vorherige Tabelle werden getauscht)
+    und erhöht die Indexversion.
+
+    Returns:
+        dict: Neuer Zeigereintrag (siehe read_pointer) mit "index_version".
+
+    Raises:
+        ValueError: Wenn es keine vorherige Generation gibt.
+    """
+    from .dpa_index_version import bump_index_version
+    alias = alias or str(os.getenv("hdb_table_name"))
+    pointer = read_pointer(hana_connection, alias)
+    if not pointer or not pointer["previous_table"]:
+        raise ValueError(f"Keine vorherige Generation für {alias} vorhanden.")
+    if not count_rows(hana_connection, pointer["previous_table"]):
+        raise ValueError(f"Vorherige Generation {pointer['previous_table']} ist leer oder gelöscht.")
+    cursor = hana_connection.cursor()
+    try:
+        _upsert_pointer(cursor, alias, pointer["previous_table"], pointer["active_table"], pointer["generation"])
+    finally:
+        cursor.close()
+    _commit(hana_connection)
+    print(f"Active vector table rolled back: {alias} -> {pointer['previous_table']}.")
+    pointer = read_pointer(hana_connection, alias)
+    pointer["index_version"] = bump_index_version(hana_connection, alias, pointer["active_table"], source="rollback")
+    return pointer
+
+
+def drop_old_generations(hana_connection, alias, keep):
+    """
+    Löscht Generationstabellen (und ihre Regeltabellen), die weder aktiv noch vorherige Generation sind.
+    Die ursprüngliche Tabelle hdb_table_name wird nie gelöscht.
+
+    Returns:
+        list: Namen der gelöschten Vektortabellen.
+    """
+    muster = re.compile(rf"^{re.escape(alias)}_G\d+$")
+    cursor = hana_connection.cursor()
+    dropped = []
+    try:
+        cursor.execute("SELECT TABLE_NAME FROM SYS.TABLES WHERE SCHEMA_NAME = CURRENT_SCHEMA")
+        for (table,) in cursor.fetchall():
+            if muster.match(table) and table not in keep:
+                cursor.execute(f'DROP TABLE "{table}"')
+                _drop_table(cursor, rule_table_name(table))
+                if os.path.exists(rule_index_file(table)):
+                    os.remove(rule_index_file(table))
+                dropped.append(table)
+    finally:
+        cursor.close()
+    _commit(hana_connection)
+    if dropped:
+        print(f"Dropped old index generations: {', '.join(dropped)}")
+    return dropped
+
+
+class ActiveTableWatcher:
+    """
+    Prüft in Modul B höchstens alle DPA_POINTER_REFRESH Sekunden, ob der Zeiger auf eine andere
+    Tabelle umgeschaltet wurde.
+    """
+
+    def __init__(self, hana_connection, alias=None, active_table=None, interval=None):
+        self.hana_connection = hana_connection
+        self.alias = alias or str(os.getenv("hdb_table_name"))
+        self.active_table = active_table or resolve_active_table(hana_connection, self.alias)
+        self.interval = float(os.getenv("DPA_POINTER_REFRESH", "15")) if interval is None else interval
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """
+        Returns:
+            str | None: Name der neuen aktiven Tabelle, wenn sich der Zeiger geändert hat, sonst None.
+        """
+        with self._lock:
+            if time.monotonic() - self._checked < self.interval:
+                return None
+            self._checked = time.monotonic()
+            table = resolve_active_table(self.hana_connection, self.alias)
+            if table == self.active_table:
+                return None
+            self.active_table = table
+            return table
@@ -0,0 +1,288 @@
+# dpa_bulk_writer.py
+# Schneller Massen-Import in die HANA-Vektortabelle für Modul A.
+#
+# HanaDB.add_documents bettet ein und schreibt nach den Vorgaben von langchain: keine Kontrolle über
+# Batch-Größe und Commit, und bei autocommit=True wird jede Anweisung einzeln festgeschrieben.
+# BulkVectorWriter schreibt bereits berechnete Vektoren per executemany (Array-Binding) in Batches
+# einstellbarer Größe innerhalb expliziter Transaktionen. pipeline_batches überlappt Einbetten und
+# Schreiben: während ein Batch geschrieben wird, wird der nächste bereits eingebettet.
+#
+# Die Verbindung wird während des Schreibens auf autocommit=False gestellt. Da die Verbindung eines
+# Vektorspeichers auch von anderen Threads genutzt wird (z.B. Anfragen an app_modulA), öffnet
+# from_store eine eigene Verbindung für den Writer (dedicated_connection); close() schließt sie.
+# Mit transaction() laufen Löschen und Schreiben mehrerer Batches in einer Transaktion.
+#
+# Konfiguration: DPA_BULK_BATCH_SIZE (Zeilen je executemany, Standard 256),
+#                DPA_BULK_COMMIT_EVERY (Batches je Commit, Standard 1)
+#
+# Durchsatzmessung je Batch-Größe gegen den lokalen Ersatz (dpa_fakes.FakeHanaConnection):
+#   python -m dpa_modules.dpa_bulk_writer --rows 5000 --batch-sizes 1,64,256,1024 --row-latency 0.0002
+
+import argparse
+import contextvars
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+_METADATA_KEY = re.compile(r"^[a-zA-Z0-9_]+$")
+
+
+def vector_literal(vector):
+    """Vektor als Text für TO_REAL_VECTOR, z.B. "[0.1,0.2]"."""
+    return "[" + ",".join(map(str, vector)) + "]"
+
+
+def dedicated_connection(connection):
+    """
+    Neue Verbindung zur selben Datenbank wie connection: FakeHanaConnection.clone() bzw. eine neue
+    HANA-Verbindung aus der Konfiguration (setup_hana_connection).
+    """
+    if hasattr(connection, "clone"):
+        return connection.clone()
+    from .dpa_modulA import setup_hana_connection
+    return setup_hana_connection()
+
+
+class BulkVectorWriter:
+    """
+    Schreibt Texte, Metadaten und Vektoren batchweise in eine Tabelle im Format von HanaDB.
+    """
+
+    def __init__(self, connection, table_name, batch_size=None, commit_every=None,
+                 content_column="VEC_TEXT", metadata_column="VEC_META", vector_column="VEC_VECTOR"):
+        """
+        Args:
+            connection: DB-API-Verbindung (hdbcli oder FakeHanaConnection).
+            table_name (str): Ziel-Vektortabelle (muss existieren, z.B. durch HanaDB angelegt).
+            batch_size (int, optional): Zeilen je executemany (Standard: DPA_BULK_BATCH_SIZE).
+            commit_every (int, optional): Batches je Commit (Standard: DPA_BULK_COMMIT_EVERY).
+        """
+        self.connection = connection
+        self.table_name = table_name
+        self.batch_size = batch_size or int(os.getenv("DPA_BULK_BATCH_SIZE", "256"))
+        self.commit_every = commit_every or int(os.getenv("DPA_BULK_COMMIT_EVERY", "1"))
+        self.sql = (f'INSERT INTO "{table_name}" ("{content_column}", "{metadata_column}", "{vector_column}") '
+                    f'VALUES (?, ?, TO_REAL_VECTOR (?))')
+        self.rows = 0
+        self.batches = 0
+        self.commits = 0
+        self.seconds = 0.0
+        # Filter-Übersetzung des Vektorspeichers für delete (siehe from_store)
+        self.where_by_filter = None
+        self.owns_connection = False
+        self._in_transaction = False
+
+    @classmethod
+    def from_store(cls, hana_database, **kwargs):
+        """
+        Writer für die Tabelle eines HanaDB-Vektorspeichers mit eigener Verbindung (None ohne
+        DB-API-Verbindung); nach dem Schreiben mit close() schließen.
+        """
+        connection = getattr(hana_database, "connection", None)
+        if connection is None or not hasattr(connection, "cursor"):
+            return None
+        writer = cls(dedicated_connection(connection), hana_database.table_name,
+                     content_column=getattr(hana_database, "content_column", "VEC_TEXT"),
+                     metadata_column=getattr(hana_database, "metadata_column", "VEC_META"),
+                     vector_column=getattr(hana_database, "vector_column", "VEC_VECTOR"), **kwargs)
+        writer.where_by_filter = getattr(hana_database, "_create_where_by_filter", None)
+        writer.owns_connection = True
+        return writer
+
+    def close(self):
+        """Schließt die eigene Verbindung (aus from_store)."""
+        if self.owns_connection:
+            self.connection.close()
+            self.owns_connection = False
+
+    @contextmanager
+    def transaction(self):
+        """
+        Fasst alle delete- und write-Aufrufe im with-Block in einer Transaktion zusammen
+        (z.B. Ersetzen der Chunks einer Datei: alte Zeilen bleiben bis zum Commit sichtbar).
+        """
+        with self._transaction():
+            self._in_transaction = True
+            try:
+                yield self
+            finally:
+                self._in_transaction = False
+
+    @contextmanager
+    def _transaction(self):
+        # Explizite Transaktion; bisheriger autocommit-Modus wird danach wiederhergestellt.
+        # Innerhalb von transaction() gehört jeder Aufruf zur äußeren Transaktion.
+        if self._in_transaction:
+            yield
+            return
+        autocommit = self.connection.getautocommit()
+        if autocommit:
+            self.connection.setautocommit(False)
+        try:
+            yield
+            self.connection.commit()
+            self.commits += 1
+        except BaseException:
+            self.connection.rollback()
+            raise
+        finally:
+            if autocommit:
+                self.connection.setautocommit(True)
+
+    @staticmethod
+    def _params(texts, metadatas, vectors):
+        params = []
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            metadata = metadatas[i] if metadatas else {}
+            for key in metadata:
+                # Wie HanaDB: nur einfache Schlüssel, da Filter sie in JSON-Pfaden verwenden
+                if not _METADATA_KEY.match(key):
+                    raise ValueError(f"Ungültiger Metadaten-Schlüssel: {key}")
+            params.append((text, json.dumps(metadata), vector_literal(vector)))
+        return params
+
+    def write(self, texts, metadatas, vectors):
+        """
+        Schreibt alle Zeilen; je commit_every Batches eine Transaktion (alles oder nichts je Transaktion).
+
+        Returns:
+            int: Anzahl der geschriebenen Zeilen.
+        """
+        start = time.perf_counter()
+        params = self._params(texts, metadatas, vectors)
+        step = self.batch_size * self.commit_every
+        cursor = self.connection.cursor()
+        try:
+            for offset in range(0, len(params), step):
+                with self._transaction():
+                    for batch_start in range(offset, min(offset + step, len(params)), self.batch_size):
+                        cursor.executemany(self.sql, params[batch_start:batch_start + self.batch_size])
+                        self.batches += 1
+        finally:
+            cursor.close()
+        self.rows += len(params)
+        self.seconds += time.perf_counter() - start
+        return len(params)
+
+    def delete(self, filter):
+        """
+        Löscht Zeilen wie HanaDB.delete ({} löscht alle), aber auf der Verbindung des Writers, also
+        innerhalb von transaction() nicht vor dem Commit.
+        """
+        if filter and self.where_by_filter is None:
+            raise ValueError("Filter ohne Vektorspeicher (from_store) nicht unterstützt.")
+        where, params = self.where_by_filter(filter) if filter else ("", [])
+        cursor = self.connection.cursor()
+        try:
+            with self._transaction():
+                cursor.execute(f'DELETE FROM "{self.table_name}" {where}', tuple(params))
+        finally:
+            cursor.close()
+
+    def stats(self):
+        """Geschriebene Zeilen, Batches, Commits, Schreibzeit und Durchsatz."""
+        return {"rows": self.rows, "batches": self.batches, "commits": self.commits,
+                "write_seconds": round(self.seconds, 3),
+                "rows_per_s": round(self.rows / self.seconds, 1) if self.seconds else None}
+
+
+def store_writer(hana_database, **kwargs):
+    """
+    Schreibfunktion (texts, metadatas, vectors) für einen Vektorspeicher: Bulk-Writer, wenn eine
+    DB-API-Verbindung vorhanden ist, sonst add_texts (z.B. für FakeVectorStore).
+    """
+    writer = BulkVectorWriter.from_store(hana_database, **kwargs)
+    if writer is not None:
+        return writer.write, writer
+    return (lambda texts, metadatas, vectors: hana_database.add_texts(texts, metadatas, embeddings=vectors)), None
+
+
+def pipeline_batches(batches, produce, consume, depth=1):
+    """
+    Verarbeitet Batches in zwei überlappenden Stufen: produce (z.B. Einbetten) im aufrufenden Thread,
+    consume (z.B. Schreiben) in einem eigenen Thread, höchstens depth Batches im Rückstand.
+
+    Ein Fehler in consume bricht die Verarbeitung ab und wird weitergegeben; die Reihenfolge der
+    consume-Aufrufe entspricht der Reihenfolge der Batches.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = deque()
+        try:
+            for batch in batches:
+                result = produce(batch)
+                pending.append(executor.submit(contextvars.copy_context().run, consume, batch, result))
+                while len(pending) > depth:
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def pipelined_write(writer, embeddings, texts, metadatas=None, batch_size=None):
+    """
+    Bettet Texte batchweise ein und schreibt sie, wobei Einbetten und Schreiben überlappen.
+
+    Returns:
+        dict: Statistik des Writers ergänzt um "embed_seconds", "seconds" und Gesamtdurchsatz "rows_per_s".
+    """
+    batch_size = batch_size or writer.batch_size
+    embed_seconds = [0.0]
+    start = time.perf_counter()
+
+    def produce(offset):
+        t = time.perf_counter()
+        vectors = embeddings.embed_documents(list(texts[offset:offset + batch_size]))
+        embed_seconds[0] += time.perf_counter() - t
+        return vectors
+
+    def consume(offset, vectors):
+        writer.write(texts[offset:offset + batch_size],
+                     metadatas[offset:offset + batch_size] if metadatas else None, vectors)
+
+    pipeline_batches(range(0, len(texts), batch_size), produce, consume)
+    seconds = time.perf_counter() - start
+    return dict(writer.stats(), embed_seconds=round(embed_seconds[0], 3), seconds=round(seconds, 3),
+                rows_per_s=round(len(texts) / seconds, 1) if seconds else None)
+
+
+def main(argv=None):
+    """Misst den Durchsatz je Batch-Größe gegen FakeHanaConnection und gibt je Größe eine Zeile aus."""
+    from .dpa_fakes import FakeEmbeddings, FakeHanaConnection
+    parser = argparse.ArgumentParser(description="Durchsatz des Bulk-Writers je Batch-Größe (lokaler DB-API-Ersatz)")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--batch-sizes", default="1,16,64,256,1024")
+    parser.add_argument("--latency", type=float, default=0.002, help="Sekunden je executemany (Roundtrip)")
+    parser.add_argument("--row-latency", type=float, default=0.00005, help="Sekunden je Zeile")
+    parser.add_argument("--commit-latency", type=float, default=0.005, help="Sekunden je Commit")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Sekunden je Embedding-Aufruf (Pipeline)")
+    args = parser.parse_args(argv)
+
+    embeddings = FakeEmbeddings(dimension=args.dimension, latency=args.embed_latency)
+    texts = [f"Chunk {i}: Kontierung Beispieltext" for i in range(args.rows)]
+    metadatas = [{"page": i // 10, "source": "benchmark.pdf"} for i in range(args.rows)]
+    vectors = embeddings.embed_documents(texts) if not args.embed_latency else None
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        connection = FakeHanaConnection(latency=args.latency, row_latency=args.row_latency,
+                                        commit_latency=args.commit_latency)
+        connection.create_vector_table("BENCH")
+        writer = BulkVectorWriter(connection, "BENCH", batch_size=batch_size)
+        if vectors is None:
+            stats = pipelined_write(writer, embeddings, texts, metadatas)
+        else:
+            writer.write(texts, metadatas, vectors)
+            stats = writer.stats()
+        print(f"Batch {batch_size:5d}: {stats['rows']} Zeilen, {stats['batches']} executemany, "
+              f"{stats['commits']} Commits, {stats['rows_per_s']} Zeilen/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+# dpa_checkpoint.py
+# Wiederaufsetzbare Ingestion für Modul A.
+#
+# Bisher löscht reload_embeddings zuerst alle Zeilen der Vektortabelle und lädt dann alle Chunks in
+# einem Aufruf hoch; bricht dieser ab (z.B. AI Core 429, HANA-Verbindungsabbruch), bleibt die
+# Tabelle halb leer und alle Embeddings sind verloren. Hier wird die Ingestion einer Datei in
+# Batches zerlegt und der Fortschritt lokal festgehalten:
+#
+#   <DPA_CHECKPOINT_DIR>/<Schlüssel>/
+#       state.json      Status: Löschung erfolgt, eingebettete und in HANA geschriebene Batches
+#       chunks.jsonl    Ergebnis des semantischen Chunkings (Text und Metadaten je Chunk)
+#       chunker_embeddings.sqlite
+#                       Satz-Embeddings des SemanticChunkers (teil-batchweise gespeichert, siehe
+#                       ChunkerEmbeddings), damit ein Abbruch während des Chunkings nichts doppelt bezahlt
+#       batch_00000.npy berechnete Vektoren je Batch (float32)
+#
+# Der Schlüssel ergibt sich aus SHA-256 der Datei, Embedding-Modell und Chunking-Verfahren. Ein
+# erneuter Aufruf setzt beim ersten nicht geschriebenen Batch fort; bereits berechnete Vektoren
+# werden wiederverwendet, sodass kein Embedding doppelt bezahlt wird.
+#
+# Geschrieben wird mit dem Bulk-Writer (dpa_bulk_writer) je Batch in einer eigenen Transaktion;
+# das Einbetten des nächsten Batches überlappt mit dem Schreiben des vorherigen. Ersetzt ein Lauf
+# bestehende Chunks (delete_filter), laufen Löschen und alle Batches in einer Transaktion, damit
+# die Tabelle nie ohne die Chunks der Datei sichtbar ist.
+#
+# Konfiguration: DPA_CHECKPOINT_DIR (Standard ingest_checkpoints), DPA_INGEST_BATCH_SIZE (Standard 64)
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from langchain.schema import Document
+
+from .dpa_embedding_cache import CachedEmbeddings, EmbeddingCache
+
+CHUNKING_VERSION = "semantic-gradient-v1"
+
+
+def file_sha256(filepath):
+    """SHA-256 des Dateiinhalts (blockweise gelesen)."""
+    sha = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class IngestionCheckpoint:
+    """
+    Fortschritt der Ingestion einer Datei im Checkpoint-Verzeichnis.
+    """
+
+    def __init__(self, filepath, model_name=None, directory=None):
+        self.filepath = filepath
+        self.sha256 = file_sha256(filepath)
+        self.model_name = model_name or str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING"))
+        key = hashlib.sha256(f"{self.sha256}\0{self.model_name}\0{CHUNKING_VERSION}".encode("utf-8")).hexdigest()[:24]
+        self.directory = os.path.join(directory or os.getenv("DPA_CHECKPOINT_DIR", "ingest_checkpoints"), key)
+        os.makedirs(self.directory, exist_ok=True)
+        self.state_path = os.path.join(self.directory, "state.json")
+        self.chunks_path = os.path.join(self.directory, "chunks.jsonl")
+        self.state = self._load_state()
+        # Einbetten und Schreiben laufen in verschiedenen Threads (pipeline_batches)
+        self._lock = threading.Lock()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"source": os.path.basename(self.filepath), "sha256": self.sha256, "model": self.model_name,
+                "batch_size": None, "deleted": False, "embedded": [], "committed": [], "completed": False}
+
+    def save(self):
+        """Schreibt den Status atomar (temporäre Datei und os.replace)."""
+        with self._lock:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.state_path)
+
+    def start_run(self, batch_size, target=None):
+        """
+        Beginnt einen Lauf. Nach einem abgeschlossenen Lauf oder bei einer anderen Zieltabelle
+        wird neu in HANA geschrieben, die berechneten Vektoren bleiben erhalten.
+
+        Returns:
+            bool: True, wenn ein unterbrochener Lauf fortgesetzt wird.
+        """
+        if self.state["batch_size"] not in (None, batch_size):
+            # Andere Batch-Größe: Batches passen nicht mehr zu den gespeicherten Vektoren
+            self.state.update({"embedded": [], "committed": [], "deleted": False})
+            for name in os.listdir(self.directory):
+                if name.startswith("batch_"):
+                    os.remove(os.path.join(self.directory, name))
+        if self.state.get("target") != target:
+            # Geschriebene Batches gelten nur für die Tabelle, in die sie geschrieben wurden
+            self.state.update({"deleted": False, "committed": [], "completed": False, "target": target})
+        resumed = not self.state["completed"] and (self.state["deleted"] or bool(self.state["committed"]))
+        if self.state["completed"]:
+            self.state.update({"deleted": False, "committed": [], "completed": False})
+        self.state["batch_size"] = batch_size
+        self.save()
+        return resumed
+
+    def load_chunks(self):
+        """Gespeicherte Chunks oder None."""
+        if not os.path.exists(self.chunks_path):
+            return None
+        with open(self.chunks_path, "r", encoding="utf-8") as f:
+            return [Document(page_content=item["text"], metadata=item["metadata"]) for item in map(json.loads, f)]
+
+    def save_chunks(self, text_chunks):
+        tmp = self.chunks_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for chunk in text_chunks:
+                f.write(json.dumps({"text": chunk.page_content, "metadata": chunk.metadata}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.chunks_path)
+
+    def _batch_path(self, nummer):
+        return os.path.join(self.directory, f"batch_{nummer:05d}.npy")
+
+    def load_vectors(self, nummer):
+        """Gespeicherte Vektoren eines Batches oder None."""
+        if nummer not in self.state["embedded"] or not os.path.exists(self._batch_path(nummer)):
+            return None
+        return np.load(self._batch_path(nummer)).tolist()
+
+    def save_vectors(self, nummer, vectors):
+        tmp = self._batch_path(nummer) + ".tmp.npy"
+        np.save(tmp, np.asarray(vectors, dtype=np.float32))
+        os.replace(tmp, self._batch_path(nummer))
+        with self._lock:
+            self.state["embedded"].append(nummer)
+        self.save()
+
+    def mark_committed(self, nummer):
+        with self._lock:
+            self.state["committed"].append(nummer)
+        self.save()
+
+
+class ChunkerEmbeddings(CachedEmbeddings):
+    """
+    Embedding-Modell für das Chunking mit Cache im Checkpoint-Verzeichnis. Der SemanticChunker bettet
+    alle Sätze einer Seite in einem Aufruf ein; hier wird in Teil-Batches eingebettet und jeder
+    Teil-Batch sofort gespeichert.
+    """
+
+    def __init__(self, embeddings, directory, batch_size):
+        super().__init__(embeddings, EmbeddingCache(os.path.join(directory, "chunker_embeddings.sqlite")))
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts):
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(super().embed_documents(texts[i:i + self.batch_size]))
+        return vectors
+
+
+def checkpointed_ingest(hana_database, embeddings, filepath, docs, chunker, delete_filter=None, batch_size=None,
+                        target=None, source=None):
+    """
+    Chunkt, bettet ein und schreibt eine Datei batchweise mit Checkpoints in die Vektortabelle.
+
+    Args:
+        hana_database (HanaDB): Ziel-Vektortabelle.
+        embeddings (Embeddings): Embedding-Modell für die Chunks.
+        filepath (str): Pfad der Quelldatei (für Schlüssel und Status).
+        docs (list): Geladene Seiten der Datei (load_pdf).
+        chunker (callable): chunker(docs, embeddings) -> Liste von Chunks (z.B. semantic_chunking).
+        delete_filter (dict, optional): Filter für das einmalige Löschen vor dem ersten Batch;
+            {} löscht die ganze Tabelle (wie reload_embeddings), None löscht nichts.
+        batch_size (int, optional): Chunks je Batch (Standard: DPA_INGEST_BATCH_SIZE).
+        target (str, optional): Kennung des Ziels für das Fortsetzen (Standard: Tabellenname);
+            bei einem anderen Ziel werden alle Batches neu geschrieben.
+        source (str, optional): Metadatum "source" aller Chunks (Standard: Dateiname). Die Chunks im
+            Checkpoint hängen nur vom Dateiinhalt ab und werden daher beim Schreiben neu beschriftet.
+
+    Returns:
+        dict: {"chunks", "batches", "embedded_batches", "reused_batches", "skipped_batches",
+               "resumed", "checkpoint", "rows_written", "write_seconds", "rows_per_s"}
+    """
+    from .dpa_bulk_writer import pipeline_batches, store_writer
+    batch_size = batch_size or int(os.getenv("DPA_INGEST_BATCH_SIZE", "64"))
+    checkpoint = IngestionCheckpoint(filepath)
+    resumed = checkpoint.start_run(batch_size, target or hana_database.table_name)
+
+    text_chunks = checkpoint.load_chunks()
+    if text_chunks is None:
+        text_chunks = chunker(docs, ChunkerEmbeddings(embeddings, checkpoint.directory, batch_size))
+        checkpoint.save_chunks(text_chunks)
+    source = source or os.path.basename(filepath)
+    for chunk in text_chunks:
+        chunk.metadata = dict(chunk.metadata, source=source)
+
+    write, writer = store_writer(hana_database, batch_size=batch_size)
+    # Ersetzen: Löschen und Schreiben in einer Transaktion auf der Verbindung des Writers; nach einem
+    # Abbruch werden alle Batches neu geschrieben (die Vektoren stammen aus dem Checkpoint)
+    replace = delete_filter is not None and not checkpoint.state["deleted"] and writer is not None
+    if not checkpoint.state["deleted"] and not replace:
+        if delete_filter is not None:
+            # Ohne DB-API-Verbindung (z.B. FakeVectorStore)
+            hana_database.delete(filter=delete_filter)
+        checkpoint.state["deleted"] = True
+        checkpoint.save()
+
+    stats = {"chunks": len(text_chunks), "batches": 0, "embedded_batches": 0, "reused_batches": 0,
+             "skipped_batches": 0, "resumed": resumed, "checkpoint": checkpoint.directory, "rows_written": 0}
+    offen = []
+    for nummer, start in enumerate(range(0, len(text_chunks), batch_size)):
+        stats["batches"] += 1
+        if nummer in checkpoint.state["committed"]:
+            stats["skipped_batches"] += 1
+        else:
+            offen.append((nummer, text_chunks[start:start + batch_size]))
+
+    def embed(item):
+        nummer, batch = item
+        vectors = checkpoint.load_vectors(nummer)
+        if vectors is None:
+            vectors = embeddings.embed_documents([chunk.page_content for chunk in batch])
+            checkpoint.save_vectors(nummer, vectors)
+            stats["embedded_batches"] += 1
+        else:
+            stats["reused_batches"] += 1
+        return vectors
+
+    write_seconds = [0.0]
+
+    def commit(item, vectors):
+        # Batch in einer Transaktion schreiben, erst danach als geschrieben vermerken
+        nummer, batch = item
+        start = time.perf_counter()
+        write([chunk.page_content for chunk in batch], [chunk.metadata for chunk in batch], vectors)
+        write_seconds[0] += time.perf_counter() - start
+        stats["rows_written"] += len(batch)
+        if not replace:
+            checkpoint.mark_committed(nummer)
+
+    try:
+        if replace:
+            with writer.transaction():
+                writer.delete(delete_filter)
+                pipeline_batches(offen, embed, commit)
+            checkpoint.state.update({"deleted": True, "committed": [nummer for nummer, _ in offen]})
+            checkpoint.save()
+        else:
+            pipeline_batches(offen, embed, commit)
+    finally:
+        if writer is not None:
+            writer.close()
+    stats["write_seconds"] = round(write_seconds[0], 3)
+    stats["rows_per_s"] = round(stats["rows_written"] / write_seconds[0], 1) if write_seconds[0] else None
+
+    checkpoint.state["completed"] = True
+    checkpoint.save()
+    print(f"Ingestion {os.path.basename(filepath)}: {stats['chunks']} Chunks in {stats['batches']} Batches "
+          f"({stats['embedded_batches']} neu eingebettet, {stats['reused_batches']} aus Checkpoint, "
+          f"{stats['skipped_batches']} bereits geschrieben, {stats['rows_per_s']} Zeilen/s).")
+    return stats
@@ -0,0 +1,85 @@
+# dpa_domain_gate.py
+# Domänen-Gate für Modul B: erkennt Eingaben ohne Buchhaltungsbezug (z.B. "Wie ist das Wetter in
+# Frankfurt?") anhand der Retrieval-Scores aus similarity_search_with_score und eines lokalen
+# Schlüsselwort-Klassifikators und beantwortet sie sofort ohne LLM-Aufruf.
+
+import os
+import re
+
+from .dpa_language import detect_language, no_posting_html, no_posting_json
+
+# Mindest-Ähnlichkeit (Kosinus) des besten Handbuch-Chunks; darunter gilt die Eingabe ohne
+# Fachbegriffe als themenfremd. Embeddings der ada-002-Klasse liegen auch für fremde Texte
+# meist über 0.7, daher der hohe Standardwert.
+DEFAULT_MIN_SIMILARITY = 0.78
+
+# Wortstämme aus dem Buchhaltungsvokabular (alle Sprachen der Eingabehistorie)
+DOMAIN_TERMS = [
+    # deutsch
+    "buch", "kontier", "konto", "rechnung", "kreditor", "debitor", "lieferant", "kunde", "rückstell",
+    "steuer", "bilanz", "zahlung", "abschreib", "forderung", "verbindlich", "aufwand", "ertrag", "erlös",
+    "netto", "brutto", "umsatz", "anlage", "gehalt", "lohn", "geschäftsfall", "geschäftsjahr", "kasse", "bank",
+    # englisch
+    "book", "posting", "post ", "account", "invoice", "creditor", "debtor", "supplier", "customer", "provision",
+    "tax", "balance sheet", "payment", "depreciat", "receivable", "payable", "expense", "revenue", "accrual",
+    "financial year", "fiscal", "ledger", "salary", "payroll", "asset",
+    # französisch / italienisch / niederländisch
+    "factur", "fattur", "factuur", "comptab", "contabil", "boek", "bilan", "bilanc", "balans",
+    "créancier", "fournisseur", "fornitor", "leverancier", "exercice", "esercizio", "voorziening", "riserva",
+    # finnisch
+    "kirja", "lasku", "tase", "varaus", "tilikau", "velkoja", "vero",
+    # bulgarisch
+    "фактур", "баланс", "осчетовод", "провизи", "данък", "кредитор", "финансова година",
+]
+WAEHRUNG_REGEX = re.compile(r"\d[\d.,  ]*\s*(eur|€|euro|usd|\$|chf|лв|евро)|(eur|€|usd)\s*\d", re.IGNORECASE)
+
+
+def classify_domain(text):
+    """
+    Lokaler Domänen-Klassifikator: zählt Buchhaltungsbegriffe und Beträge mit Währung.
+
+    Args:
+        text (str): Eingabe des Buchhalters.
+
+    Returns:
+        float: Domänen-Score zwischen 0 (themenfremd) und 1 (eindeutig Buchhaltung).
+    """
+    lowered = (text or "").lower()
+    treffer = sum(1 for term in DOMAIN_TERMS if term in lowered)
+    if WAEHRUNG_REGEX.search(lowered):
+        treffer += 2
+    return min(1.0, treffer / 3)
+
+
+def check_domain(text, scored_documents, min_similarity=None, output_format="html"):
+    """
+    Entscheidet, ob eine Eingabe eindeutig themenfremd ist.
+
+    Themenfremd ist eine Eingabe nur, wenn beide Signale übereinstimmen: der Klassifikator findet
+    keine Buchhaltungsbegriffe und der beste Retrieval-Score liegt unter der Mindest-Ähnlichkeit.
+    Im Zweifel läuft die Anfrage weiter an das LLM.
+
+    Args:
+        text (str): Eingabe des Buchhalters.
+        scored_documents (list): Ergebnis von similarity_search_with_score [(Document, Score)].
+        min_similarity (float, optional): Mindest-Ähnlichkeit (Standard: DPA_OOD_MIN_SIMILARITY).
+        output_format (str): Format der Antwort, "html" (prompt_template_html) oder "json" (prompt_template_json).
+
+    Returns:
+        dict: {"off_topic": bool, "domain_score": float, "top_score": float|None, "answer": str|None}
+    """
+    if min_similarity is None:
+        min_similarity = float(os.getenv("DPA_OOD_MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY))
+    domain_score = classify_domain(text)
+    top_score = max((score for _, score in scored_documents), default=None)
+    off_topic = domain_score == 0 and (top_score is None or top_score < min_similarity)
+    answer = None
+    if off_topic:
+        lang = detect_language(text)
+        answer = no_posting_json(lang) if output_format == "json" else no_posting_html(lang)
+    return {
+        "off_topic": off_topic,
+        "domain_score": domain_score,
+        "top_score": top_score,
+        "answer": answer,
+    }
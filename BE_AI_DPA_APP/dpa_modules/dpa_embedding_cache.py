@@ -0,0 +1,147 @@
+# dpa_embedding_cache.py
+# Persistenter Embedding-Cache (SQLite) für Modul A und B.
+#
+# Schlüssel ist der SHA-256-Hash aus Modellname und Text; gespeichert wird der Vektor als float32.
+# Die Datenbank wird im WAL-Modus geöffnet, damit mehrere Prozesse (z.B. die Worker der
+# Kommandozeilen-Ingestion) denselben Cache gleichzeitig lesen und beschreiben können.
+#
+# Konfiguration: DPA_EMBEDDING_CACHE  Pfad der Cache-Datei (Standard embedding_cache.sqlite, "" = aus)
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from .dpa_ledger import current_usage
+
+
+def cache_key(model_name, text):
+    """SHA-256 über Modellname und Text."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Schlüssel-Wert-Speicher für Embedding-Vektoren in einer SQLite-Datei.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _connection(self):
+        # Eine Verbindung je Thread; sqlite3-Verbindungen sind nicht threadsicher
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        """
+        Returns:
+            dict: Schlüssel -> Vektor (list of float) für alle vorhandenen Schlüssel.
+        """
+        result = {}
+        conn = self._connection()
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            teil = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(teil))})", teil
+            ).fetchall()
+            for key, blob in rows:
+                result[key] = array("f", blob).tolist()
+        return result
+
+    def put_many(self, items):
+        """Speichert (Schlüssel, Vektor)-Paare."""
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items],
+            )
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embedding-Modell mit vorgeschaltetem Cache: nur fehlende Texte werden an AI Core gesendet.
+    """
+
+    def __init__(self, embeddings, cache, model_name=None):
+        """
+        Args:
+            embeddings (Embeddings): Ursprüngliches (ggf. ratenbegrenztes) Embedding-Modell.
+            cache (EmbeddingCache): Gemeinsamer Cache.
+            model_name (str, optional): Teil des Schlüssels (Standard: AICORE_DEPLOYMENT_MODEL_EMBEDDING).
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING"))
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        embeddings = self.__dict__.get("embeddings")
+        if embeddings is None:
+            raise AttributeError(name)
+        return getattr(embeddings, name)
+
+    @staticmethod
+    def _count_hits(hits):
+        # Treffer zählen im Token- und Kostenbuch des laufenden Auftrags (dpa_ledger)
+        usage = current_usage()
+        if usage is not None and hits:
+            usage.add(embedding_cache_hits=hits)
+
+    def embed_documents(self, texts):
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(set(keys))
+        fehlend = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                fehlend.setdefault(key, text)
+        if fehlend:
+            vectors = self.embeddings.embed_documents(list(fehlend.values()))
+            neu = list(zip(fehlend.keys(), vectors))
+            self.cache.put_many(neu)
+            found.update(neu)
+        self.hits += len(texts) - len(fehlend)
+        self.misses += len(fehlend)
+        self._count_hits(len(texts) - len(fehlend))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = cache_key(self.model_name, text)
+        found = self.cache.get_many([key])
+        if key in found:
+            self.hits += 1
+            self._count_hits(1)
+            return found[key]
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many([(key, vector)])
+        return vector
+
+
+def open_embedding_cache(path=None):
+    """
+    Öffnet den konfigurierten Embedding-Cache.
+
+    Returns:
+        EmbeddingCache | None: None, wenn der Cache abgeschaltet ist (DPA_EMBEDDING_CACHE="").
+    """
+    path = os.getenv("DPA_EMBEDDING_CACHE", "embedding_cache.sqlite") if path is None else path
+    return EmbeddingCache(path) if path else None
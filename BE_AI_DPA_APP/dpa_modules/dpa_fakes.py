@@ -0,0 +1,222 @@
+# dpa_fakes.py
+# Lokale Ersatzdienste für AI Core und HANA mit einstellbarer Latenz und Fehlerrate.
+# Damit lassen sich Resilienz-Schicht, Parallelisierung und Routing ohne Cloud-Zugang prüfen, z.B.:
+#
+#   from dpa_modules.dpa_fakes import FakeEmbeddings, FakeVectorStore, FakeDocumentChain, FakeQAChain
+#   from dpa_modules.dpa_resilience import ResiliencePolicy
+#   store = FakeVectorStore(FakeEmbeddings(latency=0.05), latency=0.02)
+#   chain = FakeDocumentChain(latency=2.0, slow_share=0.1, slow_latency=20.0)
+#   run_posting_pipeline(text, FakeQAChain(chain), store, resilience=ResiliencePolicy())
+#
+# FakeHanaConnection ist eine DB-API-Verbindung auf SQLite (im Speicher) mit einstellbarer Latenz je
+# Anweisung, Zeile und Commit, z.B. für den Bulk-Writer (dpa_bulk_writer).
+
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from langchain.schema import Document
+
+
+class FakeService:
+    """
+    Gemeinsame Latenz- und Fehlersteuerung der Ersatzdienste.
+
+    Args:
+        latency (float): Normale Antwortzeit in Sekunden.
+        slow_share (float): Anteil langsamer Antworten (0..1), z.B. für Tail-Latenz.
+        slow_latency (float): Antwortzeit langsamer Antworten in Sekunden.
+        failure_rate (float): Anteil fehlschlagender Aufrufe (0..1).
+        down (bool): Dienst komplett nicht erreichbar (jeder Aufruf schlägt fehl).
+    """
+
+    def __init__(self, latency=0.0, slow_share=0.0, slow_latency=0.0, failure_rate=0.0, down=False, seed=None):
+        self.latency = latency
+        self.slow_share = slow_share
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.down = down
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(self):
+        with self._lock:
+            self.calls += 1
+            langsam = self._random.random() < self.slow_share
+            fehler = self.down or self._random.random() < self.failure_rate
+        time.sleep(self.slow_latency if langsam else self.latency)
+        if fehler:
+            raise ConnectionError(f"{type(self).__name__}: simulierter Dienstfehler")
+
+
+class FakeEmbeddings(FakeService):
+    """Embedding-Modell mit deterministischen Vektoren aus dem Text (gleicher Text, gleicher Vektor)."""
+
+    def __init__(self, dimension=8, **kwargs):
+        super().__init__(**kwargs)
+        self.dimension = dimension
+
+    def _vector(self, text):
+        rnd = random.Random(text)
+        return [rnd.uniform(-1, 1) for _ in range(self.dimension)]
+
+    def embed_query(self, text):
+        self._simulate()
+        return self._vector(text)
+
+    def embed_documents(self, texts):
+        self._simulate()
+        return [self._vector(text) for text in texts]
+
+
+class FakeVectorStore(FakeService):
+    """Vektor-Datenbank mit der Schnittstelle von HanaDB (nur die in Modul B genutzten Methoden)."""
+
+    def __init__(self, embedding, documents=None, score=0.85, **kwargs):
+        super().__init__(**kwargs)
+        self.embedding = embedding
+        self.documents = documents or [Document(page_content="HGB / US GAAP Eingangsrechnung", metadata={"page": 1})]
+        self.score = score
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None):
+        self._simulate()
+        return [(doc, self.score) for doc in self.documents[:k]]
+
+    def similarity_search_with_score(self, query, k=4, filter=None):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+
+class FakeDocumentChain(FakeService):
+    """Dokumenten-Kette (wie qa_chain.combine_documents_chain) mit fester Antwort."""
+
+    def __init__(self, answer='<div class="buchungssatz"></div>', **kwargs):
+        super().__init__(**kwargs)
+        self.answer = answer
+
+    def run(self, input_documents=None, question=None, callbacks=None):
+        self._simulate()
+        return self.answer
+
+
+class FakeQAChain:
+    """Hülle mit combine_documents_chain, wie sie run_posting_pipeline erwartet."""
+
+    def __init__(self, combine_documents_chain):
+        self.combine_documents_chain = combine_documents_chain
+
+
+class FakeHanaCursor:
+    """Cursor der FakeHanaConnection; übersetzt die vom Projekt genutzten HANA-Ausdrücke nach SQLite."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.db.cursor()
+        self.rowcount = -1
+
+    @staticmethod
+    def _translate(sql):
+        sql = re.sub(r"TO_REAL_VECTOR\s*\(\s*\?\s*\)", "?", sql)
+        sql = re.sub(r"TO_NVARCHAR\((\"?\w+\"?)\)", r"\1", sql)
+        sql = sql.replace("SYS.TABLES WHERE SCHEMA_NAME = CURRENT_SCHEMA AND TABLE_NAME", "sqlite_master WHERE type = 'table' AND name")
+        sql = sql.replace("CURRENT_UTCTIMESTAMP", "CURRENT_TIMESTAMP")
+        sql = sql.replace("JSON_VALUE(", "json_extract(")
+        return sql
+
+    def execute(self, sql, params=()):
+        self.connection._statement(1)
+        self._cursor.execute(self._translate(sql), params)
+        self.rowcount = self._cursor.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        self.connection._statement(len(seq_of_params))
+        self._cursor.executemany(self._translate(sql), seq_of_params)
+        self.rowcount = self._cursor.rowcount
+
+    def has_result_set(self):
+        return self._cursor.description is not None
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class FakeHanaConnection(FakeService):
+    """
+    DB-API-Verbindung mit der Schnittstelle von hdbcli (autocommit, commit, rollback) auf SQLite.
+
+    Args:
+        row_latency (float): Zusätzliche Zeit je gebundener Zeile in Sekunden.
+        commit_latency (float): Zeit je Commit in Sekunden (im autocommit-Modus je Anweisung).
+        latency (float): Zeit je Anweisung bzw. executemany-Aufruf (Netzwerk-Roundtrip).
+        database (str, optional): SQLite-URI einer bestehenden Ersatz-Datenbank (siehe clone).
+    """
+
+    def __init__(self, row_latency=0.0, commit_latency=0.0, autocommit=True, database=None, **kwargs):
+        super().__init__(**kwargs)
+        self.row_latency = row_latency
+        self.commit_latency = commit_latency
+        # Benannte In-Memory-Datenbank, damit clone() weitere Verbindungen darauf öffnen kann
+        self.database = database or f"file:fakehana_{uuid.uuid4().hex}?mode=memory&cache=shared"
+        self.db = sqlite3.connect(self.database, uri=True, check_same_thread=False, isolation_level=None)
+        self._autocommit = autocommit
+        self.commits = 0
+        if not autocommit:
+            self.db.execute("BEGIN")
+
+    def create_vector_table(self, table_name):
+        """Legt eine Tabelle mit den Spalten von HanaDB an (VEC_TEXT, VEC_META, VEC_VECTOR)."""
+        self.db.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" (VEC_TEXT TEXT, VEC_META TEXT, VEC_VECTOR TEXT)')
+
+    def _statement(self, rows):
+        self._simulate()
+        time.sleep(rows * self.row_latency)
+        if self._autocommit:
+            self.commits += 1
+            time.sleep(self.commit_latency)
+
+    def cursor(self):
+        return FakeHanaCursor(self)
+
+    def clone(self):
+        """Weitere Verbindung auf dieselbe Datenbank mit eigener Transaktion (wie ein zweites dbapi.connect)."""
+        return FakeHanaConnection(row_latency=self.row_latency, commit_latency=self.commit_latency,
+                                  database=self.database, latency=self.latency, slow_share=self.slow_share,
+                                  slow_latency=self.slow_latency, failure_rate=self.failure_rate, down=self.down)
+
+    def getautocommit(self):
+        return self._autocommit
+
+    def setautocommit(self, autocommit):
+        if autocommit and not self._autocommit:
+            self.db.execute("COMMIT")
+        elif not autocommit and self._autocommit:
+            self.db.execute("BEGIN")
+        self._autocommit = autocommit
+
+    def commit(self):
+        if not self._autocommit:
+            self.commits += 1
+            time.sleep(self.commit_latency)
+            self.db.execute("COMMIT")
+            self.db.execute("BEGIN")
+
+    def rollback(self):
+        if not self._autocommit:
+            self.db.execute("ROLLBACK")
+            self.db.execute("BEGIN")
+
+    def close(self):
+        self.db.close()
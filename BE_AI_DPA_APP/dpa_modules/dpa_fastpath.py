@@ -0,0 +1,514 @@
+# dpa_fastpath.py
+# Regelbasierter Schnellpfad für Standard-Geschäftsfälle in Modul B
+#
+# Einfache Einzel-Geschäftsfälle (z.B. "Buche eine Eingangsrechnung für Wartung von Kreditor AAA
+# mit 100 EUR netto und Vorsteuer 19 EUR.") werden lokal klassifiziert, Beträge und Steuern
+# deterministisch geparst und die Konten aus dem Regelindex des Kontierungshandbuchs ermittelt.
+# Nur wenn die Konfidenz zu gering ist, wird auf die vollständige RAG-Chain (Retrieval + LLM)
+# zurückgefallen; das gilt auch für Stück- bzw. Positionspreise ("2 Positionen zu je 100 EUR")
+# und für Netto- und Steuerbeträge, die zu keinem Steuersatz passen.
+#
+# Konfiguration: DPA_FASTPATH_ENABLED, DPA_FASTPATH_MIN_CONFIDENCE (Standard 0.8),
+#                DPA_FASTPATH_MAX_CHARS (Standard 400),
+#                DPA_FASTPATH_VAT_RATES (zulässige Steuersätze in %, Standard "19,7")
+
+import html
+import json
+import os
+import re
+
+from .dpa_language import LABELS, detect_language
+
+# --- Konfiguration ---
+
+# Mindestkonfidenz, ab der die lokale Antwort ohne LLM ausgegeben wird
+DEFAULT_MIN_CONFIDENCE = 0.8
+# Längere Eingaben sind in der Regel Mehrfach-Geschäftsfälle und gehen an die RAG-Chain
+DEFAULT_MAX_CHARS = 400
+# Steuersätze, zu denen ein Steuerbetrag ohne Satzangabe passen muss
+DEFAULT_VAT_RATES = "19,7"
+
+# --- Kontentabelle aus dem Kontierungshandbuch ---
+# Kontorollen werden über die Kontobezeichnung im Regelindex (dpa_rule_index) gesucht. Ohne Index
+# gelten die Konten aus Kap. 3.1.3.1 "Auflösung der HGB-Rückstellung bei Eintritt des
+# Rückstellungsgrundes" (Buchen Verbindlichkeiten / Buchen Zahlung) des Kontierungshandbuchs.
+KONTO_ROLLEN = {
+    "kreditor": (r"^kreditor$", ("44001000", "Kreditor")),
+    "vorsteuer": (r"^vorsteuer$", ("15760000", "Vorsteuer")),
+    "bank": (r"^bank$", ("12000000", "Bank")),
+}
+
+# Aufwandskonten werden anhand der Leistungsart im Geschäftsfall gewählt
+AUFWANDSKONTEN = [
+    (r"instandhalt|wartung|reparatur|maintenance|repair", r"^instandhaltungskosten$", ("61605010", "Instandhaltungskosten")),
+]
+
+# Englische Kontenbezeichnungen für die Ausgabe in der Sprache der Eingabe
+KONTO_UEBERSETZUNGEN = {
+    "en": {
+        "Kreditor": "Creditor (accounts payable)",
+        "Vorsteuer": "Input tax",
+        "Bank": "Bank",
+        "Instandhaltungskosten": "Maintenance expenses",
+    },
+}
+
+# --- Geschäftsfall-Kategorien (Auszug aus der Tabelle in prompt_template_html) ---
+# Reihenfolge = Priorität: "Eingangsrechnung zahlen" vor "Eingangsrechnung buchen";
+# "schliesst_ein" nennt Kategorien, deren Muster eine Kategorie zwangsläufig mit erfüllt
+KATEGORIEN = [
+    {
+        "kategorie": "Eingangsrechnung zahlen",
+        "bezeichnung": {"de": "Eingangsrechnung zahlen", "en": "Payment of incoming invoice"},
+        # Eine Zahlung nennt fast immer auch die Rechnung; das ist keine Mehrdeutigkeit
+        "schliesst_ein": ["Eingangsrechnung buchen"],
+        "muster": [
+            r"\b(zahl|bezahl|begleich|überweis)\w*\b.*\b(eingangsrechnung|rechnung|kreditor|lieferant)",
+            r"\b(eingangsrechnung|rechnung)\b.*\b(zahlen|bezahlen|begleichen|überweisen)\b",
+            r"\bpay(ment|ing)?\b.*\b(invoice|supplier|creditor|vendor)",
+            r"\binvoice\b.*\bpa(y|id)\b",
+        ],
+    },
+    {
+        "kategorie": "Eingangsrechnung buchen",
+        "bezeichnung": {"de": "Eingangsrechnung buchen", "en": "Posting of incoming invoice"},
+        "muster": [
+            r"\beingangsrechnung\b",
+            r"\b(lieferanten)?rechnung\b.*\b(kreditor|lieferant)",
+            r"\bincoming invoice\b",
+            r"\b(supplier|vendor)\s+invoice\b",
+            r"\binvoice\b.*\b(supplier|creditor|vendor)\b",
+        ],
+    },
+]
+
+# Begriffe, die auf Sonderfälle hindeuten, die immer über die RAG-Chain laufen
+AUSSCHLUSS_MUSTER = (
+    r"rückstellung|provision|abschreib|depreciat|anlage|asset|bilanz|balance sheet|gutschrift|credit note"
+    r"|storno|revers|skonto|discount|anzahlung|down payment|teilzahlung|partial|ratenzahlung|instalment"
+)
+
+STEUER_MUSTER = r"(vorsteuer|umsatzsteuer|mehrwertsteuer|ust\b|mwst|input tax|vat\b|tax\b)"
+NETTO_MUSTER = r"(netto|net)\b"
+BRUTTO_MUSTER = r"(brutto|gross)\b"
+# Eine in der Rechnung enthaltene Steuer ("davon 95 EUR USt", "inkl. 19% MwSt") macht den Grundbetrag zum Bruttobetrag
+ENTHALTEN_MUSTER = r"\b(davon|darin|inkl\b|inklusive|einschließlich|enthalten|incl\b|including|included|of which)"
+WAEHRUNGEN = {"eur": "EUR", "€": "EUR", "euro": "EUR", "euros": "EUR", "usd": "USD", "$": "USD", "chf": "CHF", "gbp": "GBP"}
+WAEHRUNG_MUSTER = r"(eur|€|euros?|usd|\$|chf|gbp)"
+ZAHL_MUSTER = r"\d{1,3}(?:[.,  ]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+BETRAG_REGEX = re.compile(
+    rf"(?:(?P<w1>{WAEHRUNG_MUSTER})\s*)?(?<![\w.,])(?P<zahl>{ZAHL_MUSTER})(?![\w])\s*(?:(?P<w2>{WAEHRUNG_MUSTER})\b|(?P<prozent>%|prozent\b|percent\b))?",
+    re.IGNORECASE,
+)
+# Stück- bzw. Positionspreise: der genannte Betrag ist nicht der Rechnungsbetrag
+MENGEN_MUSTER = (
+    r"\b(je|à|each|apiece)\b|\bpro\s+(stück|stk|einheit|position|posten)\b|\bper\s+(unit|piece|item)\b"
+    r"|\d\s*[x×]\s*\d|\d\s*[x×]\s*(eur|€|usd|\$|chf|gbp)|\b\d+\s*(stück|stk|positionen|einheiten|units|pieces|items)\b"
+)
+# Trennzeichen zwischen Satzteilen für die Zuordnung von Schlüsselwörtern zu Beträgen
+SATZTEIL_TRENNER = re.compile(r"[,;:]|\b(und|and|sowie|plus)\b", re.IGNORECASE)
+
+
+def parse_number(text):
+    """
+    Wandelt eine Zahl im deutschen oder englischen Format in einen float um.
+
+    Args:
+        text (str): Zahl als Text, z.B. "20.000", "19,500", "3 705" oder "100,50".
+
+    Returns:
+        float: Der Zahlenwert.
+    """
+    value = re.sub(r"[  ]", "", text)
+    if "." in value and "," in value:
+        # Das zuletzt stehende Zeichen ist das Dezimaltrennzeichen
+        decimal_sep = "." if value.rfind(".") > value.rfind(",") else ","
+        thousands_sep = "," if decimal_sep == "." else "."
+        value = value.replace(thousands_sep, "").replace(decimal_sep, ".")
+    elif "." in value or "," in value:
+        sep = "." if "." in value else ","
+        parts = value.split(sep)
+        # Ein Trennzeichen vor genau drei Ziffern ist ein Tausendertrennzeichen
+        if len(parts) > 2 or len(parts[-1]) == 3:
+            value = value.replace(sep, "")
+        else:
+            value = value.replace(sep, ".")
+    return float(value)
+
+
+def parse_amounts(text):
+    """
+    Extrahiert Beträge, Steuerbeträge und Steuersätze deterministisch aus dem Geschäftsfall.
+
+    Beträge werden nur mit Währungsangabe gewertet, Steuersätze nur mit Prozentangabe.
+    Ein Betrag gilt als Steuer, wenn im selben Satzteil davor (oder direkt dahinter) ein
+    Steuerbegriff steht; analog für "netto"/"brutto". Steht bei Steuer oder Steuersatz
+    "davon", "inkl." o.ä., ist die Steuer im Grundbetrag enthalten (steuer_enthalten).
+    Mengen- bzw. Stückpreisangaben ("2 Positionen zu je 100 EUR") setzen mengenangabe.
+
+    Args:
+        text (str): Beschreibung des Geschäftsfalls.
+
+    Returns:
+        dict: {"betraege": [{"wert", "netto", "brutto"}], "steuer": float|None,
+               "steuersatz": float|None, "steuer_enthalten": bool, "mengenangabe": bool,
+               "waehrung": str|None}
+    """
+    result = {"betraege": [], "steuer": None, "steuersatz": None, "steuer_enthalten": False,
+              "mengenangabe": bool(re.search(MENGEN_MUSTER, text, re.IGNORECASE)), "waehrung": None}
+    for match in BETRAG_REGEX.finditer(text):
+        waehrung = match.group("w1") or match.group("w2")
+        prozent = match.group("prozent")
+        if not waehrung and not prozent:
+            continue
+        wert = parse_number(match.group("zahl"))
+        # Satzteil vor dem Betrag und das erste Wort dahinter bestimmen die Bedeutung
+        vorher = SATZTEIL_TRENNER.split(text[:match.start()])[-1].lower()
+        nachher_match = re.match(r"\s*([\w-]+)", text[match.end():])
+        nachher = nachher_match.group(1).lower() if nachher_match else ""
+        ist_steuer = bool(re.search(STEUER_MUSTER, vorher) or re.match(STEUER_MUSTER, nachher))
+        if prozent or ist_steuer:
+            satzteil = vorher + " " + SATZTEIL_TRENNER.split(text[match.end():])[0].lower()
+            result["steuer_enthalten"] |= bool(re.search(ENTHALTEN_MUSTER, satzteil))
+        if prozent:
+            # Prozentangaben sind bei Eingangsrechnungen immer Steuersätze
+            result["steuersatz"] = wert
+            continue
+        result["waehrung"] = result["waehrung"] or WAEHRUNGEN[waehrung.lower()]
+        if ist_steuer:
+            result["steuer"] = wert
+            continue
+        result["betraege"].append({
+            "wert": wert,
+            "netto": bool(re.search(NETTO_MUSTER, vorher) or re.match(NETTO_MUSTER, nachher)),
+            "brutto": bool(re.search(BRUTTO_MUSTER, vorher) or re.match(BRUTTO_MUSTER, nachher)),
+        })
+    return result
+
+
+def resolve_amounts(amounts, steuer_erforderlich=True):
+    """
+    Ermittelt Netto-, Steuer- und Bruttobetrag aus den geparsten Beträgen.
+
+    Ein Grundbetrag ohne Kennzeichnung gilt als Netto, bei enthaltener Steuer ("davon ... USt")
+    als Brutto. Ohne Steuerbetrag und Steuersatz ist die Aufteilung nicht eindeutig. Der
+    Steuerbetrag muss zum genannten Steuersatz bzw. zu einem Satz aus DPA_FASTPATH_VAT_RATES
+    passen; Stückpreise (mengenangabe) werden nicht hochgerechnet.
+
+    Args:
+        amounts (dict): Ergebnis von parse_amounts().
+        steuer_erforderlich (bool): False, wenn nur der Gesamtbetrag gebraucht wird (Zahlung);
+            ein Betrag ohne Kennzeichnung und ohne Steuerangabe ist dann der Zahlbetrag.
+
+    Returns:
+        dict | None: {"netto", "steuer", "brutto", "waehrung"} oder None, wenn die Beträge
+        nicht eindeutig sind (kein oder mehrere Grundbeträge, Stückpreise, Steuer nicht bestimmbar
+        oder nicht stimmig).
+    """
+    if len(amounts["betraege"]) != 1 or amounts.get("mengenangabe"):
+        return None
+    betrag = amounts["betraege"][0]
+    steuer, satz = amounts["steuer"], amounts["steuersatz"]
+    if steuer is None and satz is None:
+        if steuer_erforderlich or betrag["netto"]:
+            return None
+        return {"netto": None, "steuer": None, "brutto": betrag["wert"], "waehrung": amounts["waehrung"]}
+    if betrag["brutto"] or (amounts.get("steuer_enthalten") and not betrag["netto"]):
+        brutto = betrag["wert"]
+        if steuer is not None:
+            netto = round(brutto - steuer, 2)
+        else:
+            netto = round(brutto / (1 + satz / 100), 2)
+            steuer = round(brutto - netto, 2)
+    else:
+        netto = betrag["wert"]
+        if steuer is None:
+            steuer = round(netto * satz / 100, 2)
+        brutto = round(netto + steuer, 2)
+    if not reconciles(netto, steuer, satz):
+        return None
+    return {"netto": netto, "steuer": steuer, "brutto": brutto, "waehrung": amounts["waehrung"]}
+
+
+def reconciles(netto, steuer, satz=None):
+    """
+    Prüft, ob Netto- und Steuerbetrag zusammenpassen: zum genannten Steuersatz oder, ohne
+    Satzangabe, zu einem der Sätze aus DPA_FASTPATH_VAT_RATES (Rundung auf einen Cent).
+
+    Returns:
+        bool: True, wenn der Steuerbetrag zu einem zulässigen Steuersatz passt.
+    """
+    if satz is not None:
+        saetze = [satz]
+    else:
+        saetze = [float(s) for s in os.getenv("DPA_FASTPATH_VAT_RATES", DEFAULT_VAT_RATES).split(",") if s.strip()]
+    return netto > 0 and any(abs(round(netto * s / 100, 2) - steuer) <= 0.01 for s in saetze)
+
+
+def classify_business_case(text):
+    """
+    Ordnet einen einfachen Einzel-Geschäftsfall einer Geschäftsfall-Kategorie zu.
+
+    Args:
+        text (str): Beschreibung des Geschäftsfalls.
+
+    Returns:
+        tuple: (Kategorie-Dict oder None, Anzahl der passenden Kategorien)
+    """
+    lowered = text.lower()
+    treffer = [k for k in KATEGORIEN if any(re.search(m, lowered) for m in k["muster"])]
+    eingeschlossen = {name for k in treffer for name in k.get("schliesst_ein", [])}
+    treffer = [k for k in treffer if k["kategorie"] not in eingeschlossen]
+    return (treffer[0] if treffer else None), len(treffer)
+
+
+def is_single_case(text, max_chars=DEFAULT_MAX_CHARS):
+    """
+    Prüft, ob die Eingabe ein kurzer Einzel-Geschäftsfall ist.
+
+    Args:
+        text (str): Beschreibung des Geschäftsfalls.
+        max_chars (int): Maximale Länge für den Schnellpfad.
+
+    Returns:
+        bool: True, wenn nur ein Geschäftsfall beschrieben ist.
+    """
+    if len(text) > max_chars:
+        return False
+    aufzaehlungen = [z for z in text.splitlines() if re.match(r"\s*([-*•]|\d+[.)])\s+", z)]
+    return len(aufzaehlungen) <= 1
+
+
+def lookup_account(rolle, text="", rule_index=None):
+    """
+    Ermittelt Kontonummer und -bezeichnung für eine Kontorolle aus dem Regelindex.
+
+    Args:
+        rolle (str): "kreditor", "vorsteuer", "bank" oder "aufwand".
+        text (str): Geschäftsfall, für die Auswahl des Aufwandskontos.
+        rule_index (RuleIndex, optional): Regelindex aus dem Handbuch; ohne Index wird die
+            Standard-Kontentabelle verwendet.
+
+    Returns:
+        tuple | None: (Kontonummer, Bezeichnung) oder None, wenn kein Konto passt.
+    """
+    if rolle == "aufwand":
+        lowered = text.lower()
+        kandidaten = [(label, konto) for muster, label, konto in AUFWANDSKONTEN if re.search(muster, lowered)]
+    elif rolle in KONTO_ROLLEN:
+        kandidaten = [KONTO_ROLLEN[rolle]]
+    else:
+        return None
+    for label, konto in kandidaten:
+        if rule_index:
+            gefunden = rule_index.find_account(label)
+            if gefunden:
+                return gefunden
+        else:
+            return konto
+    return None
+
+
+def _partner(text):
+    match = re.search(r"\b(?:kreditor|lieferanten?|supplier|vendor|creditor)\s+([A-Z0-9][\w&.-]*)", text, re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def _format_amount(value, waehrung, lang):
+    formatted = f"{value:,.2f}"
+    if lang == "de":
+        formatted = formatted.replace(",", "X").replace(".", ",").replace("X", ".")
+    return f"{formatted} {waehrung}"
+
+
+def _account_label(konto, lang):
+    nummer, bezeichnung = konto
+    bezeichnung = KONTO_UEBERSETZUNGEN.get(lang, {}).get(bezeichnung, bezeichnung)
+    return f"{nummer} - {bezeichnung}"
+
+
+def build_postings(kategorie, betraege, text, rule_index=None):
+    """
+    Erstellt die Buchungszeilen (Soll, Haben, Betrag) für eine Kategorie.
+
+    Args:
+        kategorie (dict): Kategorie aus KATEGORIEN.
+        betraege (dict): Ergebnis von resolve_amounts().
+        text (str): Beschreibung des Geschäftsfalls.
+        rule_index (RuleIndex, optional): Regelindex aus dem Handbuch.
+
+    Returns:
+        list | None: Liste von (Soll-Konto, Haben-Konto, Betrag) oder None, wenn ein Konto fehlt.
+    """
+    kreditor = lookup_account("kreditor", rule_index=rule_index)
+    if kategorie["kategorie"] == "Eingangsrechnung zahlen":
+        bank = lookup_account("bank", rule_index=rule_index)
+        if not (kreditor and bank):
+            return None
+        return [(kreditor, bank, betraege["brutto"])]
+    aufwand = lookup_account("aufwand", text, rule_index=rule_index)
+    vorsteuer = lookup_account("vorsteuer", rule_index=rule_index)
+    if not (kreditor and aufwand and vorsteuer):
+        return None
+    zeilen = [(aufwand, kreditor, betraege["netto"])]
+    if betraege["steuer"]:
+        zeilen.append((vorsteuer, kreditor, betraege["steuer"]))
+    return zeilen
+
+
+def render_posting_html(kategorie, zeilen, betraege, text, lang):
+    """
+    Gibt den Buchungssatz im HTML-Antwortformat von prompt_template_html aus.
+
+    Args:
+        kategorie (dict): Kategorie aus KATEGORIEN.
+        zeilen (list): Buchungszeilen aus build_postings().
+        betraege (dict): Ergebnis von resolve_amounts().
+        text (str): Beschreibung des Geschäftsfalls.
+        lang (str): Sprache der Ausgabe ("de" oder "en").
+
+    Returns:
+        str: HTML-Block <div class="buchungssatz">.
+    """
+    labels = LABELS[lang]
+    bezeichnung = kategorie["bezeichnung"][lang]
+    partner = _partner(text)
+    titel = f"{bezeichnung} {'Kreditor' if lang == 'de' else 'creditor'} {partner}" if partner else bezeichnung
+    rows = "\n".join(
+        "      <tr>\n"
+        f"        <td>{html.escape(_account_label(soll, lang))}</td>\n"
+        f"        <td>{html.escape(_account_label(haben, lang))}</td>\n"
+        f"        <td>{_format_amount(betrag, betraege['waehrung'], lang)}</td>\n"
+        "      </tr>"
+        for soll, haben, betrag in zeilen
+    )
+    if lang == "de":
+        erlaeuterung = (
+            f"Standardkontierung für die Kategorie \"{bezeichnung}\" gemäß Kontierungshandbuch"
+            f" (Soll {zeilen[0][0][0]} an Haben {zeilen[0][1][0]}); Beträge aus dem Geschäftsfall übernommen."
+        )
+    else:
+        erlaeuterung = (
+            f"Standard posting for the category \"{bezeichnung}\" according to the accounting manual"
+            f" (debit {zeilen[0][0][0]} to credit {zeilen[0][1][0]}); amounts taken from the business case."
+        )
+    return (
+        '<div class="buchungssatz">\n'
+        f"  <h2>{labels['geschaeftsfall']}: {html.escape(titel)}</h2>\n"
+        f"  <h3>{labels['kategorie']}: {html.escape(bezeichnung)}</h3>\n"
+        '  <div class="kontierung">\n'
+        "    <table>\n"
+        "      <tr>\n"
+        f"        <th>{labels['soll']}</th>\n"
+        f"        <th>{labels['haben']}</th>\n"
+        f"        <th>{labels['betrag']}</th>\n"
+        "      </tr>\n"
+        f"{rows}\n"
+        "    </table>\n"
+        "  </div>\n"
+        '  <div class="erläuterung">\n'
+        f"    <p>{html.escape(erlaeuterung)}</p>\n"
+        "  </div>\n"
+        "</div>"
+    )
+
+
+def render_posting_json(kategorie, zeilen, betraege, text, lang):
+    """
+    Gibt den Buchungssatz im JSON-Antwortformat von prompt_template_json aus.
+
+    Args: wie render_posting_html.
+
+    Returns:
+        str: JSON-Objekt {"geschaeftsfall": {...}}.
+    """
+    bezeichnung = kategorie["bezeichnung"][lang]
+    partner = _partner(text)
+    titel = f"{bezeichnung} {'Kreditor' if lang == 'de' else 'creditor'} {partner}" if partner else bezeichnung
+    buchungen = [
+        {
+            "soll": {"kontonummer": soll[0], "bezeichnung": KONTO_UEBERSETZUNGEN.get(lang, {}).get(soll[1], soll[1])},
+            "haben": {"kontonummer": haben[0], "bezeichnung": KONTO_UEBERSETZUNGEN.get(lang, {}).get(haben[1], haben[1])},
+            "betrag": f"{betrag:.2f}",
+            "waehrung": betraege["waehrung"],
+        }
+        for soll, haben, betrag in zeilen
+    ]
+    if lang == "de":
+        erlaeuterung = f"Standardkontierung für die Kategorie \"{bezeichnung}\" gemäß Kontierungshandbuch."
+    else:
+        erlaeuterung = f"Standard posting for the category \"{bezeichnung}\" according to the accounting manual."
+    return json.dumps(
+        {"geschaeftsfall": {"bezeichnung": titel, "buchungen": buchungen, "erlaeuterung": erlaeuterung}},
+        ensure_ascii=False,
+    )
+
+
+def evaluate_fast_path(text, rule_index=None):
+    """
+    Bewertet, ob ein Geschäftsfall lokal ohne LLM kontiert werden kann.
+
+    Die Konfidenz setzt sich zusammen aus eindeutiger Kategorie (0.5), eindeutig auflösbaren
+    Beträgen (0.3) und vollständig ermittelten Konten (0.2). Passen mehrere Kategorien, bleibt
+    es bei 0.3 für die Kategorie und der Fall geht an die RAG-Chain.
+
+    Args:
+        text (str): Beschreibung des Geschäftsfalls.
+        rule_index (RuleIndex, optional): Regelindex aus dem Handbuch.
+
+    Returns:
+        dict: {"confidence": float, "kategorie", "betraege", "zeilen", "lang"}
+    """
+    result = {"confidence": 0.0, "kategorie": None, "betraege": None, "zeilen": None, "lang": None}
+    text = (text or "").strip()
+    if not text or not is_single_case(text, int(os.getenv("DPA_FASTPATH_MAX_CHARS", DEFAULT_MAX_CHARS))):
+        return result
+    if re.search(AUSSCHLUSS_MUSTER, text.lower()):
+        return result
+    result["lang"] = detect_language(text)
+    if result["lang"] not in LABELS:
+        return result
+    kategorie, anzahl = classify_business_case(text)
+    if not kategorie:
+        return result
+    result["kategorie"] = kategorie
+    if anzahl > 1:
+        result["confidence"] = 0.3
+        return result
+    result["confidence"] += 0.5
+    betraege = resolve_amounts(parse_amounts(text), kategorie["kategorie"] != "Eingangsrechnung zahlen")
+    if not betraege:
+        return result
+    result["betraege"] = betraege
+    result["confidence"] += 0.3
+    zeilen = build_postings(kategorie, betraege, text, rule_index)
+    if zeilen:
+        result["zeilen"] = zeilen
+        result["confidence"] += 0.2
+    return result
+
+
+def fast_path_answer(text, min_confidence=None, rule_index=None, output_format="html"):
+    """
+    Liefert die lokal ermittelte Kontierung oder None für den Rückfall auf die RAG-Chain.
+
+    Args:
+        text (str): Beschreibung des Geschäftsfalls.
+        min_confidence (float, optional): Mindestkonfidenz (Standard: DPA_FASTPATH_MIN_CONFIDENCE).
+        rule_index (RuleIndex, optional): Regelindex aus dem Handbuch.
+        output_format (str): "html" (prompt_template_html) oder "json" (prompt_template_json).
+
+    Returns:
+        str | None: Antwort im gewählten Format oder None, wenn die Konfidenz zu gering ist.
+    """
+    if os.getenv("DPA_FASTPATH_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if min_confidence is None:
+        min_confidence = float(os.getenv("DPA_FASTPATH_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE))
+    evaluation = evaluate_fast_path(text, rule_index)
+    if not evaluation["zeilen"] or evaluation["confidence"] < min_confidence:
+        return None
+    render = render_posting_json if output_format == "json" else render_posting_html
+    return render(
+        evaluation["kategorie"], evaluation["zeilen"], evaluation["betraege"], text.strip(), evaluation["lang"]
+    )
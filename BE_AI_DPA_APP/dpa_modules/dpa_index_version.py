@@ -0,0 +1,149 @@
+# dpa_index_version.py
+# Versionszähler des Vektorindex: Änderungsmeldungen von Modul A an Modul B.
+#
+# Nach einer Ingestion in die bestehende Tabelle ändert sich in der Zeigertabelle (dpa_bluegreen) nichts;
+# Modul B arbeitet dann mit veraltetem Regelindex, Snapshot und Antwort-Caches weiter. Am Ende jeder
+# Ingestion, Umschaltung oder Rücknahme erhöht Modul A daher einen Zähler je Tabellenname:
+#
+#   DPA_INDEX_VERSION (ALIAS, VERSION, VECTOR_TABLE, SOURCE, CHANGED_AT)
+#
+# Das Erhöhen ist ein einzelnes UPDATE (VERSION = VERSION + 1) und damit atomar, auch bei mehreren
+# schreibenden Prozessen. Modul B fragt den Zähler mit IndexVersionWatcher höchstens alle
+# DPA_INDEX_VERSION_REFRESH Sekunden ab (eine Zeile per Primärschlüssel) und baut bei einer neuen
+# Version Vektorspeicher, Regelindex und Ketten neu auf, ohne Neustart. Im selben Prozess (app_dpa.py)
+# kommt die Meldung zusätzlich sofort über dpa_services.
+#
+# Konfiguration: DPA_INDEX_VERSION_TABLE (Standard DPA_INDEX_VERSION),
+#                DPA_INDEX_VERSION_REFRESH (Sekunden, Standard 5)
+
+import os
+import threading
+import time
+
+from .dpa_bluegreen import _commit, _table_exists
+
+
+def version_table_name():
+    """Name der Versionstabelle (DPA_INDEX_VERSION_TABLE)."""
+    return os.getenv("DPA_INDEX_VERSION_TABLE", "DPA_INDEX_VERSION")
+
+
+def ensure_version_table(hana_connection):
+    """Legt die Versionstabelle an, falls sie noch nicht existiert."""
+    table = version_table_name()
+    cursor = hana_connection.cursor()
+    try:
+        if not _table_exists(cursor, table):
+            cursor.execute(
+                f'CREATE TABLE "{table}" (ALIAS NVARCHAR(256) PRIMARY KEY, VERSION BIGINT NOT NULL, '
+                f'VECTOR_TABLE NVARCHAR(256), SOURCE NVARCHAR(512), CHANGED_AT TIMESTAMP)'
+            )
+    finally:
+        cursor.close()
+
+
+def read_index_version(hana_connection, alias=None):
+    """
+    Liest den Versionseintrag zu einem Tabellennamen.
+
+    Returns:
+        dict: {"alias", "version", "vector_table", "source", "changed_at"}; version 0, solange noch
+              keine Änderung gemeldet wurde.
+    """
+    alias = alias or str(os.getenv("hdb_table_name"))
+    table = version_table_name()
+    cursor = hana_connection.cursor()
+    try:
+        row = None
+        if _table_exists(cursor, table):
+            cursor.execute(f'SELECT VERSION, VECTOR_TABLE, SOURCE, CHANGED_AT FROM "{table}" WHERE ALIAS = ?', (alias,))
+            row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row is None:
+        return {"alias": alias, "version": 0, "vector_table": None, "source": None, "changed_at": None}
+    return {"alias": alias, "version": int(row[0]), "vector_table": row[1], "source": row[2],
+            "changed_at": str(row[3]) if row[3] is not None else None}
+
+
+def bump_index_version(hana_connection, alias=None, vector_table=None, source=None):
+    """
+    Erhöht die Indexversion nach einer abgeschlossenen Änderung der Vektortabelle.
+
+    Args:
+        hana_connection: Aktive HANA-Datenbankverbindung.
+        alias (str, optional): Konfigurierter Tabellenname (Standard: hdb_table_name).
+        vector_table (str, optional): Tabelle, die geändert bzw. aktiviert wurde.
+        source (str, optional): Auslöser, z.B. Dateiname oder "switch"/"rollback".
+
+    Returns:
+        int: Neue Version.
+    """
+    alias = alias or str(os.getenv("hdb_table_name"))
+    source = source[:512] if source else None
+    ensure_version_table(hana_connection)
+    table = version_table_name()
+    cursor = hana_connection.cursor()
+    try:
+        for attempt in range(2):
+            cursor.execute(
+                f'UPDATE "{table}" SET VERSION = VERSION + 1, VECTOR_TABLE = ?, SOURCE = ?, '
+                f'CHANGED_AT = CURRENT_UTCTIMESTAMP WHERE ALIAS = ?',
+                (vector_table, source, alias),
+            )
+            if cursor.rowcount:
+                break
+            try:
+                cursor.execute(
+                    f'INSERT INTO "{table}" (ALIAS, VERSION, VECTOR_TABLE, SOURCE, CHANGED_AT) '
+                    f'VALUES (?, 1, ?, ?, CURRENT_UTCTIMESTAMP)',
+                    (alias, vector_table, source),
+                )
+                break
+            except Exception:
+                # Gleichzeitig von einem anderen Prozess angelegt: erneut erhöhen
+                if attempt:
+                    raise
+    finally:
+        cursor.close()
+    _commit(hana_connection)
+    version = read_index_version(hana_connection, alias)["version"]
+    print(f"Index version {alias}: {version} ({vector_table}, {source}).")
+    return version
+
+
+class IndexVersionWatcher:
+    """
+    Prüft in Modul B höchstens alle DPA_INDEX_VERSION_REFRESH Sekunden, ob Modul A eine neue
+    Indexversion gemeldet hat.
+    """
+
+    def __init__(self, hana_connection, alias=None, interval=None):
+        self.hana_connection = hana_connection
+        self.alias = alias or str(os.getenv("hdb_table_name"))
+        self.version = read_index_version(hana_connection, self.alias)["version"]
+        self.interval = float(os.getenv("DPA_INDEX_VERSION_REFRESH", "5")) if interval is None else interval
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """
+        Returns:
+            dict | None: Versionseintrag (siehe read_index_version), wenn die Version gestiegen ist, sonst None.
+        """
+        with self._lock:
+            if time.monotonic() - self._checked < self.interval:
+                return None
+            self._checked = time.monotonic()
+            entry = read_index_version(self.hana_connection, self.alias)
+            if entry["version"] <= self.version:
+                return None
+            self.version = entry["version"]
+            return entry
+
+    def acknowledge(self, version):
+        """Übernimmt eine bereits anderweitig (z.B. im selben Prozess) gemeldete Version."""
+        if version is None:
+            return
+        with self._lock:
+            self.version = max(self.version, version)
@@ -0,0 +1,306 @@
+# dpa_ingest.py
+# Kommandozeilen-Ingestion für Modul A: lädt alle PDFs eines Verzeichnisses bzw. Glob-Musters
+# ohne Flask-Oberfläche in die HANA-Vektordatenbank (z.B. per cron oder aus einer Deployment-Pipeline).
+#
+# Jede Datei wird in einem eigenen Worker-Prozess geladen, semantisch gechunkt und hochgeladen;
+# die Chunks einer Datei ersetzen nur die bisherigen Chunks derselben Datei. Alle Worker teilen den
+# Embedding-Cache (dpa_embedding_cache) und den Ratenbegrenzer (dpa_ratelimit, Massen-Priorität).
+# Der Regelindex wird am Ende aus allen Dateien gemeinsam erstellt; ersetzt werden nur die Regeln
+# dieser Dateien. Quelle ist wie in app_modulA der Dateiname (source_name), nicht der Pfad.
+#
+# Mit --blue-green werden alle Dateien in eine neue Generation (Schattentabelle) geschrieben, die
+# nach erfolgreicher Prüfung atomar aktiviert wird (dpa_bluegreen); Modul B bleibt währenddessen
+# auf dem bisherigen Index. Handbücher, die nicht angegeben wurden, werden aus der aktiven Tabelle übernommen.
+#
+# Aufruf (aus BE_AI_DPA_APP):
+#   python -m dpa_modules.dpa_ingest static/uploads --workers 2
+#   python -m dpa_modules.dpa_ingest "handbuecher/*.pdf"
+#   python -m dpa_modules.dpa_ingest static/uploads --blue-green
+# Exit-Code 0 bei Erfolg, 1 wenn mindestens eine Datei fehlschlägt, 2 bei ungültigen Argumenten.
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Dienste des Worker-Prozesses (je Prozess einmal initialisiert)
+_worker = {}
+
+
+def find_pdfs(patterns):
+    """
+    Ermittelt die PDF-Dateien zu Verzeichnissen und Glob-Mustern.
+
+    Args:
+        patterns (list): Verzeichnisse, Dateien oder Glob-Muster.
+
+    Returns:
+        list: Sortierte, eindeutige Pfade der PDF-Dateien.
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.pdf")
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path) and path.lower().endswith(".pdf"):
+                files.add(os.path.abspath(path))
+    return sorted(files)
+
+
+def init_worker(config_file, table_name=None, target=None):
+    """
+    Initialisiert Embedding-Modell (mit Cache und Ratenbegrenzer) und HANA-Verbindung im Worker-Prozess.
+    table_name schreibt in eine andere Tabelle als hdb_table_name (Schattentabelle im Blue/Green-Modus).
+    """
+    from langchain_community.vectorstores.hanavector import HanaDB
+    from .dpa_modulA import load_env_variables, setup_embedding_model, setup_hana_connection, setup_hana_vectorstore
+    from .dpa_ratelimit import RateLimitedEmbeddings, PRIORITY_BULK
+    from .dpa_embedding_cache import CachedEmbeddings, open_embedding_cache
+    load_env_variables(config_file)
+    embeddings = setup_embedding_model()
+    if embeddings is None:
+        raise RuntimeError("Embedding-Modell konnte nicht initialisiert werden.")
+    embeddings = RateLimitedEmbeddings(embeddings, priority=PRIORITY_BULK)
+    cache = open_embedding_cache()
+    if cache is not None:
+        embeddings = CachedEmbeddings(embeddings, cache)
+    hana_connection = setup_hana_connection()
+    _worker["embeddings"] = embeddings
+    if table_name:
+        _worker["hana_database"] = HanaDB(embedding=embeddings, connection=hana_connection, table_name=table_name)
+    else:
+        _worker["hana_database"] = setup_hana_vectorstore(embeddings, hana_connection)
+    _worker["target"] = target
+
+
+def ingest_file(filepath):
+    """
+    Lädt eine PDF-Datei in die Vektordatenbank (im Worker-Prozess).
+
+    Returns:
+        dict: {"file", "success", "pages", "chunks", "seconds", "pages_per_s", "chunks_per_s",
+               "cache_hits", "cache_misses", "rule_rows", "error"}
+    """
+    from .dpa_modulA import reload_embeddings_checkpointed, source_name
+    from .dpa_parse_cache import load_pdf_cached, open_parse_cache
+    from .dpa_ledger import usage_scope
+    from .dpa_registry import open_registry
+    from .dpa_rule_index import count_rules, extract_rule_rows
+    embeddings = _worker["embeddings"]
+    hana_database = _worker["hana_database"]
+    target = _worker.get("target")
+    hits, misses = getattr(embeddings, "hits", 0), getattr(embeddings, "misses", 0)
+    stats = {"file": filepath, "success": False, "pages": 0, "chunks": 0, "rule_rows": [], "error": None}
+    start = time.perf_counter()
+    try:
+        registry = open_registry()
+        docs, sha256, stats["parse_cached"] = load_pdf_cached(filepath, open_parse_cache())
+        stats["pages"] = len(docs)
+        # Unveränderte Dateien in derselben Tabelle überspringen (nicht bei einer neuen Blue/Green-Generation)
+        stats["unchanged"] = not target and registry.is_ingested(hana_database.table_name, sha256)
+        if not stats["unchanged"]:
+            # Batchweise mit Checkpoint: ein erneuter Lauf nach einem Abbruch setzt fort
+            # (Embedding-Tokens je Datei im Token- und Kostenbuch, dpa_ledger)
+            with usage_scope("ingest", route="cli", source=source_name(filepath), pages=stats["pages"]) as usage:
+                ingest = reload_embeddings_checkpointed(hana_database, embeddings, filepath, docs,
+                                                        replace_all=False, target=target)
+                usage.tag(chunks=ingest["chunks"])
+            stats["chunks"] = ingest["chunks"]
+            stats["resumed"] = ingest["resumed"]
+        stats["rule_rows"] = extract_rule_rows(docs, source=source_name(filepath))
+        if not stats["unchanged"]:
+            registry.record_ingest(source_name(filepath), sha256, hana_database.table_name,
+                                   chunks=stats["chunks"], rules=count_rules(stats["rule_rows"]),
+                                   seconds=round(time.perf_counter() - start, 2), pages=stats["pages"],
+                                   replace_all=False)
+        stats["success"] = True
+    except Exception as e:
+        stats["error"] = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+    stats["seconds"] = round(seconds, 2)
+    stats["pages_per_s"] = round(stats["pages"] / seconds, 2) if seconds else None
+    stats["chunks_per_s"] = round(stats["chunks"] / seconds, 2) if seconds else None
+    stats["cache_hits"] = getattr(embeddings, "hits", 0) - hits
+    stats["cache_misses"] = getattr(embeddings, "misses", 0) - misses
+    return stats
+
+
+def save_rule_index(rule_rows, config_file, table_name=None, sources=None):
+    """
+    Speichert den gemeinsamen Regelindex aller Dateien in HANA und lokal; mit sources werden nur die
+    Regeln dieser Quellen ersetzt (siehe save_rule_index_hana).
+    """
+    from .dpa_modulA import load_env_variables, setup_hana_connection
+    from .dpa_bluegreen import resolve_active_table
+    from .dpa_rule_index import rule_index_file, save_rule_index_hana, save_rule_index_json
+    load_env_variables(config_file)
+    hana_connection = setup_hana_connection()
+    table_name = table_name or resolve_active_table(hana_connection)
+    save_rule_index_hana(hana_connection, table_name, rule_rows, sources)
+    save_rule_index_json(rule_index_file(table_name), rule_rows, sources)
+
+
+def bump_version(config_file, source):
+    """Erhöht nach einer Ingestion in die aktive Tabelle die Indexversion (Meldung an Modul B)."""
+    from .dpa_modulA import load_env_variables, setup_hana_connection
+    from .dpa_bluegreen import resolve_active_table
+    from .dpa_index_version import bump_index_version
+    load_env_variables(config_file)
+    hana_connection = setup_hana_connection()
+    alias = str(os.getenv("hdb_table_name"))
+    return bump_index_version(hana_connection, alias, resolve_active_table(hana_connection, alias), source=source)
+
+
+def prepare_shadow(config_file):
+    """
+    Legt im Blue/Green-Modus die Schattentabelle der nächsten Generation an.
+
+    Returns:
+        dict: {"hana_connection", "embeddings", "alias", "active_table", "generation", "shadow"}
+    """
+    from .dpa_modulA import load_env_variables, setup_embedding_model, setup_hana_connection
+    from .dpa_bluegreen import create_shadow_store, resolve_active_table
+    from .dpa_ratelimit import RateLimitedEmbeddings, PRIORITY_BULK
+    load_env_variables(config_file)
+    embeddings = RateLimitedEmbeddings(setup_embedding_model(), priority=PRIORITY_BULK)
+    hana_connection = setup_hana_connection()
+    alias = str(os.getenv("hdb_table_name"))
+    active_table = resolve_active_table(hana_connection, alias)
+    generation, shadow = create_shadow_store(hana_connection, embeddings, alias)
+    return {"hana_connection": hana_connection, "embeddings": embeddings, "alias": alias,
+            "active_table": active_table, "generation": generation, "shadow": shadow}
+
+
+def activate_shadow(blue_green, expected_rows, files=()):
+    """
+    Übernimmt die übrigen Handbücher aus der aktiven Tabelle, prüft die Schattentabelle und aktiviert
+    sie bei Erfolg.
+
+    Args:
+        blue_green (dict): Ergebnis von prepare_shadow.
+        expected_rows (int): Anzahl der geschriebenen Chunks.
+        files (list): Eingelesene Dateien (ihre Chunks und Regeln werden nicht übernommen).
+
+    Returns:
+        dict: Prüfergebnis (siehe validate_shadow) ergänzt um "pointer" und "copied_chunks".
+    """
+    from .dpa_bluegreen import copy_other_sources, switch_active_table, validate_shadow
+    from .dpa_modulA import source_name
+    sources = {source_name(path) for path in files} | {os.path.abspath(path) for path in files}
+    copied = copy_other_sources(blue_green["hana_connection"], blue_green["active_table"], blue_green["shadow"], sources)
+    validation = validate_shadow(blue_green["hana_connection"], blue_green["shadow"], expected_rows + copied,
+                                 active_table=blue_green["active_table"])
+    validation["copied_chunks"] = copied
+    validation["pointer"] = None
+    if validation["valid"]:
+        validation["pointer"] = switch_active_table(blue_green["hana_connection"], blue_green["alias"],
+                                                    blue_green["shadow"].table_name, blue_green["generation"])
+    return validation
+
+
+def run_ingestion(files, workers, config_file, table_name=None, target=None):
+    """
+    Verarbeitet die Dateien parallel und gibt je Datei eine Zeile mit dem Durchsatz aus.
+
+    Returns:
+        list: Statistiken je Datei (siehe ingest_file).
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(config_file, table_name, target)) as executor:
+        futures = {executor.submit(ingest_file, path): path for path in files}
+        for future in as_completed(futures):
+            try:
+                stats = future.result()
+            except Exception as e:
+                # z.B. Fehler in init_worker oder abgebrochener Worker-Prozess
+                stats = {"file": futures[future], "success": False, "pages": 0, "chunks": 0, "rule_rows": [],
+                         "seconds": None, "pages_per_s": None, "chunks_per_s": None,
+                         "cache_hits": 0, "cache_misses": 0, "error": f"{type(e).__name__}: {e}"}
+            results.append(stats)
+            if stats["success"] and stats.get("unchanged"):
+                print(f"OK    {os.path.basename(stats['file'])}: unverändert, nichts zu tun")
+            elif stats["success"]:
+                print(f"OK    {os.path.basename(stats['file'])}: {stats['pages']} Seiten, {stats['chunks']} Chunks in "
+                      f"{stats['seconds']} s ({stats['pages_per_s']} Seiten/s, {stats['chunks_per_s']} Chunks/s, "
+                      f"Cache {stats['cache_hits']} Treffer / {stats['cache_misses']} neu)")
+            else:
+                print(f"FEHLER {os.path.basename(stats['file'])}: {stats['error']}", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    """Kommandozeile der Ingestion; liefert den Exit-Code."""
+    parser = argparse.ArgumentParser(description="Ingestion von PDF-Handbüchern in die HANA-Vektordatenbank (Modul A)")
+    parser.add_argument("paths", nargs="+", help="Verzeichnisse, PDF-Dateien oder Glob-Muster")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("DPA_INGEST_WORKERS", "2")))
+    parser.add_argument("--config", default=os.path.expanduser("~/.aicore/config.json"))
+    parser.add_argument("--no-rule-index", action="store_true", help="Regelindex nicht neu erstellen")
+    parser.add_argument("--json", help="Statistiken zusätzlich als JSON in diese Datei schreiben")
+    parser.add_argument("--blue-green", action="store_true",
+                        help="In eine neue Generation schreiben, prüfen und erst dann aktivieren")
+    args = parser.parse_args(argv)
+
+    files = find_pdfs(args.paths)
+    if not files:
+        print("Keine PDF-Dateien gefunden.", file=sys.stderr)
+        return 2
+    print(f"{len(files)} PDF-Dateien, {args.workers} Worker-Prozesse")
+    start = time.perf_counter()
+    blue_green, table_name, target = None, None, None
+    if args.blue_green:
+        blue_green = prepare_shadow(args.config)
+        table_name = blue_green["shadow"].table_name
+        target = f"{table_name}@{time.time():.0f}"
+        print(f"Blue/Green: neue Generation {table_name}, aktiv bleibt vorerst {blue_green['active_table']}")
+    results = run_ingestion(files, max(1, args.workers), args.config, table_name, target)
+    failed = [r for r in results if not r["success"]]
+
+    if not args.no_rule_index and not failed:
+        from .dpa_modulA import source_name
+        from .dpa_rule_index import count_rules
+        rule_rows = [row for r in results for row in r["rule_rows"]]
+        try:
+            save_rule_index(rule_rows, args.config, table_name, sources=[source_name(r["file"]) for r in results])
+            print(f"Regelindex: {count_rules(rule_rows)} Kontierungsregeln gespeichert.")
+        except Exception as e:
+            print(f"FEHLER Regelindex: {type(e).__name__}: {e}", file=sys.stderr)
+            failed.append({"file": "rule_index", "error": str(e)})
+
+    # Auch bei Teilfehlern: geänderte Dateien stehen bereits in der aktiven Tabelle
+    changed = [r for r in results if r["success"] and not r.get("unchanged")]
+    if not blue_green and changed:
+        try:
+            version = bump_version(args.config, source=f"dpa_ingest: {len(changed)} Dateien")
+            print(f"Indexversion: {version}")
+        except Exception as e:
+            print(f"FEHLER Indexversion: {type(e).__name__}: {e}", file=sys.stderr)
+            failed.append({"file": "index_version", "error": str(e)})
+
+    if blue_green and not failed:
+        validation = activate_shadow(blue_green, sum(r["chunks"] for r in results), files)
+        if validation["valid"]:
+            print(f"Blue/Green: {table_name} aktiviert (vorherige Generation {validation['pointer']['previous_table']}).")
+        else:
+            print(f"FEHLER Prüfung {table_name}, {blue_green['active_table']} bleibt aktiv: "
+                  f"{' '.join(validation['errors'])}", file=sys.stderr)
+            failed.append({"file": table_name, "error": "validation"})
+    elif blue_green:
+        print(f"Blue/Green: {table_name} wird wegen Fehlern nicht aktiviert.", file=sys.stderr)
+
+    seconds = time.perf_counter() - start
+    pages = sum(r["pages"] for r in results)
+    chunks = sum(r["chunks"] for r in results)
+    print(f"Gesamt: {len(results) - len([r for r in results if not r['success']])}/{len(files)} Dateien, {pages} Seiten, "
+          f"{chunks} Chunks in {seconds:.1f} s ({pages / seconds:.2f} Seiten/s)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != "rule_rows"} for r in results], f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# dpa_language.py
+# Einfache, lokale Spracherkennung und Beschriftungen für lokal erzeugte Antworten
+# (ohne LLM-Aufruf), z.B. für den Schnellpfad in Modul B.
+
+import json
+import re
+
+# Typische Funktionswörter je Sprache (klein geschrieben)
+STOPWORDS = {
+    "de": {"der", "die", "das", "und", "mit", "für", "eine", "ein", "ist", "im", "des", "wird", "soll", "buche", "von", "zu", "auf", "den", "dem"},
+    "en": {"the", "and", "with", "for", "an", "a", "is", "of", "to", "in", "be", "should", "booking", "book", "how", "invoice"},
+    "fr": {"le", "la", "les", "et", "une", "un", "pour", "de", "des", "du", "est", "doit", "être", "dans"},
+    "it": {"il", "la", "le", "e", "una", "un", "per", "di", "del", "della", "deve", "essere", "nell", "nel"},
+    "nl": {"de", "het", "een", "en", "voor", "van", "moet", "worden", "in", "op", "is"},
+    "fi": {"ja", "on", "kuluvan", "seuraavan", "tilikauden", "kirjataan", "varaus", "laskun"},
+}
+
+# Beschriftungen für lokal erzeugte Buchungssätze (Platzhalter aus prompt_template_html)
+LABELS = {
+    "de": {
+        "geschaeftsfall": "Geschäftsfall",
+        "kategorie": "Geschäftsfall-Kategorie",
+        "soll": "Soll",
+        "haben": "Haben",
+        "betrag": "Betrag",
+    },
+    "en": {
+        "geschaeftsfall": "Business Case",
+        "kategorie": "Business Case Category",
+        "soll": "Debit",
+        "haben": "Credit",
+        "betrag": "Amount",
+    },
+}
+
+
+def detect_language(text, default="de"):
+    """
+    Ermittelt die Sprache eines Textes anhand von Funktionswörtern.
+
+    Args:
+        text (str): Zu prüfender Text.
+        default (str): Sprache, wenn keine eindeutige Zuordnung möglich ist.
+
+    Returns:
+        str: ISO-639-1-Sprachcode (z.B. "de", "en").
+    """
+    if not text:
+        return default
+    # Kyrillische Schrift wird direkt als Bulgarisch gewertet
+    if re.search(r"[Ѐ-ӿ]", text):
+        return "bg"
+    words = re.findall(r"[a-zA-ZäöüÄÖÜßàâçéèêëîïôûùÿœ]+", text.lower())
+    if not words:
+        return default
+    scores = {lang: sum(1 for w in words if w in stopwords) for lang, stopwords in STOPWORDS.items()}
+    best = max(scores, key=scores.get)
+    if scores[best] == 0:
+        return default
+    return best
+
+
+# Antwort, wenn die Eingabe keinen Geschäftsfall beschreibt (Format "keine-kontierung" aus prompt_template_html)
+NO_POSTING_TEXT = {
+    "de": "Die Eingabe beschreibt keinen Geschäftsfall. Für diese Eingabe konnte keine passende Kontierung in den bereitgestellten Regeln ermittelt werden. Es fehlen folgende Informationen: Art der Transaktion, Beträge und beteiligte Konten bzw. Geschäftspartner.",
+    "en": "The input does not describe a business transaction. No suitable account assignment could be determined in the provided rules for this input. The following information is missing: type of transaction, amounts and involved accounts or business partners.",
+    "fr": "La saisie ne décrit pas d'opération commerciale. Aucune imputation comptable appropriée n'a pu être déterminée dans les règles fournies. Les informations suivantes manquent : type de transaction, montants et comptes ou partenaires concernés.",
+    "it": "L'input non descrive un'operazione commerciale. Non è stato possibile determinare un'imputazione contabile adeguata nelle regole fornite. Mancano le seguenti informazioni: tipo di operazione, importi e conti o partner coinvolti.",
+    "nl": "De invoer beschrijft geen zakelijke transactie. Er kon geen passende boeking in de verstrekte regels worden bepaald. De volgende informatie ontbreekt: soort transactie, bedragen en betrokken rekeningen of zakenpartners.",
+    "fi": "Syöte ei kuvaa liiketapahtumaa. Annetuista säännöistä ei löytynyt sopivaa tiliöintiä. Seuraavat tiedot puuttuvat: tapahtuman tyyppi, summat sekä asianomaiset tilit tai liikekumppanit.",
+    "bg": "Въведеният текст не описва стопанска операция. В предоставените правила не може да бъде определено подходящо осчетоводяване. Липсва следната информация: вид на операцията, суми и засегнати сметки или контрагенти.",
+}
+
+
+def no_posting_html(lang):
+    """
+    Liefert den lokalisierten HTML-Block "keine-kontierung".
+
+    Args:
+        lang (str): Sprache der Ausgabe.
+
+    Returns:
+        str: HTML-Block <div class="keine-kontierung">.
+    """
+    text = NO_POSTING_TEXT.get(lang, NO_POSTING_TEXT["en"])
+    return f'<div class="keine-kontierung">\n  <p>{text}</p>\n</div>'
+
+
+def no_posting_json(lang):
+    """
+    Liefert die lokalisierte Fehlerantwort im JSON-Format von prompt_template_json.
+
+    Args:
+        lang (str): Sprache der Ausgabe.
+
+    Returns:
+        str: JSON-Objekt {"fehler": {"meldung", "fehlende_informationen"}}.
+    """
+    return json.dumps({
+        "fehler": {
+            "meldung": NO_POSTING_TEXT.get(lang, NO_POSTING_TEXT["en"]),
+            "fehlende_informationen": ["Art der Transaktion", "Beträge", "beteiligte Konten bzw. Geschäftspartner"],
+        }
+    }, ensure_ascii=False)
@@ -0,0 +1,288 @@
+# dpa_ledger.py
+# Token- und Kostenbuch für LLM- und Embedding-Aufrufe beider Module.
+#
+# AI Core rechnet je Token ab; bisher war nicht sichtbar, welche Eingaben, Prompts und Routen die Kosten und
+# die Latenz treiben. Jeder Aufruf an AI Core wird daher als Zeile in einer lokalen JSONL-Datei angehängt
+# (nur Anhängen, nie Überschreiben; mehrere Prozesse schreiben je Zeile mit einem einzelnen write):
+#
+#   {"kind": "llm" | "embedding", "model", "prompt_tokens", "completion_tokens", "tokens", "seconds",
+#    "estimated", "request_id", "job", "route", "template", "cache", "timestamp"}
+#
+# Ein Auftrag (/process, /process_stream, Stapelfall, Ingestion einer Datei) läuft in einem usage_scope.
+# Dessen Merkmale (Route, Template, Cache-Ergebnis) gehen in jede Aufrufzeile ein, und am Ende wird eine
+# Zeile "kind": "request" mit den Summen, der Dauer und dem Cache-Ergebnis geschrieben.
+#
+# LLM-Tokens stammen aus der Antwort des Modells (token_usage), sonst aus der Schätzung des Ratenbegrenzers
+# ("estimated": true). Embedding-Tokens werden immer geschätzt, da die Embedding-API keine Zählung liefert.
+# Kosten berechnet erst report() aus den Preisen in DPA_TOKEN_PRICES, damit geänderte Preise auch für alte
+# Einträge gelten.
+#
+# Konfiguration: DPA_LEDGER_FILE (Standard usage_ledger.jsonl, "" = aus),
+#                DPA_TOKEN_PRICES (JSON, Preis je 1000 Tokens und Modell, z.B.
+#                {"gpt-4o": {"prompt": 0.005, "completion": 0.015}, "text-embedding-3-small": {"prompt": 0.00002}})
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .dpa_ratelimit import estimate_tokens
+
+# Auftrag des aktuellen Ablaufs (siehe usage_scope)
+_current_usage = contextvars.ContextVar("dpa_usage", default=None)
+
+# Merkmale, nach denen report() standardmäßig gruppiert
+DEFAULT_GROUP_BY = ("kind", "route", "model", "template", "cache")
+
+
+class UsageLedger:
+    """
+    Anhängende JSONL-Ablage der Verbrauchszeilen mit Auswertung.
+    """
+
+    def __init__(self, path=None):
+        self.path = os.getenv("DPA_LEDGER_FILE", "usage_ledger.jsonl") if path is None else path
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        """Hängt eine Zeile an (ohne Pfad abgeschaltet)."""
+        if not self.path:
+            return
+        record.setdefault("timestamp", datetime.now().isoformat(timespec="milliseconds"))
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def records(self, since=None):
+        """
+        Liest alle Zeilen (unvollständige Zeilen eines abgebrochenen Schreibvorgangs werden übersprungen).
+
+        Args:
+            since (str, optional): ISO-Zeitpunkt; nur jüngere Zeilen.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return []
+        result = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if since and record.get("timestamp", "") < since:
+                    continue
+                result.append(record)
+        return result
+
+    def report(self, since=None, group_by=DEFAULT_GROUP_BY, top=10):
+        """
+        Fasst das Buch zusammen.
+
+        Args:
+            since (str, optional): ISO-Zeitpunkt; nur jüngere Zeilen.
+            group_by (tuple): Merkmale der Gruppen.
+            top (int): Anzahl der teuersten und langsamsten Aufträge.
+
+        Returns:
+            dict: {"groups": [{merkmale..., "count", "prompt_tokens", "completion_tokens", "tokens", "cost",
+                   "seconds", "avg_seconds"}], "totals", "top_cost", "slowest"}
+        """
+        prices = token_prices()
+        groups = {}
+        totals = {"calls": 0, "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "tokens": 0, "cost": 0.0}
+        requests, cost_by_request = [], {}
+        for record in self.records(since):
+            if record.get("kind") == "request":
+                requests.append(record)
+                totals["requests"] += 1
+            else:
+                record["cost"] = call_cost(record, prices)
+                totals["calls"] += 1
+                for field in ("prompt_tokens", "completion_tokens", "tokens", "cost"):
+                    totals[field] += record.get(field) or 0
+                if record.get("request_id"):
+                    cost_by_request[record["request_id"]] = cost_by_request.get(record["request_id"], 0.0) + record["cost"]
+            key = tuple(record.get(field) for field in group_by)
+            group = groups.setdefault(key, dict(zip(group_by, key), count=0, prompt_tokens=0, completion_tokens=0,
+                                                 tokens=0, cost=0.0, seconds=0.0))
+            group["count"] += 1
+            for field in ("prompt_tokens", "completion_tokens", "tokens", "cost", "seconds"):
+                group[field] += record.get(field) or 0
+        for group in groups.values():
+            group["avg_seconds"] = round(group["seconds"] / group["count"], 3)
+            group["seconds"] = round(group["seconds"], 3)
+            group["cost"] = round(group["cost"], 6)
+        totals["cost"] = round(totals["cost"], 6)
+        # Kosten eines Auftrags aus seinen Aufrufzeilen
+        for record in requests:
+            record["cost"] = round(cost_by_request.get(record.get("request_id"), 0.0), 6)
+        return {
+            "groups": sorted(groups.values(), key=lambda g: (-g["tokens"], -g["count"])),
+            "totals": totals,
+            "top_cost": sorted(requests, key=lambda r: (-r["cost"], -(r.get("tokens") or 0)))[:top],
+            "slowest": sorted(requests, key=lambda r: -(r.get("seconds") or 0))[:top],
+        }
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """Prozessweites Token- und Kostenbuch."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger()
+        return _ledger
+
+
+def token_prices():
+    """Preise je 1000 Tokens aus DPA_TOKEN_PRICES ({modell: {"prompt": x, "completion": y}})."""
+    try:
+        return json.loads(os.getenv("DPA_TOKEN_PRICES", "{}"))
+    except json.JSONDecodeError:
+        print("DPA_TOKEN_PRICES ist kein gültiges JSON, Kosten werden nicht berechnet.")
+        return {}
+
+
+def call_cost(record, prices):
+    """Kosten einer Aufrufzeile (0, wenn für das Modell kein Preis hinterlegt ist)."""
+    price = prices.get(record.get("model")) or {}
+    return ((record.get("prompt_tokens") or 0) * price.get("prompt", 0)
+            + (record.get("completion_tokens") or 0) * price.get("completion", 0)) / 1000
+
+
+class usage_scope:
+    """
+    Kontext eines Auftrags; Aufrufe an AI Core darin werden mit seinen Merkmalen gebucht:
+
+        with usage_scope("process", route="/process", template="html") as usage:
+            ...
+            usage.tag(cache="miss")
+    """
+
+    def __init__(self, job, ledger=None, **tags):
+        """
+        Args:
+            job (str): Art des Auftrags, z.B. "process", "batch", "ingest".
+            ledger (UsageLedger, optional): Standard: get_ledger().
+            **tags: Merkmale, z.B. route, template, cache, input.
+        """
+        self.ledger = ledger or get_ledger()
+        self.tags = dict(tags, job=job, request_id=uuid.uuid4().hex[:16])
+        self.totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "tokens": 0, "embedding_cache_hits": 0}
+        self._lock = threading.Lock()
+
+    def tag(self, **tags):
+        """Ergänzt Merkmale des Auftrags (z.B. Cache-Ergebnis, Route der Pipeline)."""
+        self.tags.update(tags)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.totals[name] = self.totals.get(name, 0) + (value or 0)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._token = _current_usage.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_usage.reset(self._token)
+        record = dict(self.tags, **self.totals, kind="request", seconds=round(time.perf_counter() - self._start, 3))
+        if exc is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        try:
+            self.ledger.append(record)
+        except OSError as e:
+            print(f"Verbrauch nicht gebucht: {e}")
+        return False
+
+
+def current_usage():
+    """usage_scope des aktuellen Ablaufs oder None."""
+    return _current_usage.get()
+
+
+def record_usage(kind, model, prompt_tokens=0, completion_tokens=0, seconds=None, estimated=False, **extra):
+    """
+    Bucht einen Aufruf an AI Core im aktuellen Auftrag (falls vorhanden) und im Buch.
+
+    Args:
+        kind (str): "llm" oder "embedding".
+        model (str): Deployment bzw. Modellname.
+        estimated (bool): Tokens geschätzt statt vom Modell gemeldet.
+    """
+    usage = current_usage()
+    tokens = (prompt_tokens or 0) + (completion_tokens or 0)
+    record = {"kind": kind, "model": model, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+              "tokens": tokens, "seconds": round(seconds, 3) if seconds is not None else None,
+              "estimated": estimated, **extra}
+    if usage is not None:
+        usage.add(calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, tokens=tokens)
+        for field in ("request_id", "job", "route", "template", "cache"):
+            if field in usage.tags:
+                record.setdefault(field, usage.tags[field])
+    try:
+        get_ledger().append(record)
+    except OSError as e:
+        print(f"Verbrauch nicht gebucht: {e}")
+
+
+def record_embedding_usage(texts, seconds=None, model=None):
+    """Bucht einen Embedding-Aufruf (geschätzte Tokens der eingebetteten Texte)."""
+    texts = [texts] if isinstance(texts, str) else texts
+    record_usage("embedding", model or str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING")),
+                 prompt_tokens=estimate_tokens(texts), seconds=seconds, estimated=True, texts=len(texts))
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain-Callback am LLM: bucht je Aufruf die gemeldeten (sonst geschätzten) Tokens und die Dauer.
+    """
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+        self._runs = {}
+
+    def on_llm_start(self, serialized, prompts, run_id=None, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), estimate_tokens(list(prompts)))
+
+    def on_chat_model_start(self, serialized, messages, run_id=None, **kwargs):
+        texts = [str(message.content) for batch in messages for message in batch]
+        self._runs[run_id] = (time.perf_counter(), estimate_tokens(texts))
+
+    def on_llm_end(self, response, run_id=None, **kwargs):
+        start, prompt_estimate = self._runs.pop(run_id, (None, 0))
+        output = response.llm_output or {}
+        usage = output.get("token_usage") or {}
+        model = output.get("model_name") or self.model_name or str(os.getenv("AICORE_DEPLOYMENT_MODEL"))
+        if usage.get("prompt_tokens") is not None:
+            prompt_tokens, completion_tokens, estimated = usage["prompt_tokens"], usage.get("completion_tokens", 0), False
+        else:
+            texts = [generation.text for generations in response.generations for generation in generations]
+            prompt_tokens, completion_tokens, estimated = prompt_estimate, estimate_tokens(texts), True
+        record_usage("llm", model, prompt_tokens, completion_tokens,
+                     seconds=time.perf_counter() - start if start is not None else None, estimated=estimated)
+
+    def on_llm_error(self, error, run_id=None, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+def meter_llm(llm, model_name=None):
+    """Hängt einen UsageCallbackHandler an ein LangChain-LLM (einmal je Instanz) und gibt es zurück."""
+    callbacks = list(getattr(llm, "callbacks", None) or [])
+    if not any(isinstance(callback, UsageCallbackHandler) for callback in callbacks):
+        callbacks.append(UsageCallbackHandler(model_name))
+        llm.callbacks = callbacks
+    return llm
@@ -0,0 +1,247 @@
+# dpa_model_router.py
+# Modell-Routing für Modul B: bewertet die Komplexität eines Geschäftsfalls lokal (Anzahl
+# Geschäftsfälle, Beträge, genannte Perioden, Mehrdeutigkeit des Retrievals) und wählt daraus
+# eine LLM-Deployment-Stufe. Einzeilige Eingangsrechnungen laufen so über ein günstigeres,
+# schnelleres Deployment, Rückstellungen über mehrere Geschäftsjahre über das große Modell.
+#
+# Konfiguration (Umgebungsvariablen bzw. ~/.aicore/config.json):
+#   DPA_MODEL_TIERS                 JSON-Liste der Stufen, aufsteigend nach Komplexität, z.B.
+#                                   [{"name": "small", "model": "gpt-4o-mini", "max_tokens": 1500, "max_score": 0.5},
+#                                    {"name": "large", "model": "gpt-4o", "max_tokens": 4000}]
+#   AICORE_DEPLOYMENT_MODEL_SMALL   Kurzform ohne DPA_MODEL_TIERS: kleines Modell für Scores < DPA_ROUTING_THRESHOLD,
+#                                   sonst AICORE_DEPLOYMENT_MODEL
+#   DPA_ROUTING_THRESHOLD           Grenzwert der Kurzform (Standard 0.5)
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from .dpa_fastpath import parse_amounts
+from .dpa_resilience import resilient_call
+from .dpa_ratelimit import acquire_llm
+from .dpa_splitter import split_business_cases, with_context
+
+DEFAULT_THRESHOLD = 0.5
+# Unterhalb dieser Ähnlichkeit bzw. bei geringem Abstand der besten Treffer gilt das Retrieval als mehrdeutig
+AMBIGUOUS_TOP_SCORE = 0.82
+AMBIGUOUS_MARGIN = 0.01
+
+# Periodenangaben: relative Geschäftsjahre, Abschlussstichtage, Quartale, Monate, Jahreszahlen, Datumsangaben.
+# Gezählt werden unterschiedliche Treffer; mehrere Perioden deuten auf periodenübergreifende Geschäftsfälle
+# (Rückstellungen, Abgrenzungen) hin.
+PERIODEN_REGEX = re.compile(
+    r"laufend\w*|folgend\w*|nächst\w*|vorjahr\w*|folgejahr\w*|jahresende\w*|jahresabschluss\w*"
+    r"|schlussbilanz|eröffnungsbilanz"
+    r"|current (?:financial |fiscal )?year|following (?:financial |fiscal )?year|next (?:financial |fiscal )?year"
+    r"|previous (?:financial |fiscal )?year|year[- ]end|closing balance|opening balance"
+    r"|exercice (?:en cours|suivant)|esercizio (?:in corso|successivo)|(?:huidig|volgend)\w* boekjaar"
+    r"|kuluva\w* tilikau\w*|seuraava\w* tilikau\w*|текущата финансова година|следващата финансова година"
+    r"|\bq[1-4]\b"
+    r"|\b(?:januar|februar|märz|april|mai|juni|juli|august|september|oktober|november|dezember"
+    r"|january|february|march|may|june|july|october|december)\b"
+    r"|\b20\d{2}\b|\b\d{1,2}\.\d{1,2}\.(?:\d{2,4})?",
+    re.IGNORECASE,
+)
+
+
+def score_complexity(text, scored_documents=None, cases=None):
+    """
+    Bewertet die Komplexität eines Geschäftsfalls ohne LLM-Aufruf.
+
+    Args:
+        text (str): Beschreibung des Geschäftsfalls.
+        scored_documents (list, optional): Ergebnis von similarity_search_with_score (Dokument, Score).
+        cases (int, optional): Anzahl der Geschäftsfälle der ursprünglichen Eingabe. Die Pipeline routet
+            bereits zerlegte Fälle; ohne Angabe wird text selbst zerlegt.
+
+    Returns:
+        dict: {"score": float zwischen 0 und 1, "cases": int, "amounts": int, "periods": int,
+               "ambiguous": bool}
+    """
+    text = text or ""
+    if cases is None:
+        cases = len(split_business_cases(text))
+    betraege = parse_amounts(text)
+    amounts = len(betraege["betraege"]) + (1 if betraege["steuer"] is not None else 0)
+    periods = len({m.group(0).lower() for m in PERIODEN_REGEX.finditer(text)})
+    scores = sorted((score for _, score in scored_documents or []), reverse=True)
+    ambiguous = bool(scores) and (
+        scores[0] < AMBIGUOUS_TOP_SCORE or (len(scores) > 1 and scores[0] - scores[1] < AMBIGUOUS_MARGIN)
+    )
+    score = 0.0
+    if cases > 1:
+        score += 0.4
+    if amounts > 3:
+        score += 0.2
+    if periods > 1:
+        score += 0.5
+    elif periods == 1:
+        score += 0.2
+    if ambiguous:
+        score += 0.2
+    if len(text) > 400:
+        score += 0.1
+    return {
+        "score": round(min(1.0, score), 2),
+        "cases": cases,
+        "amounts": amounts,
+        "periods": periods,
+        "ambiguous": ambiguous,
+    }
+
+
+def load_model_tiers():
+    """
+    Liest die konfigurierten Deployment-Stufen.
+
+    Returns:
+        list: Stufen als dict {"name", "model", "max_tokens", "max_score"} aufsteigend nach
+              Komplexität; die letzte Stufe übernimmt alle übrigen Scores.
+    """
+    tiers_json = os.getenv("DPA_MODEL_TIERS")
+    if tiers_json:
+        tiers = json.loads(tiers_json)
+    else:
+        tiers = []
+        small_model = os.getenv("AICORE_DEPLOYMENT_MODEL_SMALL")
+        if small_model:
+            tiers.append({
+                "name": "small",
+                "model": small_model,
+                "max_tokens": 1500,
+                "max_score": float(os.getenv("DPA_ROUTING_THRESHOLD", DEFAULT_THRESHOLD)),
+            })
+        tiers.append({"name": "large", "model": str(os.getenv("AICORE_DEPLOYMENT_MODEL")), "max_tokens": 4000})
+    for tier in tiers:
+        tier.setdefault("max_tokens", 4000)
+        tier.setdefault("max_score", None)
+    return tiers
+
+
+class ModelRouter:
+    """
+    Wählt je Geschäftsfall die LLM-Stufe und protokolliert Entscheidung und Latenz.
+
+    LLMs und die daraus abgeleiteten Dokumenten-Ketten werden je Stufe beim ersten Gebrauch
+    erzeugt und danach wiederverwendet.
+    """
+
+    def __init__(self, tiers=None, default_llm=None, llm_factory=None, max_log=500):
+        """
+        Args:
+            tiers (list, optional): Stufen wie in load_model_tiers (Standard: Konfiguration).
+            default_llm (optional): Bereits initialisiertes LLM für die Stufe mit AICORE_DEPLOYMENT_MODEL.
+            llm_factory (callable, optional): Erzeugt ein LLM aus (model_name, max_tokens); Standard init_llm.
+            max_log (int): Anzahl der vorgehaltenen Routing-Entscheidungen.
+        """
+        self.tiers = tiers or load_model_tiers()
+        self.llm_factory = llm_factory or _init_llm
+        self.decisions = deque(maxlen=max_log)
+        self._llms = {}
+        self._chains = {}
+        self._lock = threading.Lock()
+        if default_llm is not None:
+            for tier in self.tiers:
+                if tier["model"] == os.getenv("AICORE_DEPLOYMENT_MODEL"):
+                    self._llms[tier["name"]] = default_llm
+
+    def select_tier(self, complexity):
+        """Liefert die erste Stufe, deren max_score über dem Komplexitäts-Score liegt."""
+        for tier in self.tiers:
+            if tier["max_score"] is None or complexity["score"] < tier["max_score"]:
+                return tier
+        return self.tiers[-1]
+
+    def get_llm(self, tier):
+        """Liefert das LLM einer Stufe (wird beim ersten Aufruf initialisiert)."""
+        with self._lock:
+            if tier["name"] not in self._llms:
+                self._llms[tier["name"]] = self.llm_factory(tier["model"], tier["max_tokens"])
+            return self._llms[tier["name"]]
+
+    def get_chain(self, tier, combine_documents_chain):
+        """
+        Liefert eine Kopie der Dokumenten-Kette (Prompt, Dokumentformat) mit dem LLM der Stufe.
+
+        Args:
+            tier (dict): Gewählte Stufe.
+            combine_documents_chain (StuffDocumentsChain): Kette der RetrievalQA (qa_chain.combine_documents_chain).
+        """
+        llm = self.get_llm(tier)
+        with self._lock:
+            key = (tier["name"], id(combine_documents_chain))
+            if key not in self._chains:
+                llm_chain = combine_documents_chain.llm_chain.model_copy(update={"llm": llm})
+                self._chains[key] = combine_documents_chain.model_copy(update={"llm_chain": llm_chain})
+            return self._chains[key]
+
+    def run(self, question, documents, combine_documents_chain, scored_documents=None, callbacks=None,
+            resilience=None, deadline=None, cases=None, context=None):
+        """
+        Bewertet den Geschäftsfall, ruft das LLM der gewählten Stufe auf und protokolliert das Ergebnis.
+
+        Args:
+            question (str): Beschreibung des Geschäftsfalls.
+            documents (list): Kontext-Dokumente für das LLM.
+            combine_documents_chain (StuffDocumentsChain): Dokumenten-Kette der QA-Kette.
+            scored_documents (list, optional): Retrieval-Ergebnis mit Scores für die Mehrdeutigkeit.
+            callbacks (list, optional): LangChain-Callbacks für den LLM-Aufruf (z.B. Token-Stream).
+            resilience (ResiliencePolicy, optional): Timeout, Wiederholung, Hedging und Circuit Breaker für das LLM.
+            deadline (Deadline, optional): Deadline der Anfrage.
+            cases (int, optional): Anzahl der Geschäftsfälle der ursprünglichen Eingabe (siehe score_complexity).
+            context (str, optional): Frühere Geschäftsfälle als Kontext für das LLM (dpa_splitter.case_contexts);
+                fließt nicht in die Bewertung ein.
+
+        Returns:
+            tuple: (Antwort des LLM, Routing-Eintrag als dict)
+        """
+        complexity = score_complexity(question, scored_documents, cases)
+        tier = self.select_tier(complexity)
+        chain = self.get_chain(tier, combine_documents_chain)
+        question = with_context(question, context)
+        acquire_llm(question, documents, deadline=deadline)
+        start = time.perf_counter()
+        answer = resilient_call(
+            resilience, "llm", chain.run, input_documents=documents, question=question, callbacks=callbacks,
+            deadline=deadline, hedge_kwargs={"callbacks": None}
+        )
+        decision = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "tier": tier["name"],
+            "model": tier["model"],
+            "complexity": complexity,
+            "latency_ms": round((time.perf_counter() - start) * 1000),
+        }
+        self.decisions.append(decision)
+        print(f"Model routing: {tier['name']} ({tier['model']}), score {complexity['score']}, {decision['latency_ms']} ms")
+        return answer, decision
+
+    def stats(self):
+        """
+        Fasst die protokollierten Entscheidungen je Stufe zusammen.
+
+        Returns:
+            dict: {stufe: {"count", "avg_latency_ms"}} und die letzten Entscheidungen unter "recent".
+        """
+        decisions = list(self.decisions)
+        result = {}
+        for tier in self.tiers:
+            latencies = [d["latency_ms"] for d in decisions if d["tier"] == tier["name"]]
+            result[tier["name"]] = {
+                "model": tier["model"],
+                "count": len(latencies),
+                "avg_latency_ms": round(sum(latencies) / len(latencies)) if latencies else None,
+            }
+        return {"tiers": result, "recent": decisions[-20:]}
+
+
+def _init_llm(model_name, max_tokens):
+    from gen_ai_hub.proxy.langchain.init_models import init_llm
+    from .dpa_ledger import meter_llm
+    from .dpa_resilience import apply_client_timeout, client_timeout
+    llm = meter_llm(init_llm(model_name=model_name, max_tokens=max_tokens, temperature=0), model_name)
+    return apply_client_timeout(llm, client_timeout("llm"))
@@ -4,6 +4,7 @@
 # --- Imports ---
 import json
 import os
+import time
 from gen_ai_hub.proxy.native.openai import embeddings as native_embeddings
 from hdbcli import dbapi
 from gen_ai_hub.proxy.langchain.openai import ChatOpenAI, OpenAI
@@ -13,6 +14,11 @@ from langchain.text_splitter import CharacterTextSplitter
 from langchain.document_loaders import PyPDFLoader
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain.schema import Document
+from .dpa_rule_index import (count_rules, extract_rule_rows, load_rule_index_hana, rule_index_file, save_rule_index_hana,
+                              save_rule_index_json)
+from .dpa_checkpoint import checkpointed_ingest
+from .dpa_bluegreen import (copy_other_sources, create_shadow_store, resolve_active_table, switch_active_table,
+                            validate_shadow)
 
 # --- Funktionen ---
 
@@ -56,8 +62,14 @@ def test_sap_ai_core_embedding():
         print("Ensure the model name matches an existing deployment in SAP AI Hub.")
 
 # A0.3 Setup and test connection to HANA DB
-def setup_hana_connection():
-    """Stellt eine Verbindung zur HANA DB her und gibt das Connection-Objekt zurück."""
+def setup_hana_connection(timeout=None):
+    """
+    Stellt eine Verbindung zur HANA DB her und gibt das Connection-Objekt zurück.
+
+    Args:
+        timeout (float, optional): Timeout je Datenbankaufruf in Sekunden (communicationTimeout);
+            ohne Angabe wartet der Client unbegrenzt (z.B. für große Schreibvorgänge der Ingestion).
+    """
     hdb_host_address = str(os.getenv("hdb_host_address"))
     hdb_user = str(os.getenv("hdb_user"))
     hdb_password = str(os.getenv("hdb_password"))
@@ -73,7 +85,8 @@ def setup_hana_connection():
         port=hdb_port,
         user=hdb_user,
         password=hdb_password,
-        autocommit=True
+        autocommit=True,
+        **({"communicationTimeout": int(timeout * 1000)} if timeout else {})
     )
     return hana_connection
 
@@ -105,8 +118,8 @@ def setup_embedding_model():
 
 # A0.6 Setup vectorestore in SAP HANA Database
 def setup_hana_vectorstore(embeddings, hana_connection):
-    """Initialisiert den HanaDB VectorStore."""
-    vector_table_name = str(os.getenv('hdb_table_name'))
+    """Initialisiert den HanaDB VectorStore (aktive Generation laut Zeigertabelle, sonst hdb_table_name)."""
+    vector_table_name = resolve_active_table(hana_connection, str(os.getenv('hdb_table_name')))
     hana_database = HanaDB(
         embedding=embeddings,
         connection=hana_connection,
@@ -126,6 +139,11 @@ def load_pdf(file_path):
     documents = loader.load()
     return documents
 
+# function A2.1 uniform source of a handbook (chunk metadata, rule index and document registry)
+def source_name(filepath):
+    """Quelle einer Handbuchdatei: Dateiname im Upload-Ordner, unabhängig davon, wie der Pfad angegeben ist."""
+    return os.path.basename(filepath)
+
 # function A2.2.3 split document in chunks - Semantic Chunker
 def split_pdf_to_chunks(docs, chunk_size=1000, chunk_overlap=200):
     """Teilt Dokumente in Chunks auf."""
@@ -154,6 +172,26 @@ def reload_embeddings(hana_database, text_chunks):
     print(f"Successfully added {len(text_chunks)} document chunks to the database.")
     print("Connected to the HANA Cloud database.")
 
+# function A4.2.2 replace the embeddings of a single source file (other handbooks stay in the table)
+def replace_source_embeddings(hana_database, text_chunks, source):
+    """Löscht die Chunks einer Quelldatei (Metadatum "source") und lädt die neuen Chunks hoch."""
+    hana_database.delete(filter={"source": source})
+    hana_database.add_documents(text_chunks)
+    print(f"Successfully replaced {len(text_chunks)} document chunks of {source}.")
+
+# function A4.2.3 chunk, embed and upload in checkpointed batches (resumable after failures)
+def reload_embeddings_checkpointed(hana_database, embeddings, filepath, docs, replace_all=True, target=None):
+    """
+    Wie semantic_chunking und reload_embeddings, aber batchweise mit lokalem Checkpoint: ein
+    erneuter Aufruf nach einem Abbruch setzt fort, ohne Embeddings erneut zu berechnen.
+    replace_all=False ersetzt nur die Chunks dieser Datei statt der ganzen Tabelle.
+    """
+    source = source_name(filepath)
+    # Auch Chunks früherer Läufe, die den Pfad statt des Dateinamens als Quelle tragen
+    delete_filter = {} if replace_all else {"source": {"$in": sorted({source, filepath, os.path.abspath(filepath)})}}
+    return checkpointed_ingest(hana_database, embeddings, filepath, docs, semantic_chunking, delete_filter, target=target,
+                               source=source)
+
 # function A4.2 query to verify embeddings
 def query_embeddings(hana_connection, hana_database, keyword="Rückstellung"):
     cursor = hana_connection.cursor()
@@ -162,4 +200,47 @@ def query_embeddings(hana_connection, hana_database, keyword="Rückstellung"):
     vectors = cursor.fetchall()
     print(vectors[5:10])
 
+# function A4.3 extract account/rule index from the handbook and save it next to the vector table
+def build_rule_index(hana_connection, hana_database, documents, source=None, replace_all=False):
+    """
+    Extrahiert die Kontierungsregeln (Konten Soll/Haben) und speichert sie in HANA und lokal;
+    ersetzt werden nur die Regeln dieser Quelle, die Regeln anderer Handbücher bleiben erhalten.
+    replace_all=True ersetzt alle Regeln (die Vektortabelle enthält danach nur diese Datei).
+    """
+    rows = extract_rule_rows(documents, source=source)
+    sources = None if replace_all else [source]
+    save_rule_index_hana(hana_connection, hana_database.table_name, rows, sources=sources)
+    save_rule_index_json(rule_index_file(hana_database.table_name), rows, sources=sources)
+    print(f"Extracted {count_rules(rows)} posting rules with {len(rows)} account rows.")
+    return rows
+
+# function A4.4 blue/green re-indexing: build a shadow generation, validate it and switch the active table
+def reindex_blue_green(hana_connection, embeddings, filepath, docs, source=None):
+    """
+    Neuindexierung ohne Ausfallzeit: Chunks und Regelindex werden in eine neue Generation
+    geschrieben, geprüft und erst dann über die Zeigertabelle aktiviert (siehe dpa_bluegreen).
+    Die übrigen Handbücher werden aus der aktiven Tabelle übernommen. Schlägt die Prüfung fehl,
+    bleibt die bisherige Tabelle aktiv.
+    """
+    alias = str(os.getenv('hdb_table_name'))
+    active_table = resolve_active_table(hana_connection, alias)
+    generation, shadow = create_shadow_store(hana_connection, embeddings, alias)
+    # Eigenes Ziel je Aufbau: Vektoren aus dem Checkpoint werden wiederverwendet, aber alle Batches neu geschrieben
+    ingest = checkpointed_ingest(shadow, embeddings, filepath, docs, semantic_chunking,
+                                 target=f"{shadow.table_name}@{time.time():.0f}", source=source_name(filepath))
+    rows = build_rule_index(hana_connection, shadow, docs, source=source)
+    # Chunks und Regeln der übrigen Handbücher übernehmen (diese Datei auch unter früheren Pfaden ausgenommen)
+    copied = copy_other_sources(hana_connection, active_table, shadow,
+                                {source_name(filepath), source, filepath, os.path.abspath(filepath)} - {None})
+    save_rule_index_json(rule_index_file(shadow.table_name), load_rule_index_hana(hana_connection, shadow.table_name).rows)
+    validation = validate_shadow(hana_connection, shadow, ingest["chunks"] + copied, active_table=active_table)
+    result = dict(ingest, rule_rows=rows, copied_chunks=copied, validation=validation, table=shadow.table_name,
+                  generation=generation, switched=False, pointer=None)
+    if validation["valid"]:
+        result["pointer"] = switch_active_table(hana_connection, alias, shadow.table_name, generation)
+        result["switched"] = True
+    else:
+        print(f"Validation of {shadow.table_name} failed, {active_table} stays active: {validation['errors']}")
+    return result
+
 # --- Ende ---
@@ -82,7 +82,10 @@ def connect_to_hana_db():
         raise ValueError("One or more HANA DB connection parameters are missing.")
     assert hdb_port is not None, "hdb_port must not be None"
     hdb_port = int(hdb_port)
-    hana_connection = dbapi.connect(address=hdb_host_address, port=hdb_port, user=hdb_user, password=hdb_password, autocommit=True)
+    # Timeout je Abfrage wie in der Resilienz-Schicht (DPA_RETRIEVER_TIMEOUT), damit hängende Aufrufe ihren Platz freigeben
+    from .dpa_resilience import client_timeout
+    hana_connection = dbapi.connect(address=hdb_host_address, port=hdb_port, user=hdb_user, password=hdb_password, autocommit=True,
+                                    communicationTimeout=int(client_timeout("retriever") * 1000))
     return hana_connection
 
 # B0.4 Setup LLM-Connection to SAP AI-HUB
@@ -104,6 +107,11 @@ def init_llm_connection():
     if not aicore_model_name:
         raise ValueError(f"LLM model name {aicore_model_name} missing.")
     llm = init_llm(model_name=aicore_model_name, max_tokens=4000, temperature=0)
+    # Tokens jedes Aufrufs im Token- und Kostenbuch buchen
+    from .dpa_ledger import meter_llm
+    from .dpa_resilience import apply_client_timeout, client_timeout
+    meter_llm(llm, aicore_model_name)
+    apply_client_timeout(llm, client_timeout("llm"))
     print(f"LLM loaded: {aicore_model_name}")
     return llm
 
@@ -140,11 +148,14 @@ def init_embedding_model_connection():
     """
     ai_core_embedding_model_name = str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING"))
     embeddings = init_embedding_model(ai_core_embedding_model_name)
+    from .dpa_resilience import apply_client_timeout, client_timeout
+    apply_client_timeout(embeddings, client_timeout("embedding"))
     print("Embedding model initialized: ", ai_core_embedding_model_name)
     return embeddings
 
 # B0.6 create SAP HANA-VectorStore interface
 from langchain_community.vectorstores.hanavector import HanaDB
+from .dpa_bluegreen import resolve_active_table
 
 def create_vector_store(embeddings, hana_connection):
     """
@@ -157,7 +168,8 @@ def create_vector_store(embeddings, hana_connection):
     Returns:
         HanaDB: Instanz des HANA-Vektor-Speichers.
     """
-    vector_table_name = str(os.getenv("hdb_table_name"))
+    # Aktive Generation laut Zeigertabelle (Blue/Green-Neuindexierung), sonst hdb_table_name
+    vector_table_name = resolve_active_table(hana_connection, str(os.getenv("hdb_table_name")))
     hana_database = HanaDB(embedding=embeddings, connection=hana_connection, table_name=vector_table_name)
     print(f"VectorStore ready: {vector_table_name}")
     return hana_database
@@ -495,12 +507,38 @@ Für erfolgreiche Kontierung:
 prompt_template_json = PromptTemplate(template=prompt_template_json, input_variables=["context","question"])
 print("Prompt JSON set")
 
+# B2.3 load structured account/rule index (extracted by Modul A)
+from .dpa_rule_index import RuleAwareRetriever, load_rule_index_hana, load_rule_index_json, rule_index_file
+
+def load_rule_index(hana_connection, vector_table_name=None):
+    """
+    Lädt den Regelindex zur Vektortabelle aus HANA, ersatzweise aus der lokalen JSON-Kopie derselben Tabelle.
+
+    Args:
+        hana_connection: Aktive HANA-Datenbankverbindung.
+        vector_table_name (str, optional): Name der Vektortabelle (Standard: hdb_table_name).
+
+    Returns:
+        RuleIndex: Der geladene Regelindex (ggf. leer).
+    """
+    vector_table_name = vector_table_name or str(os.getenv("hdb_table_name"))
+    try:
+        rule_index = load_rule_index_hana(hana_connection, vector_table_name)
+    except Exception as e:
+        print(f"Rule index not loaded from HANA: {e}")
+        rule_index = None
+    if not rule_index:
+        rule_index = load_rule_index_json(rule_index_file(vector_table_name))
+    print(f"Rule index loaded: {len(rule_index)} account rows")
+    return rule_index
+
 # B3 answer: RetrievalQA
+from .dpa_tracing import chain_verbose, span, trace_callbacks, tracing
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 from langchain.chains import RetrievalQA
 
-def create_qa_chain(llm, hana_database, prompt_template, count_retrieved_documents=10):
+def create_qa_chain(llm, hana_database, prompt_template, count_retrieved_documents=10, rule_index=None):
     """
     Erstellt eine RetrievalQA-Chain für Frage-Antwort-Anwendungen.
 
@@ -509,21 +547,206 @@ def create_qa_chain(llm, hana_database, prompt_template, count_retrieved_documen
         hana_database: Vektor-Datenbank zur Kontextabfrage.
         prompt_template: Vorlage für die Eingabeaufforderung.
         count_retrieved_documents (int): Anzahl abzurufender Dokumente.
+        rule_index (RuleIndex, optional): Regelindex; passende Regelzeilen werden dem Kontext vorangestellt.
 
     Returns:
         RetrievalQA: Konfigurierte QA-Kette.
     """
     chain_type_kwargs = {"prompt": prompt_template}
     retriever = hana_database.as_retriever(search_kwargs={"k": count_retrieved_documents})
+    if rule_index:
+        retriever = RuleAwareRetriever(base_retriever=retriever, rule_index=rule_index)
     qa_chain = RetrievalQA.from_chain_type(
         llm=llm, 
         retriever=retriever, 
         chain_type="stuff", 
         chain_type_kwargs=chain_type_kwargs, 
-        verbose=True
+        verbose=chain_verbose()
     )
     return qa_chain
 
+# B3.1 run posting pipeline: split cases -> fast path -> retrieval with scores -> domain gate -> LLM
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from .dpa_fastpath import fast_path_answer
+from .dpa_domain_gate import check_domain
+from .dpa_rule_index import prepend_rule_document
+from .dpa_splitter import case_contexts, split_business_cases, with_context
+from .dpa_resilience import resilient_call
+from .dpa_ratelimit import acquire_llm
+
+def answer_business_case(question, query_vector, qa_chain, hana_database, rule_index=None, count_retrieved_documents=10,
+                         model_router=None, callbacks=None, resilience=None, deadline=None, output_format="html",
+                         scored_documents=None, context=None, case_count=1):
+    """
+    Kontiert einen einzelnen Geschäftsfall über Retrieval, Domänen-Gate und LLM.
+
+    Args:
+        question (str): Beschreibung des Geschäftsfalls.
+        query_vector (list): Embedding des Geschäftsfalls.
+        qa_chain (RetrievalQA): QA-Kette aus create_qa_chain.
+        hana_database (HanaDB): Vektor-Datenbank zur Kontextabfrage.
+        rule_index (RuleIndex, optional): Regelindex aus Modul A.
+        count_retrieved_documents (int): Anzahl abzurufender Dokumente.
+        model_router (ModelRouter, optional): Wählt die LLM-Stufe nach Komplexität; ohne Router das LLM der qa_chain.
+        callbacks (list, optional): LangChain-Callbacks für den LLM-Aufruf (z.B. Token-Stream).
+        resilience (ResiliencePolicy, optional): Timeouts, Wiederholungen und Circuit Breaker je Dienst.
+        deadline (Deadline, optional): Deadline der Anfrage.
+        output_format (str): Format lokal erzeugter Antworten, "html" oder "json" (passend zum Prompt der qa_chain).
+        scored_documents (list, optional): Vorab abgerufene [(Document, Score), ...] (dpa_prefetch);
+            dann entfallen Embedding und Retrieval.
+        context (str, optional): Frühere Geschäftsfälle derselben Eingabe, auf die sich dieser bezieht
+            (dpa_splitter.case_contexts); nur für das LLM, nicht für Retrieval und Domänen-Gate.
+        case_count (int): Anzahl der Geschäftsfälle der ursprünglichen Eingabe (Komplexität im Modell-Routing).
+
+    Returns:
+        dict: {"output": str, "route": "out_of_domain" | "rag", "top_score": float|None, "routing": dict|None}
+    """
+    with span("case", chars=len(question)) as case_span:
+        with span("retrieval", k=count_retrieved_documents, prefetched=scored_documents is not None) as retrieval:
+            if scored_documents is None:
+                scored_documents = resilient_call(
+                    resilience, "retriever", hana_database.similarity_search_with_score_by_vector, query_vector,
+                    k=count_retrieved_documents, deadline=deadline
+                )
+            if tracing():
+                # Score, Seite und Länge je abgerufenem Chunk
+                retrieval.set(documents=len(scored_documents), chunks=[
+                    {"score": round(float(score), 4), "page": doc.metadata.get("page"), "chars": len(doc.page_content)}
+                    for doc, score in scored_documents
+                ])
+        with span("domain_gate") as gate_span:
+            gate = check_domain(question, scored_documents, output_format=output_format)
+            gate_span.set(off_topic=gate["off_topic"], top_score=gate["top_score"])
+        if gate["off_topic"]:
+            print(f"Out-of-domain input (top score {gate['top_score']}), LLM call skipped.")
+            case_span.set(route="out_of_domain")
+            return {"output": gate["answer"], "route": "out_of_domain", "top_score": gate["top_score"]}
+        documents = prepend_rule_document(rule_index, question, [doc for doc, _ in scored_documents])
+        case_span.set(route="rag", context_documents=len(documents), case_context=context is not None)
+        with span("llm_chain", documents=len(documents)) as chain_span:
+            # Zerlegt den Aufruf in die Spans prompt, llm und parse (nur bei laufendem Trace)
+            callbacks = trace_callbacks(callbacks)
+            if model_router is not None:
+                answer, routing = model_router.run(
+                    question, documents, qa_chain.combine_documents_chain, scored_documents, callbacks, resilience, deadline,
+                    cases=case_count, context=context
+                )
+                chain_span.set(tier=routing["tier"], model=routing["model"], output_chars=len(answer or ""))
+                return {"output": answer, "route": "rag", "top_score": gate["top_score"], "routing": routing}
+            llm_question = with_context(question, context)
+            acquire_llm(llm_question, documents, deadline=deadline)
+            answer = resilient_call(
+                resilience, "llm", qa_chain.combine_documents_chain.run, input_documents=documents, question=llm_question,
+                callbacks=callbacks, deadline=deadline, hedge_kwargs={"callbacks": None}
+            )
+            chain_span.set(output_chars=len(answer or ""))
+        return {"output": answer, "route": "rag", "top_score": gate["top_score"]}
+
+def run_posting_pipeline(question, qa_chain, hana_database, rule_index=None, count_retrieved_documents=10, max_workers=None,
+                         model_router=None, callbacks=None, resilience=None, deadline=None, output_format="html",
+                         prefetched=None):
+    """
+    Ermittelt die Kontierung für einen oder mehrere Geschäftsfälle über die günstigste passende Stufe.
+
+    1. Zerlegung der Eingabe in Geschäftsfälle; Fälle mit Rückbezug erhalten die früheren als Kontext
+    2. Schnellpfad für einfache Standard-Geschäftsfälle ohne Rückbezug (ohne Retrieval und LLM)
+    3. Embedding aller übrigen Geschäftsfälle in einem Batch-Aufruf (außer bei vorab abgerufenen Fällen)
+    4. Je Geschäftsfall parallel: Retrieval mit Scores, Domänen-Gate (themenfremde Eingaben erhalten
+       sofort eine lokalisierte "keine Kontierung"-Antwort) und LLM mit den abgerufenen Dokumenten
+    5. Zusammenführen der Buchungssätze in der Reihenfolge der Eingabe
+
+    Args:
+        question (str): Beschreibung des Geschäftsfalls bzw. der Geschäftsfälle.
+        qa_chain (RetrievalQA): QA-Kette aus create_qa_chain.
+        hana_database (HanaDB): Vektor-Datenbank zur Kontextabfrage.
+        rule_index (RuleIndex, optional): Regelindex aus Modul A.
+        count_retrieved_documents (int): Anzahl abzurufender Dokumente je Geschäftsfall.
+        max_workers (int, optional): Maximal parallel bearbeitete Geschäftsfälle (Standard: DPA_MAX_PARALLEL_CASES).
+        model_router (ModelRouter, optional): Modell-Routing je Geschäftsfall (siehe dpa_model_router).
+        callbacks (list, optional): LangChain-Callbacks für den LLM-Aufruf; nur bei einem einzelnen
+            LLM-Geschäftsfall weitergereicht, damit sich Token-Streams paralleler Fälle nicht vermischen.
+        resilience (ResiliencePolicy, optional): Timeouts, Wiederholungen, Hedging und Circuit Breaker
+            für Embedding, Retrieval und LLM (siehe dpa_resilience).
+        deadline (Deadline, optional): Deadline der Anfrage (Standard: resilience.new_deadline()).
+        output_format (str): "html" für prompt_template_html, "json" für prompt_template_json; mehrere
+            Geschäftsfälle werden im JSON-Format als Liste zusammengeführt.
+        prefetched (callable, optional): Liefert zu einem Geschäftsfall vorab abgerufene Dokumente mit
+            Scores oder None (z.B. RetrievalPrefetcher.lookup, siehe dpa_prefetch).
+
+    Returns:
+        dict: {"output": str, "route": "fastpath" | "out_of_domain" | "rag" | "multi_case",
+               "top_score": float|None, "cases": list}
+    """
+    if deadline is None and resilience is not None:
+        deadline = resilience.new_deadline()
+    options = {
+        "qa_chain": qa_chain, "hana_database": hana_database, "rule_index": rule_index,
+        "count_retrieved_documents": count_retrieved_documents, "model_router": model_router,
+        "resilience": resilience, "deadline": deadline, "output_format": output_format,
+    }
+    with span("split", chars=len(question)) as split_span:
+        cases = split_business_cases(question)
+        contexts = case_contexts(cases)
+        split_span.set(cases=len(cases), with_context=sum(1 for c in contexts if c))
+    options["case_count"] = len(cases)
+    results = [None] * len(cases)
+    open_cases = []
+    with span("fastpath") as fast_span:
+        for i, case in enumerate(cases):
+            answer = None if contexts[i] else fast_path_answer(case, rule_index=rule_index, output_format=output_format)
+            if answer is not None:
+                results[i] = {"output": answer, "route": "fastpath", "top_score": None}
+            else:
+                open_cases.append(i)
+        fast_span.set(answered=len(cases) - len(open_cases))
+    # Vorab abgerufene Fälle beginnen direkt beim Domänen-Gate und LLM
+    prefetched_documents = {}
+    if prefetched is not None:
+        with span("prefetch_lookup") as lookup_span:
+            for i in open_cases:
+                documents = prefetched(cases[i])
+                if documents is not None:
+                    prefetched_documents[i] = documents
+            lookup_span.set(hits=len(prefetched_documents))
+    pending = [i for i in open_cases if i not in prefetched_documents]
+    vectors = {}
+    with span("embedding", texts=len(pending), chars=sum(len(cases[i]) for i in pending)):
+        if len(pending) == 1:
+            vectors[pending[0]] = resilient_call(resilience, "embedding", hana_database.embedding.embed_query, cases[pending[0]], deadline=deadline)
+        elif pending:
+            # Ein Batch-Aufruf für alle Embeddings, danach Retrieval und LLM je Geschäftsfall parallel
+            vectors = dict(zip(pending, resilient_call(
+                resilience, "embedding", hana_database.embedding.embed_documents, [cases[i] for i in pending], deadline=deadline
+            )))
+    if len(open_cases) == 1:
+        i = open_cases[0]
+        results[i] = answer_business_case(cases[i], vectors.get(i), callbacks=callbacks,
+                                          scored_documents=prefetched_documents.get(i), context=contexts[i], **options)
+    elif open_cases:
+        workers = min(len(open_cases), max_workers or int(os.getenv("DPA_MAX_PARALLEL_CASES", "4")))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                i: executor.submit(contextvars.copy_context().run, answer_business_case, cases[i], vectors.get(i),
+                                   scored_documents=prefetched_documents.get(i), context=contexts[i], **options)
+                for i in open_cases
+            }
+            for i, future in futures.items():
+                results[i] = future.result()
+    if len(results) == 1:
+        return dict(results[0], cases=results)
+    scores = [r["top_score"] for r in results if r["top_score"] is not None]
+    if output_format == "json":
+        output = "[\n" + ",\n".join(r["output"] for r in results) + "\n]"
+    else:
+        output = "\n".join(r["output"] for r in results)
+    return {
+        "output": output,
+        "route": "multi_case",
+        "top_score": max(scores) if scores else None,
+        "cases": results,
+    }
+
 # Wenn diese Datei direkt ausgeführt wird, starte die Jupyter-basierte UI
 if __name__ == "__main__":
     config_file = "/home/user/.aicore/config.json"
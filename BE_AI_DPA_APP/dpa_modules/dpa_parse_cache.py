@@ -0,0 +1,114 @@
+# dpa_parse_cache.py
+# Inhaltsadressierter Cache für die PDF-Extraktion in Modul A.
+#
+# load_pdf (PyPDFLoader) liest bei jedem Upload und jeder Verarbeitung das ganze Handbuch neu ein,
+# auch wenn dieselbe Datei erneut hochgeladen wird. Hier wird das Ergebnis je SHA-256 des
+# Dateiinhalts abgelegt:
+#
+#   <DPA_PARSE_CACHE_DIR>/<sha256>.json.gz   Text und Metadaten je Seite (gzip-komprimiertes JSON)
+#
+# Unveränderte Dateien werden nicht erneut geparst; ob ihr Inhalt bereits in der aktiven
+# Vektortabelle steht, vermerkt das Dokumentenregister (dpa_registry).
+#
+# Konfiguration: DPA_PARSE_CACHE_DIR (Standard parse_cache, "" = aus)
+
+import gzip
+import json
+import os
+import tempfile
+
+from langchain.schema import Document
+
+from .dpa_checkpoint import file_sha256
+
+PARSER_VERSION = "pypdf-v1"
+
+
+class ParseCache:
+    """
+    Extraktionsergebnisse je Dateiinhalt (SHA-256) im Cache-Verzeichnis.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sha256):
+        return os.path.join(self.directory, f"{sha256}.json.gz")
+
+    def get(self, sha256, filepath=None):
+        """
+        Gespeicherte Seiten oder None. Das Metadatum "source" wird auf filepath gesetzt, damit
+        eine an anderem Ort hochgeladene, inhaltsgleiche Datei dieselben Metadaten wie load_pdf erhält.
+        """
+        path = self._path(sha256)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("parser") != PARSER_VERSION:
+            return None
+        pages = []
+        for page in data["pages"]:
+            metadata = dict(page["metadata"])
+            if filepath and "source" in metadata:
+                metadata["source"] = filepath
+            pages.append(Document(page_content=page["text"], metadata=metadata))
+        return pages
+
+    def put(self, sha256, docs):
+        """
+        Speichert die Seiten atomar; eigene temporäre Datei je Aufruf, da mehrere Worker-Prozesse
+        bzw. Threads dieselbe Datei gleichzeitig parsen können.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{sha256[:16]}-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump({"parser": PARSER_VERSION,
+                           "pages": [{"text": doc.page_content, "metadata": doc.metadata} for doc in docs]},
+                          f, ensure_ascii=False)
+            os.replace(tmp, self._path(sha256))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+
+def open_parse_cache(directory=None):
+    """
+    Öffnet den konfigurierten Parse-Cache.
+
+    Returns:
+        ParseCache | None: None, wenn der Cache abgeschaltet ist (DPA_PARSE_CACHE_DIR="").
+    """
+    directory = os.getenv("DPA_PARSE_CACHE_DIR", "parse_cache") if directory is None else directory
+    return ParseCache(directory) if directory else None
+
+
+def load_pdf_cached(filepath, cache=None, loader=None, sha256=None):
+    """
+    Wie load_pdf, aber mit Cache je Dateiinhalt.
+
+    Args:
+        filepath (str): Pfad der PDF-Datei.
+        cache (ParseCache, optional): Cache (Standard: open_parse_cache()).
+        loader (callable, optional): Eigentliche Extraktion (Standard: dpa_modulA.load_pdf).
+        sha256 (str, optional): Bereits bekannter Hash (z.B. beim Upload berechnet), sonst aus der Datei.
+
+    Returns:
+        tuple: (Seiten, SHA-256 des Inhalts, True bei Cache-Treffer)
+    """
+    if loader is None:
+        from .dpa_modulA import load_pdf as loader
+    cache = open_parse_cache() if cache is None else cache
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"The file {filepath} does not exist.")
+    sha256 = sha256 or file_sha256(filepath)
+    if cache is not None:
+        docs = cache.get(sha256, filepath)
+        if docs is not None:
+            return docs, sha256, True
+    docs = loader(filepath)
+    if cache is not None:
+        cache.put(sha256, docs)
+    return docs, sha256, False
@@ -0,0 +1,161 @@
+# dpa_prefetch.py
+# Spekulatives Retrieval, während der Buchhalter den Geschäftsfall noch eingibt (Modul B).
+#
+# main.js sendet die Teileingabe nach einer Tipp-Pause an /prefetch. Der Server zerlegt sie wie
+# run_posting_pipeline in Geschäftsfälle und bettet die Fälle ein, die nicht über den Schnellpfad
+# beantwortet werden. Für diese ruft er die Dokumente mit Scores ab und legt sie hier ab. Wird danach
+# derselbe Text abgeschickt oder ein Text, der den abgerufenen nur fortsetzt bzw. ergänzt (der
+# Buchhalter hat weitergetippt; nur das letzte, angefangene Wort darf sich ändern), beginnt die
+# Pipeline für diesen Fall direkt beim Domänen-Gate und beim LLM. Geänderter Text ("Bildung" statt
+# "Auflösung", "Debitor" statt "Kreditor") trifft keinen Eintrag, auch bei hoher Zeichenähnlichkeit.
+#
+# Einträge gelten nur für die Vektortabelle und Indexversion (dpa_index_version), mit der sie
+# abgerufen wurden, und höchstens DPA_PREFETCH_TTL Sekunden. Die Vorwärmung (dpa_warmup) legt Einträge
+# mit der längeren Ablaufzeit DPA_PREFETCH_WARMUP_TTL ab; auch sie gelten höchstens bis zur nächsten
+# Indexänderung.
+#
+# Konfiguration: DPA_PREFETCH_TTL (Sekunden, Standard 120), DPA_PREFETCH_SIZE (Einträge, Standard 256),
+#                DPA_PREFETCH_WARMUP_TTL (Sekunden für Einträge der Vorwärmung, Standard 3600),
+#                DPA_PREFETCH_SIMILARITY (Mindestähnlichkeit 0..1, Standard 0.9),
+#                DPA_PREFETCH_MIN_CHARS (Mindestlänge der Eingabe, Standard 20)
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from .dpa_fastpath import fast_path_answer
+from .dpa_resilience import resilient_call
+from .dpa_singleflight import normalize_question
+from .dpa_splitter import split_business_cases
+
+
+class RetrievalPrefetcher:
+    """
+    Begrenzter Zwischenspeicher vorab abgerufener Retrieval-Ergebnisse je Geschäftsfall.
+    """
+
+    def __init__(self, ttl=None, size=None, similarity=None, min_chars=None, warmup_ttl=None):
+        self.ttl = float(os.getenv("DPA_PREFETCH_TTL", "120")) if ttl is None else ttl
+        self.warmup_ttl = float(os.getenv("DPA_PREFETCH_WARMUP_TTL", "3600")) if warmup_ttl is None else warmup_ttl
+        self.size = int(os.getenv("DPA_PREFETCH_SIZE", "256")) if size is None else size
+        self.similarity = float(os.getenv("DPA_PREFETCH_SIMILARITY", "0.9")) if similarity is None else similarity
+        self.min_chars = int(os.getenv("DPA_PREFETCH_MIN_CHARS", "20")) if min_chars is None else min_chars
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Höchstens ein Prefetch gleichzeitig; weitere werden verworfen statt sich zu stauen
+        self._busy = threading.Semaphore(1)
+        # Zeichen am Ende des abgerufenen Textes, die sich noch ändern dürfen (angefangenes Wort)
+        self.tail_chars = 3
+        self.prefetches = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """Verwirft alle Einträge (z.B. nach einer Indexänderung)."""
+        with self._lock:
+            self._entries.clear()
+
+    def _fresh(self, entry, now, table_name, index_version):
+        ttl = entry.get("ttl", self.ttl)
+        return ((ttl is None or now - entry["created"] <= ttl) and entry["table"] == table_name
+                and entry["index_version"] == index_version)
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def prefetch(self, text, hana_database, rule_index=None, count_retrieved_documents=10, resilience=None,
+                 index_version=None, persistent=False, wait=False):
+        """
+        Ruft für die Geschäftsfälle der (Teil-)Eingabe die Dokumente ab und legt sie ab.
+
+        Args:
+            persistent (bool): Neue Einträge mit DPA_PREFETCH_WARMUP_TTL ablegen (Vorwärmung); sonst DPA_PREFETCH_TTL.
+            wait (bool): Auf einen laufenden Prefetch warten, statt die Anfrage zu verwerfen.
+
+        Returns:
+            dict: {"accepted": bool, "cases": int, "prefetched": int, "seconds": float}
+        """
+        start = time.perf_counter()
+        if len((text or "").strip()) < self.min_chars or not self._busy.acquire(blocking=wait):
+            return {"accepted": False, "cases": 0, "prefetched": 0, "seconds": 0.0}
+        try:
+            cases = split_business_cases(text)
+            now = time.monotonic()
+            with self._lock:
+                fresh = {key for key, entry in self._entries.items()
+                         if self._fresh(entry, now, hana_database.table_name, index_version)}
+            # Schnellpfad-Fälle brauchen kein Retrieval; bereits abgerufene Fälle werden nicht wiederholt
+            open_cases = [case for case in cases if normalize_question(case) not in fresh
+                          and fast_path_answer(case, rule_index=rule_index) is None]
+            if open_cases:
+                vectors = resilient_call(resilience, "embedding", hana_database.embedding.embed_documents, open_cases)
+                for case, vector in zip(open_cases, vectors):
+                    scored_documents = resilient_call(
+                        resilience, "retriever", hana_database.similarity_search_with_score_by_vector, vector,
+                        k=count_retrieved_documents
+                    )
+                    self._store(normalize_question(case), {
+                        "scored_documents": scored_documents, "table": hana_database.table_name,
+                        "index_version": index_version, "k": count_retrieved_documents, "created": time.monotonic(),
+                        "ttl": self.warmup_ttl if persistent else self.ttl,
+                    })
+            self.prefetches += 1
+            return {"accepted": True, "cases": len(cases), "prefetched": len(open_cases),
+                    "seconds": round(time.perf_counter() - start, 3)}
+        finally:
+            self._busy.release()
+
+    def _continues(self, matcher, prefetched):
+        """
+        True, wenn der neue Text den abgerufenen nur fortsetzt bzw. ergänzt: außer Einfügungen nur
+        Änderungen an den letzten tail_chars Zeichen des abgerufenen Textes.
+        """
+        for tag, i1, i2, _, _ in matcher.get_opcodes():
+            if tag in ("equal", "insert"):
+                continue
+            if i2 != len(prefetched) or i2 - i1 > self.tail_chars:
+                return False
+        return True
+
+    def lookup(self, case, table_name, index_version=None, count_retrieved_documents=10):
+        """
+        Vorab abgerufene Dokumente zu einem Geschäftsfall: gleicher Text oder Fortsetzung eines
+        abgerufenen Textes mit mindestens DPA_PREFETCH_SIMILARITY Ähnlichkeit.
+
+        Returns:
+            list | None: [(Document, Score), ...] oder None.
+        """
+        key = normalize_question(case)
+        now = time.monotonic()
+        with self._lock:
+            candidates = [(k, entry) for k, entry in self._entries.items()
+                          if self._fresh(entry, now, table_name, index_version)
+                          and entry["k"] >= count_retrieved_documents]
+        best, best_ratio = None, 0.0
+        for candidate_key, entry in candidates:
+            if candidate_key == key:
+                best, best_ratio = entry, 1.0
+                break
+            matcher = SequenceMatcher(None, candidate_key, key, autojunk=False)
+            if matcher.real_quick_ratio() < self.similarity or matcher.quick_ratio() < self.similarity:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= self.similarity and ratio > best_ratio and self._continues(matcher, candidate_key):
+                best, best_ratio = entry, ratio
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return best["scored_documents"][:count_retrieved_documents]
+
+    def stats(self):
+        """Anzahl der Einträge, Prefetches, Treffer und Fehlschläge."""
+        with self._lock:
+            entries = len(self._entries)
+        return {"entries": entries, "prefetches": self.prefetches, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,478 @@
+# dpa_profiling.py
+# CPU- und Speicherprofile einzelner Anfragen im laufenden Betrieb (ohne erneutes Deployment).
+#
+# Ist /process oder /process_file in Produktion langsam, lässt sich eine Anfrage gezielt profilieren:
+#
+#   - für die nächsten N Anfragen: POST /admin/profiling {"count": 5, "endpoints": ["modulB.process_input"]}
+#   - für eine einzelne Anfrage: Header "X-DPA-Profile: 1"
+#
+# Beides nur mit dem Header "X-DPA-Admin-Token" = DPA_ADMIN_TOKEN. Ohne konfiguriertes Token ist die
+# Profilierung abgeschaltet. Je profilierter Anfrage entstehen im Verzeichnis DPA_PROFILE_DIR:
+#
+#   <id>.json        Endpunkt, Dauer, Modus, Speicher (Beginn, Ende, Spitze) und Dateien
+#   <id>.cpu.txt     Top-Funktionen (sampling: eigene und inklusive Stichproben; cprofile: kumulierte Zeit)
+#   <id>.cpu.folded  sampling: gefaltete Stacks aller Threads (flamegraph.pl, speedscope)
+#   <id>.cpu.prof    cprofile: pstats-Datei des Anfrage-Threads (snakeviz, pstats)
+#   <id>.mem.txt     tracemalloc: am Ende noch belegter Speicher je Codezeile und je Aufrufpfad
+#
+# Der Standardmodus "sampling" erfasst alle Threads, also auch Embedding-, Retrieval- und LLM-Aufrufe in den
+# Worker-Threads der Pipeline. cProfile misst nur den Thread der Anfrage. Es läuft höchstens ein Profil
+# gleichzeitig (tracemalloc ist prozessweit); weitere Anfragen laufen dann unprofiliert. Das Verzeichnis ist
+# auf DPA_PROFILE_MAX Profile und DPA_PROFILE_MAX_MB begrenzt; die ältesten werden gelöscht.
+# Abruf: GET /admin/profiles (Liste), GET /admin/profiles/<datei> (Download).
+#
+# Speicher-Benchmark der Ingestion des mitgelieferten Handbuchs (reproduzierbar: FakeEmbeddings und
+# FakeHanaConnection statt AI Core und HANA, feste Dimension, temporärer Checkpoint):
+#   python -m dpa_modules.dpa_profiling static/uploads/Kontierungshandbuch_KP_angepasst_V01_20250403.pdf
+#   python -m dpa_modules.dpa_profiling <pdf> --dimension 1536 --output bench_ingest.json
+# Die Zeiten je Phase sind unter tracemalloc deutlich höher als im Betrieb; maßgeblich sind die Speicherwerte.
+#
+# Konfiguration: DPA_ADMIN_TOKEN, DPA_PROFILE_DIR (Standard profiles), DPA_PROFILE_MAX (Standard 20),
+#                DPA_PROFILE_MAX_MB (Standard 200), DPA_PROFILE_MODE (sampling | cprofile, Standard sampling),
+#                DPA_PROFILE_INTERVAL (Sekunden zwischen Stichproben, Standard 0.005),
+#                DPA_PROFILE_FRAMES (tracemalloc-Rahmen je Allokation, Standard 5)
+
+import argparse
+import cProfile
+import functools
+import hmac
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_MODES = ("sampling", "cprofile")
+
+
+def admin_authorized(request):
+    """True, wenn DPA_ADMIN_TOKEN gesetzt ist und der Header X-DPA-Admin-Token übereinstimmt."""
+    token = os.getenv("DPA_ADMIN_TOKEN", "")
+    given = request.headers.get("X-DPA-Admin-Token", "")
+    return bool(token) and hmac.compare_digest(token.encode("utf-8"), given.encode("utf-8"))
+
+
+class SamplingProfiler:
+    """
+    Stichproben-Profiler: liest in einem eigenen Thread alle interval Sekunden die Stacks aller Threads.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="dpa-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(f"thread {names.get(ident, ident)}")
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Gefaltete Stacks ("a;b;c Anzahl" je Zeile)."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit=40):
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack[1:]):
+                inclusive[function] += count
+        total = sum(self.stacks.values()) or 1
+        lines = [f"{self.samples} Stichproben, Intervall {self.interval * 1000:.1f} ms, {total} Thread-Stacks", "",
+                 "Eigene Stichproben (Funktion, in der der Thread gerade stand):"]
+        lines += [f"{count:8d} {100 * count / total:6.1f}%  {function}" for function, count in own.most_common(limit)]
+        lines += ["", "Inklusive Stichproben (Funktion auf dem Stack):"]
+        lines += [f"{count:8d} {100 * count / total:6.1f}%  {function}" for function, count in inclusive.most_common(limit)]
+        return "\n".join(lines) + "\n"
+
+
+def memory_summary(snapshot, baseline, current, peak, limit=30):
+    """Textbericht eines tracemalloc-Snapshots: größte Allokationen je Codezeile und je Aufrufpfad."""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    mb = 1024 * 1024
+    lines = [f"Beginn {baseline / mb:.2f} MB, Ende {current / mb:.2f} MB, Spitze {peak / mb:.2f} MB "
+             f"(nur mit tracemalloc verfolgte Allokationen)", "", "Am Ende noch belegt, je Codezeile:"]
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} Blöcke  {frame.filename}:{frame.lineno}")
+    lines += ["", "Je Aufrufpfad (größte 5):"]
+    for stat in snapshot.statistics("traceback")[:5]:
+        lines.append(f"{stat.size / 1024:.1f} KiB in {stat.count} Blöcken")
+        lines += [f"    {line}" for line in stat.traceback.format()]
+    return "\n".join(lines) + "\n"
+
+
+class RequestProfiler:
+    """
+    Profiliert ausgewählte Anfragen (CPU und Speicher) und verwaltet das begrenzte Profilverzeichnis.
+    """
+
+    def __init__(self, directory=None, max_profiles=None, max_mb=None, mode=None, interval=None, frames=None):
+        self.directory = directory or os.getenv("DPA_PROFILE_DIR", "profiles")
+        self.max_profiles = int(os.getenv("DPA_PROFILE_MAX", "20")) if max_profiles is None else max_profiles
+        self.max_bytes = int(float(os.getenv("DPA_PROFILE_MAX_MB", "200")) * 1024 * 1024) if max_mb is None \
+            else int(max_mb * 1024 * 1024)
+        self.mode = mode or os.getenv("DPA_PROFILE_MODE", "sampling")
+        self.interval = float(os.getenv("DPA_PROFILE_INTERVAL", "0.005")) if interval is None else interval
+        self.frames = int(os.getenv("DPA_PROFILE_FRAMES", "5")) if frames is None else frames
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self._armed = 0
+        self._endpoints = None
+        self._armed_mode = None
+
+    def arm(self, count, endpoints=None, mode=None):
+        """Profiliert die nächsten count Anfragen (optional nur an endpoints, z.B. "modulA.process_file")."""
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"Unbekannter Modus {mode}, erlaubt: {', '.join(PROFILE_MODES)}")
+        with self._lock:
+            self._armed = max(0, int(count))
+            self._endpoints = set(endpoints) if endpoints else None
+            self._armed_mode = mode
+
+    def status(self):
+        with self._lock:
+            return {"armed": self._armed, "endpoints": sorted(self._endpoints) if self._endpoints else None,
+                    "mode": self._armed_mode or self.mode, "running": self._running.locked(),
+                    "directory": self.directory, "enabled": bool(os.getenv("DPA_ADMIN_TOKEN"))}
+
+    def claim(self, endpoint, forced=False):
+        """
+        Entscheidet, ob eine Anfrage profiliert wird; verbraucht dabei ggf. eine der vorgemerkten Anfragen.
+
+        Returns:
+            str | None: Modus oder None.
+        """
+        with self._lock:
+            if forced:
+                return self._armed_mode or self.mode
+            if self._armed > 0 and (self._endpoints is None or endpoint in self._endpoints):
+                self._armed -= 1
+                return self._armed_mode or self.mode
+        return None
+
+    @contextmanager
+    def profile(self, name, mode=None):
+        """
+        Profiliert den Block; liefert die Metadaten des Profils (dict) bzw. None, wenn bereits ein Profil läuft.
+        """
+        if not self._running.acquire(blocking=False):
+            yield None
+            return
+        try:
+            mode = mode or self.mode
+            profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{_safe(name)}-{uuid.uuid4().hex[:6]}"
+            info = {"profile_id": profile_id, "name": name, "mode": mode,
+                    "started": datetime.now().isoformat(timespec="seconds")}
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(self.frames)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            if mode == "cprofile":
+                cpu = cProfile.Profile()
+                cpu.enable()
+            else:
+                cpu = SamplingProfiler(self.interval)
+                cpu.start()
+            start = time.perf_counter()
+            try:
+                yield info
+            finally:
+                if mode == "cprofile":
+                    cpu.disable()
+                else:
+                    cpu.stop()
+                info["seconds"] = round(time.perf_counter() - start, 3)
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                info["memory_mb"] = {"baseline": round(baseline / 1048576, 2), "end": round(current / 1048576, 2),
+                                     "peak": round(peak / 1048576, 2)}
+                self._write(info, cpu, memory_summary(snapshot, baseline, current, peak))
+                self._prune()
+        finally:
+            self._running.release()
+
+    def _write(self, info, cpu, memory_text):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, info["profile_id"])
+        if isinstance(cpu, cProfile.Profile):
+            cpu.dump_stats(base + ".cpu.prof")
+            text = io.StringIO()
+            pstats.Stats(cpu, stream=text).sort_stats("cumulative").print_stats(40)
+            cpu_text, files = text.getvalue(), [".cpu.prof"]
+        else:
+            with open(base + ".cpu.folded", "w", encoding="utf-8") as f:
+                f.write(cpu.folded())
+            cpu_text, files = cpu.summary(), [".cpu.folded"]
+        with open(base + ".cpu.txt", "w", encoding="utf-8") as f:
+            f.write(cpu_text)
+        with open(base + ".mem.txt", "w", encoding="utf-8") as f:
+            f.write(memory_text)
+        info["files"] = [info["profile_id"] + suffix for suffix in files + [".cpu.txt", ".mem.txt", ".json"]]
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        print(f"Profile {info['profile_id']}: {info['seconds']} s, peak {info['memory_mb']['peak']} MB")
+
+    def profiles(self):
+        """Metadaten aller Profile (neueste zuerst)."""
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                        result.append(json.load(f))
+                except (OSError, json.JSONDecodeError):
+                    continue
+        return sorted(result, key=lambda p: p["profile_id"], reverse=True)
+
+    def _prune(self):
+        # Älteste Profile löschen, bis Anzahl und Gesamtgröße eingehalten sind
+        profiles = self.profiles()
+        sizes = []
+        for profile in profiles:
+            paths = [os.path.join(self.directory, name) for name in profile.get("files", [])]
+            sizes.append((profile, paths, sum(os.path.getsize(p) for p in paths if os.path.exists(p))))
+        total = sum(size for _, _, size in sizes)
+        while sizes and (len(sizes) > self.max_profiles or total > self.max_bytes):
+            profile, paths, size = sizes.pop()
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+
+    def path(self, filename):
+        """Pfad einer Profildatei oder None (nur Dateien aus den Metadaten, kein Verlassen des Verzeichnisses)."""
+        if any(filename in profile.get("files", []) for profile in self.profiles()):
+            path = os.path.join(self.directory, filename)
+            if os.path.exists(path):
+                return os.path.abspath(path)
+        return None
+
+
+def _safe(name):
+    return "".join(c if c.isalnum() or c in "-_" else "-" for c in (name or "request"))[:40]
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """Prozessweiter Profiler."""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = RequestProfiler()
+        return _profiler
+
+
+def profiled(view):
+    """
+    Decorator für Flask-Routen: profiliert die Anfrage, wenn sie vorgemerkt ist oder mit Admin-Token den
+    Header "X-DPA-Profile: 1" trägt; die Profil-ID steht dann im Antwort-Header X-DPA-Profile-Id.
+    """
+    from flask import make_response, request
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        profiler = get_profiler()
+        forced = request.headers.get("X-DPA-Profile", "").lower() in ("1", "true", "yes") and admin_authorized(request)
+        mode = profiler.claim(request.endpoint, forced) if os.getenv("DPA_ADMIN_TOKEN") else None
+        if mode is None:
+            return view(*args, **kwargs)
+        with profiler.profile(request.endpoint, mode) as info:
+            response = make_response(view(*args, **kwargs))
+        if info is not None:
+            response.headers["X-DPA-Profile-Id"] = info["profile_id"]
+        return response
+
+    return wrapper
+
+
+def register_profiling(flask_app):
+    """Registriert die Admin-Routen /admin/profiling und /admin/profiles (einmal je Flask-App)."""
+    from flask import Blueprint, jsonify, request, send_file
+
+    if "profiling" in flask_app.blueprints:
+        return
+    bp = Blueprint("profiling", __name__)
+
+    @bp.before_request
+    def require_admin():
+        if not admin_authorized(request):
+            return jsonify({"success": False, "message": "Nicht berechtigt."}), 403
+
+    @bp.route("/admin/profiling", methods=["GET", "POST"])
+    def profiling_status():
+        if request.method == "POST":
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                # JSON: endpoints nur als Liste (eine Zeichenkette würde in Zeichen zerlegt)
+                endpoints = data.get("endpoints")
+                if endpoints is not None and not isinstance(endpoints, list):
+                    return jsonify({"success": False, "message": "endpoints muss eine Liste sein."}), 400
+            else:
+                # Formular bzw. Query-String: endpoints=a&endpoints=b
+                data = request.values
+                endpoints = data.getlist("endpoints")
+            try:
+                get_profiler().arm(int(data.get("count", 1)), endpoints, data.get("mode"))
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+        return jsonify(dict(get_profiler().status(), success=True))
+
+    @bp.route("/admin/profiles", methods=["GET"])
+    def list_profiles():
+        return jsonify({"success": True, "profiles": get_profiler().profiles()})
+
+    @bp.route("/admin/profiles/<filename>", methods=["GET"])
+    def download_profile(filename):
+        path = get_profiler().path(filename)
+        if path is None:
+            return jsonify({"success": False, "message": "Profil nicht gefunden."}), 404
+        return send_file(path, as_attachment=True, download_name=filename)
+
+    flask_app.register_blueprint(bp)
+
+
+def benchmark_ingest(filepath, dimension=1536, batch_size=64):
+    """
+    Misst Zeit und Speicher (tracemalloc) je Phase der Ingestion einer PDF: Laden, semantisches Chunking,
+    Einbetten und Schreiben (checkpointed_ingest) sowie Regelindex. AI Core und HANA werden durch
+    FakeEmbeddings und FakeHanaConnection ersetzt, damit die Messung reproduzierbar ist.
+
+    Returns:
+        dict: {"file", "pages", "chunks", "phases": [{"phase", "seconds", "peak_mb", "retained_mb"}],
+               "peak_mb", "top_allocations"}
+    """
+    import tempfile
+    from types import SimpleNamespace
+    from .dpa_checkpoint import checkpointed_ingest
+    from .dpa_fakes import FakeEmbeddings, FakeHanaConnection
+    from .dpa_modulA import load_pdf, semantic_chunking
+    from .dpa_rule_index import extract_rule_rows
+
+    embeddings = FakeEmbeddings(dimension=dimension)
+    connection = FakeHanaConnection()
+    connection.create_vector_table("BENCH")
+    store = SimpleNamespace(connection=connection, table_name="BENCH")
+    result = {"file": filepath, "dimension": dimension, "phases": []}
+    mb = 1024 * 1024
+    state = {}
+
+    def phase(name, fn):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        value = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        result["phases"].append({"phase": name, "seconds": round(time.perf_counter() - start, 3),
+                                 "peak_mb": round((peak - before) / mb, 2),
+                                 "retained_mb": round((current - before) / mb, 2)})
+        return value
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        previous = os.environ.get("DPA_CHECKPOINT_DIR")
+        os.environ["DPA_CHECKPOINT_DIR"] = checkpoint_dir
+        # Parser vorab importieren: Importe zählen sonst zur Phase load_pdf
+        import pypdf  # noqa: F401
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            docs = phase("load_pdf", lambda: load_pdf(filepath))
+            state["chunks"] = phase("semantic_chunking", lambda: semantic_chunking(docs, embeddings))
+            ingest = phase("embed_and_write", lambda: checkpointed_ingest(
+                store, embeddings, filepath, docs, lambda _docs, _embeddings: state["chunks"], batch_size=batch_size))
+            phase("rule_index", lambda: extract_rule_rows(docs, source=os.path.basename(filepath)))
+            snapshot = tracemalloc.take_snapshot()
+            current = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+            if previous is None:
+                os.environ.pop("DPA_CHECKPOINT_DIR", None)
+            else:
+                os.environ["DPA_CHECKPOINT_DIR"] = previous
+    result.update(pages=len(docs), chunks=ingest["chunks"], rows_written=ingest["rows_written"],
+                  peak_mb=max(p["peak_mb"] for p in result["phases"]), retained_mb=round((current - baseline) / mb, 2))
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    result["top_allocations"] = [
+        {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "kib": round(stat.size / 1024, 1),
+         "blocks": stat.count}
+        for stat in snapshot.statistics("lineno")[:15]
+    ]
+    return result
+
+
+def main(argv=None):
+    """Kommandozeile des Speicher-Benchmarks; gibt je Phase eine Zeile aus."""
+    parser = argparse.ArgumentParser(description="Speicher- und Zeitprofil der Ingestion einer PDF (ohne AI Core/HANA)")
+    parser.add_argument("pdf", nargs="?", default=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "uploads",
+        "Kontierungshandbuch_KP_angepasst_V01_20250403.pdf"))
+    parser.add_argument("--dimension", type=int, default=1536, help="Dimension der Fake-Embeddings")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", help="Ergebnis zusätzlich als JSON speichern (Vergleich zwischen Versionen)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.pdf):
+        print(f"Datei nicht gefunden: {args.pdf}", file=sys.stderr)
+        return 2
+    result = benchmark_ingest(args.pdf, dimension=args.dimension, batch_size=args.batch_size)
+    print(f"{os.path.basename(args.pdf)}: {result['pages']} Seiten, {result['chunks']} Chunks, "
+          f"Dimension {result['dimension']}")
+    for p in result["phases"]:
+        print(f"{p['phase']:18s} {p['seconds']:8.3f} s  Spitze {p['peak_mb']:8.2f} MB  bleibt {p['retained_mb']:8.2f} MB")
+    print(f"Gesamt: Spitze {result['peak_mb']} MB, bleibt {result['retained_mb']} MB")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# dpa_quantize.py
+# Quantisierte Vektoren für das lokale Retrieval (VectorSnapshot) mit exakter Nachbewertung.
+#
+# Bei 1536 Dimensionen belegt ein float32-Vektor 6 KB; mit mehreren Handbüchern je Mandant dominiert
+# das den Speicher. QuantizedIndex hält nur eine quantisierte Kopie im Arbeitsspeicher:
+#
+#   int8     je Vektor symmetrisch skaliert (Faktor max|v| / 127), 1 Byte je Dimension + 4 Byte Skala
+#   float16  2 Byte je Dimension
+#
+# Die Suche bewertet alle Zeilen näherungsweise, holt die besten k * overfetch Kandidaten und
+# bewertet nur diese exakt mit den float-Vektoren nach (aus dem per mmap geöffneten Snapshot, also
+# ohne sie vollständig zu laden).
+#
+# Konfiguration: DPA_SNAPSHOT_QUANTIZATION ("", "int8", "float16"), DPA_RESCORE_OVERFETCH (Standard 4)
+#
+# Benchmark (aus BE_AI_DPA_APP), Recall@10 und Speicher gegenüber float32:
+#   python -m dpa_modules.dpa_quantize snapshots/handbuch --queries 200
+#   python -m dpa_modules.dpa_quantize --synthetic 50000 --dimension 1536
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+MODES = ("int8", "float16")
+
+
+def quantize_int8(vectors, block_rows=4096):
+    """
+    Quantisiert Vektoren zeilenweise symmetrisch auf int8.
+
+    Returns:
+        tuple: (int8-Matrix, Skalen float32 je Zeile)
+    """
+    rows = len(vectors)
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    scales = np.empty(rows, dtype=np.float32)
+    for start in range(0, rows, block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        scale = np.abs(block).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        codes[start:start + block_rows] = np.clip(np.rint(block / scale[:, None]), -127, 127)
+        scales[start:start + block_rows] = scale
+    return codes, scales
+
+
+class QuantizedIndex:
+    """
+    Quantisierte Kopie einer Vektormatrix mit Kandidatensuche und exakter Nachbewertung.
+    """
+
+    def __init__(self, vectors, norms=None, mode="int8", overfetch=None, block_rows=4096):
+        """
+        Args:
+            vectors (np.ndarray | np.memmap): Ursprüngliche Vektoren (Zeilen x Dimension), bleiben
+                für die Nachbewertung referenziert (bei mmap nicht im Arbeitsspeicher).
+            norms (np.ndarray, optional): L2-Norm je Zeile (Standard: aus den Vektoren berechnet).
+            mode (str): "int8" oder "float16".
+            overfetch (int, optional): Faktor für die Kandidatenmenge (Standard: DPA_RESCORE_OVERFETCH).
+        """
+        if mode not in MODES:
+            raise ValueError(f"Nicht unterstützte Quantisierung: {mode}")
+        self.vectors = vectors
+        self.mode = mode
+        self.overfetch = int(os.getenv("DPA_RESCORE_OVERFETCH", "4")) if overfetch is None else overfetch
+        self.block_rows = block_rows
+        if norms is None:
+            norms = np.concatenate([np.linalg.norm(np.asarray(vectors[i:i + block_rows], dtype=np.float32), axis=1)
+                                    for i in range(0, len(vectors), block_rows)] or [np.zeros(0, np.float32)])
+        self.norms = np.where(norms > 0, norms, 1.0).astype(np.float32)
+        if mode == "int8":
+            self.codes, self.scales = quantize_int8(vectors, block_rows)
+        else:
+            self.codes = np.empty(vectors.shape, dtype=np.float16)
+            for start in range(0, len(vectors), block_rows):
+                self.codes[start:start + block_rows] = vectors[start:start + block_rows]
+            self.scales = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        """Belegter Arbeitsspeicher der quantisierten Kopie (Bytes)."""
+        return self.codes.nbytes + self.norms.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def approximate_scores(self, query):
+        """Näherungsweise Kosinus-Ähnlichkeit zu allen Zeilen."""
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self.block_rows):
+            block = self.codes[start:start + self.block_rows].astype(np.float32)
+            scores[start:start + self.block_rows] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores / (self.norms * (np.linalg.norm(query) or 1.0))
+
+    def search(self, query, k, mask=None, rescore=True):
+        """
+        Liefert die k ähnlichsten Zeilen.
+
+        Args:
+            query (list | np.ndarray): Anfragevektor.
+            k (int): Anzahl der Treffer.
+            mask (np.ndarray, optional): Bool je Zeile; False schließt die Zeile aus.
+            rescore (bool): Kandidaten exakt nachbewerten (False nur für Vergleiche im Benchmark).
+
+        Returns:
+            tuple: (Indizes, Ähnlichkeiten) absteigend sortiert.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        scores = self.approximate_scores(query)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        available = len(self) if mask is None else int(mask.sum())
+        k = min(k, available)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        n = min(available, k * max(1, self.overfetch) if rescore else k)
+        candidates = np.argpartition(-scores, n - 1)[:n]
+        if rescore:
+            # Exakte Ähnlichkeit nur für die Kandidaten (sortierte Indizes für sequentielle mmap-Zugriffe)
+            candidates = np.sort(candidates)
+            exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+            scores = np.full(len(self), -np.inf, dtype=np.float32)
+            scores[candidates] = exact / (self.norms[candidates] * (np.linalg.norm(query) or 1.0))
+        top = candidates[np.argsort(-scores[candidates])][:k]
+        return top, scores[top]
+
+
+def exact_search(vectors, norms, query, k):
+    """Exakte Suche über alle float-Vektoren (Referenz im Benchmark)."""
+    query = np.asarray(query, dtype=np.float32)
+    scores = (np.asarray(vectors, dtype=np.float32) @ query) / (np.where(norms > 0, norms, 1.0) * np.linalg.norm(query))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def benchmark(vectors, queries, k=10, overfetch=4):
+    """
+    Vergleicht int8 und float16 (mit und ohne Nachbewertung) mit der exakten float32-Suche.
+
+    Returns:
+        list: Je Variante {"mode", "rescore", "recall_at_k", "memory_mb", "memory_ratio", "query_ms"}
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    baseline_bytes = vectors.nbytes + norms.nbytes
+    start = time.perf_counter()
+    truth = [set(exact_search(vectors, norms, q, k).tolist()) for q in queries]
+    results = [{"mode": "float32", "rescore": False, "recall_at_k": 1.0,
+                "memory_mb": round(baseline_bytes / 2 ** 20, 2), "memory_ratio": 1.0,
+                "query_ms": round((time.perf_counter() - start) * 1000 / len(queries), 3)}]
+    for mode in MODES:
+        index = QuantizedIndex(vectors, norms, mode=mode, overfetch=overfetch)
+        for rescore in (False, True):
+            start = time.perf_counter()
+            found = [set(index.search(q, k, rescore=rescore)[0].tolist()) for q in queries]
+            seconds = time.perf_counter() - start
+            recall = sum(len(f & t) for f, t in zip(found, truth)) / sum(len(t) for t in truth)
+            results.append({"mode": mode, "rescore": rescore, "recall_at_k": round(recall, 4),
+                            "memory_mb": round(index.nbytes / 2 ** 20, 2),
+                            "memory_ratio": round(index.nbytes / baseline_bytes, 3),
+                            "query_ms": round(seconds * 1000 / len(queries), 3)})
+    return results
+
+
+def synthetic_vectors(rows, dimension, seed=0):
+    """Reproduzierbare, geclusterte Testvektoren (ähnlich Handbuch-Chunks zu wenigen Themen)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, rows // 50), dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), rows)] + 0.6 * rng.normal(size=(rows, dimension)).astype(np.float32)
+    return vectors.astype(np.float32)
+
+
+def main(argv=None):
+    """Kommandozeile des Benchmarks; gibt je Variante eine Zeile aus."""
+    parser = argparse.ArgumentParser(description="Recall@k und Speicher quantisierter Vektoren gegenüber float32")
+    parser.add_argument("snapshot", nargs="?", help="Snapshot-Verzeichnis (dpa_snapshot)")
+    parser.add_argument("--synthetic", type=int, help="Statt eines Snapshots N synthetische Vektoren verwenden")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=int(os.getenv("DPA_RESCORE_OVERFETCH", "4")))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON in diese Datei schreiben")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dimension, args.seed)
+    elif args.snapshot:
+        from .dpa_snapshot import VectorSnapshot
+        vectors = np.asarray(VectorSnapshot(args.snapshot).vectors, dtype=np.float32)
+    else:
+        parser.error("Snapshot-Verzeichnis oder --synthetic angeben")
+    # Anfragen: gestörte Kopien zufälliger Zeilen (wie Geschäftsfälle nahe an einem Handbuch-Abschnitt)
+    rng = np.random.default_rng(args.seed + 1)
+    rows = rng.integers(0, len(vectors), args.queries)
+    noise = rng.normal(size=(args.queries, vectors.shape[1])).astype(np.float32)
+    queries = vectors[rows] + 0.5 * noise * (np.linalg.norm(vectors[rows], axis=1, keepdims=True) / np.sqrt(vectors.shape[1]))
+
+    k = min(args.k, len(vectors))
+    results = benchmark(vectors, queries, k=k, overfetch=args.overfetch)
+    print(f"{len(vectors)} Vektoren x {vectors.shape[1]} Dimensionen, {args.queries} Anfragen, k={k}, overfetch={args.overfetch}")
+    for r in results:
+        print(f"{r['mode']:8s} {'Nachbewertung' if r['rescore'] else '-':14s} Recall@{k} {r['recall_at_k']:.4f}  "
+              f"{r['memory_mb']:9.2f} MB ({r['memory_ratio']:.3f})  {r['query_ms']:.3f} ms/Anfrage")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+# dpa_ratelimit.py
+# Gemeinsamer Token-Bucket-Ratenbegrenzer für Embedding- und LLM-Aufrufe an SAP AI Core.
+#
+# Modul A (Ingestion) und Modul B (interaktive Abfragen) nutzen dasselbe Embedding-Deployment.
+# Beide begrenzen ihre Aufrufe über denselben Zustand, standardmäßig in einer Datei mit
+# Dateisperre, damit die Grenzen auch zwischen den beiden Prozessen gelten. Wartet ein
+# interaktiver Aufruf (Modul B), erhalten Massenaufrufe (Modul A) bis zu seiner Freigabe
+# keine Kapazität; große Ingestion-Batches werden dafür in kleine Teil-Batches zerlegt.
+#
+# Konfiguration (Umgebungsvariablen bzw. ~/.aicore/config.json):
+#   DPA_EMBEDDING_RPS / DPA_EMBEDDING_TPM   Anfragen je Sekunde / Tokens je Minute Embedding (Standard 20 / 500000)
+#   DPA_LLM_RPS / DPA_LLM_TPM               Anfragen je Sekunde / Tokens je Minute LLM (Standard 5 / 100000)
+#                                           0 schaltet die jeweilige Grenze ab.
+#   DPA_RATE_LIMIT_DIR                      Verzeichnis für den prozessübergreifenden Zustand
+#                                           (Standard: <tmp>/dpa_ratelimit; "" = nur innerhalb des Prozesses)
+#   DPA_RATE_LIMIT_BATCH                    Texte je Embedding-Teil-Batch (Standard 16)
+
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from .dpa_resilience import DeadlineExceeded
+
+try:
+    import fcntl
+except ImportError:  # Windows: nur prozessinterne Begrenzung
+    fcntl = None
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+# Priorität des aktuellen Ablaufs (z.B. Batch-Verarbeitung in Modul B); überschreibt die Priorität
+# der RateLimitedEmbeddings, siehe priority_scope
+_current_priority = contextvars.ContextVar("dpa_rate_priority", default=None)
+
+# Wartezeit, für die ein wartender interaktiver Aufruf Massenaufrufe zurückhält
+INTERACTIVE_HOLD = 0.25
+
+
+def current_priority(default=PRIORITY_INTERACTIVE):
+    """Priorität des aktuellen Ablaufs oder default."""
+    priority = _current_priority.get()
+    return default if priority is None else priority
+
+
+class priority_scope:
+    """
+    Setzt die Priorität für alle Embedding- und LLM-Aufrufe innerhalb des with-Blocks, z.B.
+
+        with priority_scope(PRIORITY_BULK):
+            run_posting_pipeline(...)
+    """
+
+    def __init__(self, priority):
+        self.priority = priority
+
+    def __enter__(self):
+        self._token = _current_priority.set(self.priority)
+        return self
+
+    def __exit__(self, *exc):
+        _current_priority.reset(self._token)
+
+
+def estimate_tokens(texts):
+    """Grobe Token-Schätzung (ca. 4 Zeichen je Token), ausreichend für die Begrenzung je Minute."""
+    if isinstance(texts, str):
+        texts = [texts]
+    return sum(len(text or "") for text in texts) // 4 + len(texts)
+
+
+def _refill(state, now, requests_per_second, tokens_per_minute):
+    elapsed = max(0.0, now - state["updated"])
+    state["requests"] = min(max(requests_per_second, 1), state["requests"] + elapsed * requests_per_second)
+    state["tokens"] = min(tokens_per_minute, state["tokens"] + elapsed * tokens_per_minute / 60)
+    state["updated"] = now
+
+
+def _try_acquire(state, now, requests, tokens, priority, requests_per_second, tokens_per_minute):
+    """
+    Entnimmt Kapazität aus dem Zustand, falls möglich.
+
+    Returns:
+        float: 0 bei Erfolg, sonst empfohlene Wartezeit in Sekunden.
+    """
+    if "updated" not in state:
+        state.update({"requests": max(requests_per_second, 1), "tokens": tokens_per_minute,
+                      "updated": now, "interactive_until": 0.0})
+    _refill(state, now, requests_per_second, tokens_per_minute)
+    if priority > PRIORITY_INTERACTIVE and now < state["interactive_until"]:
+        return state["interactive_until"] - now
+    wait = 0.0
+    if requests_per_second and state["requests"] < requests:
+        wait = max(wait, (requests - state["requests"]) / requests_per_second)
+    if tokens_per_minute and state["tokens"] < min(tokens, tokens_per_minute):
+        wait = max(wait, (min(tokens, tokens_per_minute) - state["tokens"]) * 60 / tokens_per_minute)
+    if wait > 0:
+        if priority == PRIORITY_INTERACTIVE:
+            state["interactive_until"] = max(state["interactive_until"], now + wait + INTERACTIVE_HOLD)
+        return wait
+    if requests_per_second:
+        state["requests"] -= requests
+    if tokens_per_minute:
+        state["tokens"] -= min(tokens, tokens_per_minute)
+    return 0.0
+
+
+class LocalBackend:
+    """Zustand im Speicher des Prozesses."""
+
+    def __init__(self):
+        self.state = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, *args):
+        with self._lock:
+            return _try_acquire(self.state, time.time(), *args)
+
+
+class FileBackend:
+    """Zustand in einer JSON-Datei mit exklusiver Dateisperre (prozessübergreifend)."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def try_acquire(self, *args):
+        with self._lock, open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except json.JSONDecodeError:
+                    state = {}
+                wait = _try_acquire(state, time.time(), *args)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """
+    Token-Bucket mit zwei Grenzen (Anfragen je Sekunde, Tokens je Minute) und Prioritätsklassen.
+    """
+
+    def __init__(self, name, requests_per_second=0.0, tokens_per_minute=0, backend=None):
+        self.name = name
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.backend = backend or LocalBackend()
+        self.waited_seconds = {PRIORITY_INTERACTIVE: 0.0, PRIORITY_BULK: 0.0}
+
+    def acquire(self, requests=1, tokens=0, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """
+        Wartet, bis die Kapazität für den Aufruf verfügbar ist.
+
+        Args:
+            requests (int): Anzahl Anfragen.
+            tokens (int): Geschätzte Tokens des Aufrufs.
+            priority (int): PRIORITY_INTERACTIVE (Modul B) oder PRIORITY_BULK (Modul A).
+            deadline (Deadline, optional): Deadline der Anfrage (dpa_resilience); die Wartezeit zählt mit.
+
+        Returns:
+            float: Wartezeit in Sekunden.
+
+        Raises:
+            DeadlineExceeded: Wenn die Kapazität nicht vor Ablauf der Deadline frei wird.
+        """
+        if not self.requests_per_second and not self.tokens_per_minute:
+            return 0.0
+        start = time.monotonic()
+        while True:
+            wait = self.backend.try_acquire(requests, tokens, priority, self.requests_per_second, self.tokens_per_minute)
+            if wait <= 0:
+                break
+            if deadline is not None and deadline.remaining() <= wait:
+                self.waited_seconds[priority] = self.waited_seconds.get(priority, 0.0) + time.monotonic() - start
+                raise DeadlineExceeded(f"Deadline der Anfrage läuft vor freier Kapazität ab (Ratenbegrenzer {self.name})")
+            time.sleep(min(wait, 1.0))
+        waited = time.monotonic() - start
+        self.waited_seconds[priority] = self.waited_seconds.get(priority, 0.0) + waited
+        return waited
+
+    def status(self):
+        return {
+            "requests_per_second": self.requests_per_second,
+            "tokens_per_minute": self.tokens_per_minute,
+            "waited_seconds": {("interactive" if p == PRIORITY_INTERACTIVE else "bulk"): round(s, 2)
+                               for p, s in self.waited_seconds.items()},
+        }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name):
+    """
+    Liefert den prozessweit geteilten Ratenbegrenzer "embedding" oder "llm".
+
+    Returns:
+        RateLimiter: Begrenzer mit den Grenzen aus DPA_<NAME>_RPS / DPA_<NAME>_TPM.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            defaults = {"embedding": ("20", "500000"), "llm": ("5", "100000")}.get(name, ("0", "0"))
+            rps = float(os.getenv(f"DPA_{name.upper()}_RPS", defaults[0]))
+            tpm = int(os.getenv(f"DPA_{name.upper()}_TPM", defaults[1]))
+            directory = os.getenv("DPA_RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "dpa_ratelimit"))
+            backend = FileBackend(os.path.join(directory, f"{name}.json")) if directory and fcntl else LocalBackend()
+            _limiters[name] = RateLimiter(name, rps, tpm, backend)
+        return _limiters[name]
+
+
+def acquire_llm(question, documents=(), priority=None, deadline=None):
+    """
+    Begrenzt einen LLM-Aufruf anhand der geschätzten Prompt-Tokens (Frage und Kontext-Dokumente);
+    mit deadline wartet er höchstens bis zu deren Ablauf (DeadlineExceeded).
+    """
+    texts = [question] + [doc.page_content for doc in documents]
+    return get_rate_limiter("llm").acquire(1, estimate_tokens(texts), current_priority() if priority is None else priority,
+                                           deadline)
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Embedding-Modell hinter dem gemeinsamen Ratenbegrenzer.
+
+    Große Listen werden in Teil-Batches zerlegt, damit interaktive Aufrufe zwischen zwei
+    Teil-Batches einer laufenden Ingestion Vorrang erhalten.
+    """
+
+    def __init__(self, embeddings, priority=PRIORITY_INTERACTIVE, limiter=None, batch_size=None):
+        self.embeddings = embeddings
+        self.priority = priority
+        self.limiter = limiter or get_rate_limiter("embedding")
+        self.batch_size = batch_size or int(os.getenv("DPA_RATE_LIMIT_BATCH", "16"))
+
+    def __getattr__(self, name):
+        # Weitere Attribute (z.B. Modellname) vom ursprünglichen Modell
+        embeddings = self.__dict__.get("embeddings")
+        if embeddings is None:
+            raise AttributeError(name)
+        return getattr(embeddings, name)
+
+    def embed_documents(self, texts):
+        from .dpa_ledger import record_embedding_usage
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            self.limiter.acquire(1, estimate_tokens(batch), current_priority(self.priority))
+            start = time.perf_counter()
+            vectors.extend(self.embeddings.embed_documents(batch))
+            record_embedding_usage(batch, time.perf_counter() - start)
+        return vectors
+
+    def embed_query(self, text):
+        from .dpa_ledger import record_embedding_usage
+        self.limiter.acquire(1, estimate_tokens(text), current_priority(self.priority))
+        start = time.perf_counter()
+        vector = self.embeddings.embed_query(text)
+        record_embedding_usage(text, time.perf_counter() - start)
+        return vector
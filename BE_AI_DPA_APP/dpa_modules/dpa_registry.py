@@ -0,0 +1,192 @@
+# dpa_registry.py
+# Persistentes Dokumentenregister für Modul A (SQLite).
+#
+# Bisher ermittelt app_modulA die Dateien bei jeder Anfrage mit os.listdir(UPLOAD_FOLDER) und hält
+# keine Informationen darüber, welche Datei wann, mit welchem Modell und mit wie vielen Chunks
+# geladen wurde. Das Register speichert je Datei:
+#
+#   documents       Dateiname, SHA-256, Größe, Seiten, Chunks, Upload- und Ingestion-Zeitpunkt,
+#                   Dauer der Ingestion, Embedding-Modell, Indexversion (Vektortabelle, Chunking)
+#   index_contents  welche Dateiinhalte (Hash, Modell, Chunking) in welcher Vektortabelle stehen
+#
+# Die Dateiliste wird im Prozess zwischengespeichert und nur neu gelesen, wenn sich der Versionszähler
+# in der Datenbank geändert hat (jede Änderung erhöht ihn, auch durch andere Prozesse wie dpa_ingest).
+#
+# Konfiguration: DPA_REGISTRY_FILE (Standard document_registry.sqlite im App-Verzeichnis BE_AI_DPA_APP,
+#                unabhängig vom Arbeitsverzeichnis)
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .dpa_checkpoint import CHUNKING_VERSION, file_sha256
+
+# Standardpfad neben app_modulA.py (wie BATCH_FOLDER in app_modulB)
+DEFAULT_REGISTRY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     "document_registry.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    filename TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER,
+    pages INTEGER,
+    chunks INTEGER,
+    rules INTEGER,
+    uploaded_at TEXT,
+    ingested_at TEXT,
+    ingest_seconds REAL,
+    model TEXT,
+    vector_table TEXT,
+    chunking TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_sha256 ON documents (sha256);
+CREATE TABLE IF NOT EXISTS index_contents (
+    vector_table TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    model TEXT NOT NULL,
+    chunking TEXT NOT NULL,
+    ingested_at TEXT,
+    PRIMARY KEY (vector_table, sha256, model, chunking)
+);
+CREATE TABLE IF NOT EXISTS registry_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL);
+INSERT OR IGNORE INTO registry_version VALUES (1, 0);
+"""
+
+_COLUMNS = ("filename", "sha256", "size", "pages", "chunks", "rules", "uploaded_at", "ingested_at",
+            "ingest_seconds", "model", "vector_table", "chunking")
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class DocumentRegistry:
+    """
+    Register der hochgeladenen und geladenen Dokumente.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._cache_lock = threading.Lock()
+        self._cache = None
+        self._cache_version = None
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        # Eine Verbindung je Thread; sqlite3-Verbindungen sind nicht threadsicher
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _version(self):
+        return self._connection().execute("SELECT version FROM registry_version WHERE id = 1").fetchone()[0]
+
+    @staticmethod
+    def _bump(conn):
+        conn.execute("UPDATE registry_version SET version = version + 1 WHERE id = 1")
+
+    def record_upload(self, filename, sha256, size, pages=None):
+        """
+        Vermerkt einen Upload. Bei geändertem Inhalt werden die Angaben zur Ingestion zurückgesetzt.
+        """
+        with self._connection() as conn:
+            row = conn.execute("SELECT sha256 FROM documents WHERE filename = ?", (filename,)).fetchone()
+            if row is not None and row["sha256"] == sha256:
+                conn.execute("UPDATE documents SET size = ?, pages = COALESCE(?, pages), uploaded_at = ? WHERE filename = ?",
+                             (size, pages, _now(), filename))
+            else:
+                conn.execute("INSERT OR REPLACE INTO documents (filename, sha256, size, pages, uploaded_at) "
+                             "VALUES (?, ?, ?, ?, ?)", (filename, sha256, size, pages, _now()))
+            self._bump(conn)
+
+    def record_ingest(self, filename, sha256, vector_table, chunks=None, rules=None, seconds=None,
+                      pages=None, model=None, replace_all=True):
+        """
+        Vermerkt eine abgeschlossene Ingestion.
+
+        Args:
+            replace_all (bool): True, wenn die Vektortabelle danach nur diese Datei enthält.
+        """
+        model = model or str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING"))
+        now = _now()
+        with self._connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO documents (filename, sha256, uploaded_at) VALUES (?, ?, ?)",
+                         (filename, sha256, now))
+            conn.execute(
+                "UPDATE documents SET sha256 = ?, pages = COALESCE(?, pages), chunks = ?, rules = ?, ingested_at = ?, "
+                "ingest_seconds = ?, model = ?, vector_table = ?, chunking = ? WHERE filename = ?",
+                (sha256, pages, chunks, rules, now, seconds, model, vector_table, CHUNKING_VERSION, filename),
+            )
+            if replace_all:
+                conn.execute("DELETE FROM index_contents WHERE vector_table = ?", (vector_table,))
+            conn.execute("INSERT OR REPLACE INTO index_contents VALUES (?, ?, ?, ?, ?)",
+                         (vector_table, sha256, model, CHUNKING_VERSION, now))
+            self._bump(conn)
+
+    def is_ingested(self, vector_table, sha256, model=None):
+        """True, wenn der Dateiinhalt mit diesem Modell und Chunking bereits in der Vektortabelle steht."""
+        model = model or str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING"))
+        row = self._connection().execute(
+            "SELECT 1 FROM index_contents WHERE vector_table = ? AND sha256 = ? AND model = ? AND chunking = ?",
+            (vector_table, sha256, model, CHUNKING_VERSION),
+        ).fetchone()
+        return row is not None
+
+    def documents(self):
+        """
+        Alle Dokumente in Upload-Reihenfolge (zwischengespeichert, neu gelesen nur nach Änderungen).
+
+        Returns:
+            list: dicts mit den Spalten von documents.
+        """
+        version = self._version()
+        with self._cache_lock:
+            if self._cache is None or self._cache_version != version:
+                rows = self._connection().execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM documents ORDER BY uploaded_at, rowid"
+                ).fetchall()
+                self._cache = [dict(row) for row in rows]
+                self._cache_version = version
+            return self._cache
+
+    def get(self, filename):
+        """Eintrag zu einem Dateinamen oder None."""
+        return next((doc for doc in self.documents() if doc["filename"] == filename), None)
+
+    def last_uploaded(self):
+        """Zuletzt hochgeladenes Dokument oder None."""
+        documents = self.documents()
+        return documents[-1] if documents else None
+
+    def sync_folder(self, folder):
+        """
+        Nimmt PDF-Dateien im Upload-Ordner auf, die noch nicht im Register stehen (einmalig beim Start).
+
+        Returns:
+            int: Anzahl neu aufgenommener Dateien.
+        """
+        known = {doc["filename"] for doc in self.documents()}
+        neu = 0
+        if not os.path.isdir(folder):
+            return neu
+        for name in sorted(os.listdir(folder), key=lambda n: os.path.getmtime(os.path.join(folder, n))):
+            path = os.path.join(folder, name)
+            if name in known or not name.lower().endswith(".pdf") or not os.path.isfile(path):
+                continue
+            self.record_upload(name, file_sha256(path), os.path.getsize(path))
+            neu += 1
+        return neu
+
+
+def open_registry(path=None):
+    """Öffnet das konfigurierte Dokumentenregister (DPA_REGISTRY_FILE)."""
+    return DocumentRegistry(path or os.getenv("DPA_REGISTRY_FILE", DEFAULT_REGISTRY_FILE))
@@ -0,0 +1,482 @@
+# dpa_resilience.py
+# Resilienz-Schicht für die Aufrufe von AI Core (LLM, Embedding) und HANA (Retrieval) in Modul B:
+# - Deadline je Anfrage, die über alle Stufen weitergereicht wird
+# - Timeout je Aufruf und Wiederholung mit Backoff und Zufallsstreuung (Jitter)
+# - optional gestaffelte Zweitanfrage an das LLM ("hedged request"), wenn die Antwort länger
+#   als das 95%-Perzentil der bisherigen Latenzen dauert
+# - Circuit Breaker je Dienst: nach wiederholten Fehlern schlagen Aufrufe sofort fehl, statt
+#   bei einem AI-Core-Ausfall jede Anfrage hängen zu lassen
+# - Bulkhead je Dienst: eigener, begrenzter Thread-Pool. Abgelaufene Aufrufe lassen sich nicht abbrechen
+#   und belegen ihren Platz bis zum Ende; ein LLM-Ausfall blockiert so nicht Embedding und HANA.
+#   Die Timeouts werden zusätzlich an die Clients selbst weitergegeben (apply_client_timeout,
+#   communicationTimeout der HANA-Verbindung), damit hängende Aufrufe ihren Platz wieder freigeben.
+# - Token-Streams: Wiederholungen und Zweitanfragen laufen als eigene Versuche (AttemptStream); live
+#   weitergegeben werden nur die Tokens des führenden Versuchs, am Ende gelten die des erfolgreichen.
+#
+# Konfiguration (Umgebungsvariablen bzw. ~/.aicore/config.json):
+#   DPA_REQUEST_TIMEOUT      Deadline je Anfrage in Sekunden (Standard 90)
+#   DPA_LLM_TIMEOUT          Timeout je LLM-Aufruf (Standard 60)
+#   DPA_EMBEDDING_TIMEOUT    Timeout je Embedding-Aufruf (Standard 15)
+#   DPA_RETRIEVER_TIMEOUT    Timeout je HANA-Abfrage (Standard 15)
+#   DPA_LLM_WORKERS / DPA_EMBEDDING_WORKERS / DPA_RETRIEVER_WORKERS
+#                            Gleichzeitige Aufrufe je Dienst (Standard 8)
+#   DPA_RETRIES              Anzahl Wiederholungen (Standard 2)
+#   DPA_HEDGE_LLM            "true" aktiviert gestaffelte LLM-Zweitanfragen
+#   DPA_BREAKER_FAILURES     Fehler in Folge bis zum Öffnen des Circuit Breakers (Standard 5)
+#   DPA_BREAKER_RESET        Sekunden bis zum Probeaufruf nach dem Öffnen (Standard 30)
+
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class DeadlineExceeded(TimeoutError):
+    """Die Deadline der Anfrage bzw. das Timeout eines Aufrufs ist abgelaufen."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Der Circuit Breaker des Dienstes ist offen; der Aufruf wurde nicht ausgeführt."""
+
+
+# HTTP-Status vorübergehender Fehler (Timeout, Ratenbegrenzung, Überlastung) und Fehlerklassen der
+# Clients (openai, hdbcli), die keinen gemeinsamen Basistyp mit TimeoutError/ConnectionError haben
+TRANSIENT_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+                    "OperationalError"}
+
+
+def is_transient(error):
+    """
+    True für Fehler, die auf einen gestörten Dienst hindeuten (Timeout, Verbindung, 429/5xx) und daher
+    wiederholt und vom Circuit Breaker gezählt werden; Programm- und Eingabefehler (z.B. 400) nicht.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, FutureTimeoutError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+# Timeouts je Dienst in Sekunden (DPA_<DIENST>_TIMEOUT)
+DEFAULT_TIMEOUTS = {"llm": 60.0, "embedding": 15.0, "retriever": 15.0}
+
+
+def client_timeout(stage):
+    """Konfiguriertes Timeout eines Dienstes ("llm", "embedding", "retriever") in Sekunden."""
+    return float(os.getenv(f"DPA_{stage.upper()}_TIMEOUT", DEFAULT_TIMEOUTS[stage]))
+
+
+def apply_client_timeout(client, seconds):
+    """
+    Gibt ein Timeout an den HTTP-Client eines LangChain-Modells weiter (OpenAI-kompatible Modelle von
+    gen_ai_hub: timeout je Anfrage über model_kwargs). Hüllen wie RateLimitedEmbeddings oder
+    CachedEmbeddings werden über ihr Attribut "embeddings" durchlaufen.
+
+    Returns:
+        client (unverändert, für Verkettung).
+    """
+    inner = client
+    while "embeddings" in getattr(inner, "__dict__", {}):
+        inner = inner.__dict__["embeddings"]
+    if seconds and isinstance(getattr(inner, "model_kwargs", None), dict):
+        inner.model_kwargs = dict(inner.model_kwargs, timeout=seconds)
+    return client
+
+
+# Versuch, in dessen Thread ein Aufruf läuft: (AttemptStream, Nummer des Versuchs)
+_current_attempt = contextvars.ContextVar("dpa_attempt", default=None)
+
+
+class AttemptStream:
+    """
+    Schiedsrichter für Token-Streams über die Versuche (Wiederholungen, Zweitanfragen) eines Aufrufs.
+
+    Der erste Versuch, der ein Token liefert, wird live weitergegeben; Tokens anderer Versuche werden
+    gepuffert. Scheidet der führende Versuch aus (Fehler, Timeout, verlorene Zweitanfrage), wird der
+    Stream zurückgesetzt (sink.reset()) und der Puffer eines noch laufenden bzw. des erfolgreichen
+    Versuchs übernommen. Nach dem Erfolg eines Versuchs werden alle übrigen Tokens verworfen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sinks = {}
+        self._failed = set()
+        self._winner = None
+
+    def _state(self, sink):
+        return self._sinks.setdefault(id(sink), {"sink": sink, "owner": None, "buffers": {}})
+
+    @staticmethod
+    def _take_over(state, attempt):
+        state["owner"] = attempt
+        for token in state["buffers"].pop(attempt, []):
+            state["sink"].publish(token)
+
+    def emit(self, attempt, token, sink):
+        with self._lock:
+            state = self._state(sink)
+            if attempt in self._failed or (self._winner is not None and attempt != self._winner):
+                return
+            if state["owner"] is None:
+                self._take_over(state, attempt)
+            if state["owner"] == attempt:
+                sink.publish(token)
+            else:
+                state["buffers"].setdefault(attempt, []).append(token)
+
+    def fail(self, attempt):
+        with self._lock:
+            self._failed.add(attempt)
+            for state in self._sinks.values():
+                state["buffers"].pop(attempt, None)
+                if state["owner"] == attempt:
+                    state["sink"].reset()
+                    state["owner"] = None
+                    if state["buffers"]:
+                        self._take_over(state, next(iter(state["buffers"])))
+
+    def win(self, attempt):
+        with self._lock:
+            self._winner = attempt
+            for state in self._sinks.values():
+                if state["owner"] != attempt:
+                    if state["owner"] is not None:
+                        state["sink"].reset()
+                    self._take_over(state, attempt)
+                state["buffers"].clear()
+
+
+def emit_token(sink, token):
+    """
+    Gibt ein Stream-Token an sink (publish/reset, z.B. dpa_singleflight.Flight) weiter; innerhalb eines
+    Aufrufs über die Resilienz-Schicht nur für den führenden bzw. erfolgreichen Versuch.
+    """
+    attempt = _current_attempt.get()
+    if attempt is None:
+        sink.publish(token)
+    else:
+        attempt[0].emit(attempt[1], token, sink)
+
+
+class Deadline:
+    """
+    Zeitpunkt, bis zu dem eine Anfrage abgeschlossen sein muss.
+    """
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        """Verbleibende Zeit in Sekunden (mindestens 0)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self, stage=""):
+        """
+        Raises:
+            DeadlineExceeded: Wenn die Deadline abgelaufen ist.
+        """
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Deadline der Anfrage abgelaufen ({stage})")
+
+
+class CircuitBreaker:
+    """
+    Circuit Breaker mit den Zuständen "closed", "open" und "half_open".
+
+    Nach failure_threshold Fehlern in Folge öffnet er sich; nach reset_timeout Sekunden wird ein
+    einzelner Probeaufruf zugelassen, dessen Erfolg den Breaker wieder schließt.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Returns:
+            bool: True, wenn dieser Aufruf der Probeaufruf ist (danach record_success/record_failure
+                  oder release_probe aufrufen).
+
+        Raises:
+            CircuitOpenError: Wenn der Breaker offen ist (schneller Fehlschlag).
+        """
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"Dienst '{self.name}' ist vorübergehend nicht verfügbar (Circuit Breaker offen)")
+                self.state = "half_open"
+                return True
+            elif self.state == "half_open":
+                raise CircuitOpenError(f"Dienst '{self.name}' wird gerade geprüft (Circuit Breaker halb offen)")
+            return False
+
+    def release_probe(self):
+        """
+        Gibt einen Probeaufruf ohne Ergebnis frei (z.B. Eingabefehler, Abbruch): der Breaker bleibt
+        offen, der nächste Aufruf darf erneut prüfen.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Gleitendes Fenster der letzten Latenzen eines Dienstes."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p, min_samples=20):
+        """Perzentil p (0-100) oder None, solange weniger als min_samples Messwerte vorliegen."""
+        with self._lock:
+            if len(self.samples) < min_samples:
+                return None
+            werte = sorted(self.samples)
+        return werte[min(len(werte) - 1, int(len(werte) * p / 100))]
+
+
+class ResilientCall:
+    """
+    Führt Aufrufe eines Dienstes mit Timeout, Wiederholung, optionalem Hedging und Circuit Breaker aus.
+
+    Jeder Dienst hat einen eigenen Thread-Pool mit workers Plätzen (Bulkhead). Blockierende Clients
+    (hdbcli, HTTP) lassen sich nicht abbrechen; der Aufrufer wird nach Ablauf des Timeouts freigegeben,
+    der Platz erst mit dem Ende des Aufrufs. Sind alle Plätze belegt, wartet ein Aufruf höchstens bis
+    zu seinem Timeout auf einen freien Platz.
+    """
+
+    def __init__(self, name, timeout=30.0, retries=2, backoff_base=0.5, backoff_max=8.0,
+                 hedge=False, hedge_percentile=95, breaker=None, workers=None):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self.hedged_calls = 0
+        self.workers = workers or int(os.getenv(f"DPA_{name.upper()}_WORKERS", "8"))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"dpa-{name}")
+        self._slots = threading.Semaphore(self.workers)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def _backoff(self, attempt):
+        # "Full jitter": gleichverteilt zwischen 0 und exponentiell wachsender Obergrenze
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _release(self, _future):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _submit(self, fn, args, kwargs, stream, number, slot_timeout):
+        """Startet einen Versuch im Pool des Dienstes; None, wenn innerhalb von slot_timeout kein Platz frei wird."""
+        if not self._slots.acquire(timeout=max(0.0, slot_timeout)):
+            return None
+        with self._in_flight_lock:
+            self._in_flight += 1
+        # Kontextvariablen (z.B. Priorität) gelten auch im Thread des Aufrufs, dazu der Versuch für emit_token
+        context = contextvars.copy_context()
+        context.run(_current_attempt.set, (stream, number))
+        try:
+            future = self._executor.submit(context.run, fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _attempt(self, fn, args, kwargs, timeout, hedge_kwargs, stream, first_number):
+        start = time.monotonic()
+        future = self._submit(fn, args, kwargs, stream, first_number, timeout)
+        if future is None:
+            stream.fail(first_number)
+            raise DeadlineExceeded(f"Kein freier Platz für '{self.name}' innerhalb von {timeout:.1f} s (Bulkhead ausgelastet)")
+        numbers = {future: first_number}
+        futures = [future]
+        try:
+            return self._await(fn, args, kwargs, timeout, hedge_kwargs, stream, start, futures, numbers)
+        except BaseException:
+            for number in numbers.values():
+                stream.fail(number)
+            raise
+
+    def _await(self, fn, args, kwargs, timeout, hedge_kwargs, stream, start, futures, numbers):
+        hedge_after = self.latency.percentile(self.hedge_percentile) if self.hedge else None
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                # Zweitanfrage nur mit freiem Platz im Bulkhead; ihre Tokens gelten erst, wenn sie gewinnt
+                number = max(numbers.values()) + 1
+                hedge = self._submit(fn, args, dict(kwargs, **hedge_kwargs), stream, number, 0)
+                if hedge is not None:
+                    self.hedged_calls += 1
+                    numbers[hedge] = number
+                    futures.append(hedge)
+        done, _ = wait(futures, timeout=max(0.0, timeout - (time.monotonic() - start)), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded(f"Timeout beim Aufruf von '{self.name}' nach {timeout:.1f} s")
+        # Ein fehlgeschlagener Erstaufruf soll nicht die noch laufende Zweitanfrage verdrängen
+        erfolgreich = [f for f in done if f.exception() is None]
+        if not erfolgreich and len(done) < len(futures):
+            try:
+                rest = [f for f in futures if f not in done][0]
+                rest.result(timeout=max(0.0, timeout - (time.monotonic() - start)))
+                erfolgreich = [rest]
+            except FutureTimeoutError:
+                raise DeadlineExceeded(f"Timeout beim Aufruf von '{self.name}' nach {timeout:.1f} s")
+            except Exception:
+                pass
+        future = erfolgreich[0] if erfolgreich else next(iter(done))
+        result = future.result()
+        stream.win(numbers[future])
+        for other, number in numbers.items():
+            if other is not future:
+                stream.fail(number)
+        self.latency.add(time.monotonic() - start)
+        return result
+
+    def call(self, fn, *args, deadline=None, hedge_kwargs=None, **kwargs):
+        """
+        Ruft fn(*args, **kwargs) unter den Regeln dieses Dienstes auf.
+
+        Args:
+            fn (callable): Aufzurufende Funktion (z.B. embed_query, chain.run).
+            deadline (Deadline, optional): Deadline der Anfrage; begrenzt Timeout und Wiederholungen.
+            hedge_kwargs (dict, optional): Abweichende Argumente für die Zweitanfrage (z.B. callbacks=None).
+
+        Returns:
+            Ergebnis von fn.
+
+        Raises:
+            CircuitOpenError: Breaker offen.
+            DeadlineExceeded: Deadline bzw. Timeout abgelaufen.
+            Exception: Letzter Fehler von fn, wenn alle Wiederholungen fehlschlagen.
+        """
+        stream = AttemptStream()
+        for attempt in range(self.retries + 1):
+            # Deadline vor dem Breaker prüfen, damit kein Probeaufruf ohne Ergebnis belegt wird
+            timeout = self.timeout
+            if deadline is not None:
+                deadline.check(self.name)
+                timeout = min(timeout, deadline.remaining())
+            probe = self.breaker.before_call()
+            try:
+                # Versuchsnummern: je Wiederholung Platz für Erstaufruf und Zweitanfrage
+                result = self._attempt(fn, args, kwargs, timeout, hedge_kwargs or {}, stream, attempt * 2)
+            except Exception as e:
+                # Nur Störungen des Dienstes zählen und werden wiederholt, Eingabefehler nicht
+                if not is_transient(e):
+                    raise
+                self.breaker.record_failure()
+                pause = self._backoff(attempt)
+                letzter_versuch = attempt == self.retries
+                if letzter_versuch or (deadline is not None and deadline.remaining() <= pause):
+                    raise
+                print(f"Aufruf von '{self.name}' fehlgeschlagen ({e}), Wiederholung in {pause:.2f} s")
+                time.sleep(pause)
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                if probe:
+                    self.breaker.release_probe()
+
+    def status(self):
+        """Zustand des Breakers, p95-Latenz, belegte Plätze im Bulkhead und Anzahl gestaffelter Zweitanfragen."""
+        p95 = self.latency.percentile(95, min_samples=1)
+        return {
+            "breaker": self.breaker.state,
+            "failures": self.breaker.failures,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "in_flight": self._in_flight,
+            "workers": self.workers,
+            "hedged_calls": self.hedged_calls,
+        }
+
+
+class ResiliencePolicy:
+    """
+    Resilienz-Einstellungen je Dienst (llm, embedding, retriever) und Deadline je Anfrage.
+
+    Eine Instanz wird prozessweit geteilt, damit Circuit Breaker und Latenzfenster über alle
+    Anfragen hinweg wirken.
+    """
+
+    def __init__(self, request_timeout=None, llm=None, embedding=None, retriever=None):
+        retries = int(os.getenv("DPA_RETRIES", "2"))
+        failures = int(os.getenv("DPA_BREAKER_FAILURES", "5"))
+        reset = float(os.getenv("DPA_BREAKER_RESET", "30"))
+        self.request_timeout = request_timeout or float(os.getenv("DPA_REQUEST_TIMEOUT", "90"))
+        self.llm = llm or ResilientCall(
+            "llm", timeout=client_timeout("llm"), retries=retries,
+            hedge=os.getenv("DPA_HEDGE_LLM", "false").lower() == "true",
+            breaker=CircuitBreaker("llm", failures, reset),
+        )
+        self.embedding = embedding or ResilientCall(
+            "embedding", timeout=client_timeout("embedding"), retries=retries,
+            breaker=CircuitBreaker("embedding", failures, reset),
+        )
+        self.retriever = retriever or ResilientCall(
+            "retriever", timeout=client_timeout("retriever"), retries=retries,
+            breaker=CircuitBreaker("retriever", failures, reset),
+        )
+
+    def new_deadline(self):
+        """Deadline für eine neue Anfrage."""
+        return Deadline(self.request_timeout)
+
+    def status(self):
+        return {name: getattr(self, name).status() for name in ("llm", "embedding", "retriever")}
+
+
+def resilient_call(resilience, stage, fn, *args, deadline=None, hedge_kwargs=None, **kwargs):
+    """
+    Ruft fn über die Resilienz-Schicht der Stufe auf; ohne Policy direkt.
+
+    Args:
+        resilience (ResiliencePolicy | None): Policy der Anwendung.
+        stage (str): "llm", "embedding" oder "retriever".
+        fn (callable): Aufzurufende Funktion.
+        deadline (Deadline, optional): Deadline der Anfrage.
+        hedge_kwargs (dict, optional): Abweichende Argumente für eine gestaffelte Zweitanfrage.
+
+    Returns:
+        Ergebnis von fn.
+    """
+    if resilience is None:
+        if deadline is not None:
+            deadline.check(stage)
+        return fn(*args, **kwargs)
+    return getattr(resilience, stage).call(fn, *args, deadline=deadline, hedge_kwargs=hedge_kwargs, **kwargs)
@@ -0,0 +1,389 @@
+# dpa_rule_index.py
+# Strukturierter Konten- und Kontierungsregel-Index aus dem Kontierungshandbuch
+#
+# Modul A extrahiert beim Einlesen des Handbuchs die Buchungsschemata ("Konto Soll an Konto Haben")
+# deterministisch aus dem PDF-Text und speichert sie neben der Vektortabelle. Modul B sucht Konten
+# direkt im Index und übergibt nur die passenden Regelzeilen an den Prompt.
+#
+# regel_id wird je Handbuch ab 1 gezählt; eine Regel ist daher erst über (source, regel_id) eindeutig
+# (siehe rule_key). Beim Speichern werden nur die Regelzeilen der eingelesenen Quellen ersetzt.
+#
+# Die lokale JSON-Kopie liegt wie die HANA-Tabelle je Vektortabelle bzw. Generation vor
+# (DPA_RULE_INDEX_FILE, Standard rule_index.json, ergänzt um den Tabellennamen; siehe rule_index_file).
+
+import json
+import os
+import re
+from typing import Any, List
+
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+# --- Muster für das Layout der Buchungsschemata im Handbuch ---
+KONTO_REGEX = re.compile(r"^(L\d{6,7}|\d{8})$")
+ABSCHNITT_REGEX = re.compile(r"^(\d+(?:\.\d+)+)\s+(\S.*?)\s*$")
+SCHEMA_REGEX = re.compile(r"^(HGB\s*/\s*US GAAP|HGB und US GAAP|US GAAP|HGB)\s+(\S.*?)\s*$")
+KONTOART_REGEX = re.compile(r"^(Bilanz|GuV|GUV)$")
+SEITENKOPF_REGEX = re.compile(r"^(Kontierungshandbuch|\d+ von \d+)$")
+
+# Englische Fachbegriffe -> deutsche Wortstämme des Handbuchs (für die Regelsuche)
+SYNONYME = {
+    "provision": "rückstell",
+    "accrual": "rückstell",
+    "invoice": "rechnung",
+    "maintenance": "instandhalt",
+    "depreciation": "abschreib",
+    "receivable": "forderung",
+    "payable": "verbindlich",
+    "creditor": "kreditor",
+    "supplier": "kreditor",
+    "closing": "schlussbilanz",
+    "opening": "eröffnungsbilanz",
+    "reversal": "auflösung",
+    "release": "auflösung",
+    "tax": "steuer",
+    "interest": "zins",
+    "payment": "zahlung",
+    "securities": "wertpapier",
+    "pension": "pension",
+}
+
+# Name der Regeltabelle neben der Vektortabelle
+RULE_TABLE_SUFFIX = "_RULES"
+
+
+def _clean_lines(documents):
+    """Liefert (Seite, Zeile) für alle nicht-leeren Zeilen ohne Seitenkopf."""
+    lines = []
+    for doc in documents:
+        page = doc.metadata.get("page", 0) + 1
+        for line in doc.page_content.splitlines():
+            line = line.strip()
+            if line and not SEITENKOPF_REGEX.match(line):
+                lines.append((page, line))
+    return lines
+
+
+def _split_labels(block):
+    """Teilt einen Schemablock in Soll-/Haben-Konto mit Bezeichnungen und Kontoart auf."""
+    teile = {"Soll": {"kontonummer": None, "bezeichnung": [], "kontoart": None},
+             "Haben": {"kontonummer": None, "bezeichnung": [], "kontoart": None}}
+    seite, rest = "Soll", []
+    for line in block:
+        if line == "an":
+            seite = "Haben"
+        elif KONTOART_REGEX.match(line):
+            kontoart = "GuV" if line.upper() == "GUV" else line
+            if teile["Soll"]["kontoart"] is None:
+                teile["Soll"]["kontoart"] = kontoart
+            elif seite == "Haben":
+                teile["Haben"]["kontoart"] = kontoart
+                seite = None
+        elif KONTO_REGEX.match(line) and seite and teile[seite]["kontonummer"] is None:
+            teile[seite]["kontonummer"] = line
+        elif seite and teile[seite]["kontonummer"]:
+            teile[seite]["bezeichnung"].append(line)
+        elif seite is None:
+            rest.append(line)
+    # Layout-Variante: beide Bezeichnungen stehen erst nach dem Block
+    if rest and not teile["Soll"]["bezeichnung"] and not teile["Haben"]["bezeichnung"]:
+        mitte = (len(rest) + 1) // 2
+        teile["Soll"]["bezeichnung"], teile["Haben"]["bezeichnung"] = rest[:mitte], rest[mitte:]
+    for teil in teile.values():
+        teil["bezeichnung"] = re.sub(r"\s+", " ", " ".join(teil["bezeichnung"])).strip()
+    return teile
+
+
+def extract_rule_rows(documents, source=None):
+    """
+    Extrahiert die Buchungsschemata des Kontierungshandbuchs als strukturierte Regelzeilen.
+
+    Ein Schema besteht aus Kopfzeile ("HGB / US GAAP <Geschäftsfall>"), "Belegart", Soll-Konto,
+    "an", Haben-Konto und optionaler Zusatzkontierung (z.B. Vorsteuer).
+
+    Args:
+        documents (list): Seiten des Handbuchs als Document-Objekte (Ergebnis von load_pdf).
+        source (str, optional): Quelle (Dateiname) für die Regelzeilen.
+
+    Returns:
+        list: Regelzeilen als Dicts mit regel_id, abschnitt, kategorie, wertbereich, seite
+              ("Soll"/"Haben"/"Zusatz"), kontonummer, bezeichnung, kontoart, page und source.
+    """
+    lines = _clean_lines(documents)
+    rows, abschnitt, regel_id = [], None, 0
+    i = 0
+    while i < len(lines):
+        page, line = lines[i]
+        match = ABSCHNITT_REGEX.match(line)
+        # Zeilen mit Seitenzahl am Ende gehören zum Inhaltsverzeichnis
+        if match and not re.search(r"\s\d+$", line):
+            abschnitt = line
+        if not line.startswith("Belegart"):
+            i += 1
+            continue
+        # Kopfzeile des Schemas steht bis zu drei Zeilen vor "Belegart"
+        wertbereich, kategorie, zusatz_titel = None, None, []
+        for j in range(i - 1, max(-1, i - 4), -1):
+            kopf = SCHEMA_REGEX.match(lines[j][1])
+            if kopf:
+                wertbereich, kategorie = re.sub(r"\s+", " ", kopf.group(1)), kopf.group(2)
+                break
+            zusatz_titel.insert(0, lines[j][1])
+        if kategorie and zusatz_titel:
+            kategorie = f"{kategorie} {' '.join(zusatz_titel)}"
+        block, k = [], i + 1
+        while k < len(lines) and not lines[k][1].startswith("Zusatzkont") and len(block) < 40:
+            block.append(lines[k][1])
+            k += 1
+        teile = _split_labels(block)
+        regel_id += 1
+        basis = {"regel_id": regel_id, "abschnitt": abschnitt, "kategorie": kategorie,
+                 "wertbereich": wertbereich, "page": page, "source": source}
+        for seite, teil in teile.items():
+            if teil["kontonummer"]:
+                rows.append(dict(basis, seite=seite, kontonummer=teil["kontonummer"],
+                                 bezeichnung=teil["bezeichnung"], kontoart=teil["kontoart"]))
+        # Zusatzkontierung mit Konto (z.B. "Zusatzkont. 15760000 Vorsteuer")
+        if k < len(lines):
+            zusatz = lines[k][1][len("Zusatzkont."):].split()
+            if zusatz and KONTO_REGEX.match(zusatz[0]):
+                bezeichnung = " ".join(zusatz[1:]) or (lines[k + 1][1] if k + 1 < len(lines) else "")
+                rows.append(dict(basis, seite="Zusatz", kontonummer=zusatz[0],
+                                 bezeichnung=bezeichnung, kontoart=None))
+        i = k
+    return rows
+
+
+def rule_key(row):
+    """Eindeutiger Schlüssel einer Regel über alle Handbücher: (Quelle, regel_id)."""
+    return (row.get("source") or "", row["regel_id"])
+
+
+def count_rules(rows):
+    """Anzahl verschiedener Regeln in den Regelzeilen (über alle Quellen)."""
+    return len({rule_key(row) for row in rows})
+
+
+def _tokens(text):
+    """Zerlegt Text in normalisierte Wortstämme (inkl. Übersetzung englischer Fachbegriffe)."""
+    tokens = set()
+    for word in re.findall(r"[a-zäöüß]{4,}", (text or "").lower()):
+        word = SYNONYME.get(word, word)
+        tokens.add(word[:8])
+    return tokens
+
+
+class RuleIndex:
+    """
+    Lokaler Index der Kontierungsregeln für die direkte Kontensuche in Modul B.
+    """
+
+    def __init__(self, rows=None):
+        self.rows = list(rows or [])
+        self._rule_tokens = {}
+        for row in self.rows:
+            text = f"{row['abschnitt']} {row['kategorie']} {row['bezeichnung']}"
+            self._rule_tokens.setdefault(rule_key(row), set()).update(_tokens(text))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def find_account(self, label_pattern, seite=None):
+        """
+        Sucht ein Konto anhand eines Musters für die Kontobezeichnung.
+
+        Gemeinsame Konten (numerisch, ohne "LC"/"US"-Präfix) werden bevorzugt.
+
+        Args:
+            label_pattern (str): Regulärer Ausdruck für die Bezeichnung.
+            seite (str, optional): "Soll", "Haben" oder "Zusatz".
+
+        Returns:
+            tuple | None: (Kontonummer, Bezeichnung) oder None.
+        """
+        treffer = [
+            r for r in self.rows
+            if re.search(label_pattern, r["bezeichnung"], re.IGNORECASE) and (seite is None or r["seite"] == seite)
+        ]
+        treffer.sort(key=lambda r: (not r["kontonummer"].isdigit(), r["bezeichnung"][:3] in ("LC ", "US ")))
+        return (treffer[0]["kontonummer"], treffer[0]["bezeichnung"]) if treffer else None
+
+    def match_rules(self, question, limit=3):
+        """
+        Ermittelt die zum Geschäftsfall passenden Kontierungsregeln.
+
+        Args:
+            question (str): Beschreibung des Geschäftsfalls.
+            limit (int): Maximale Anzahl Regeln.
+
+        Returns:
+            list: Regelzeilen der passenden Regeln (in Reihenfolge der Relevanz).
+        """
+        query_tokens = _tokens(question)
+        genannte_konten = set(re.findall(r"\b(L\d{6,7}|\d{8})\b", question or ""))
+        scores = {}
+        for key, tokens in self._rule_tokens.items():
+            score = len(query_tokens & tokens)
+            if score:
+                scores[key] = score
+        for row in self.rows:
+            if row["kontonummer"] in genannte_konten:
+                scores[rule_key(row)] = scores.get(rule_key(row), 0) + 10
+        beste = sorted(scores, key=lambda k: (-scores[k], k))[:limit]
+        return [row for key in beste for row in self.rows if rule_key(row) == key]
+
+    def to_prompt_table(self, rows):
+        """
+        Formatiert Regelzeilen als Markdown-Tabelle für den Prompt.
+
+        Args:
+            rows (list): Regelzeilen aus match_rules().
+
+        Returns:
+            str: Tabelle mit Abschnitt, Geschäftsfall, Wertbereich, Seite, Konto und Bezeichnung.
+        """
+        lines = [
+            "|Abschnitt|Geschäftsfall|Wertbereich|Soll/Haben|Konto-Nr|Konto-Bezeichnung|",
+            "|---------|-------------|-----------|----------|--------|-----------------|",
+        ]
+        for row in rows:
+            lines.append(
+                f"|{row['abschnitt'] or ''}|{row['kategorie'] or ''}|{row['wertbereich'] or ''}"
+                f"|{row['seite']}|{row['kontonummer']}|{row['bezeichnung']}|"
+            )
+        return "\n".join(lines)
+
+
+# --- Persistenz: HANA-Tabelle neben der Vektortabelle und lokale JSON-Datei ---
+
+def rule_table_name(vector_table_name):
+    """Liefert den Namen der Regeltabelle zur Vektortabelle."""
+    return f"{vector_table_name}{RULE_TABLE_SUFFIX}"
+
+
+def rule_index_file(vector_table_name):
+    """Liefert den Pfad der lokalen JSON-Kopie zur Vektortabelle (DPA_RULE_INDEX_FILE + Tabellenname)."""
+    root, ext = os.path.splitext(os.getenv("DPA_RULE_INDEX_FILE", "rule_index.json"))
+    return f"{root}_{vector_table_name}{ext or '.json'}"
+
+
+def save_rule_index_hana(hana_connection, vector_table_name, rows, sources=None):
+    """
+    Speichert die Regelzeilen in der HANA-Tabelle <Vektortabelle>_RULES.
+
+    Args:
+        hana_connection: Aktive HANA-Datenbankverbindung.
+        vector_table_name (str): Name der Vektortabelle.
+        rows (list): Regelzeilen aus extract_rule_rows().
+        sources (list, optional): Quellen, deren Regelzeilen ersetzt werden (Regeln anderer Handbücher
+            bleiben erhalten); ohne Angabe wird der gesamte Inhalt ersetzt.
+    """
+    table = rule_table_name(vector_table_name)
+    cursor = hana_connection.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM SYS.TABLES WHERE SCHEMA_NAME = CURRENT_SCHEMA AND TABLE_NAME = ?", (table,))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(
+                f'CREATE TABLE "{table}" (REGEL_ID INTEGER, ABSCHNITT NVARCHAR(500), KATEGORIE NVARCHAR(500), '
+                f'WERTBEREICH NVARCHAR(20), SEITE NVARCHAR(10), KONTONUMMER NVARCHAR(20), BEZEICHNUNG NVARCHAR(200), '
+                f'KONTOART NVARCHAR(10), PAGE INTEGER, SOURCE NVARCHAR(500))'
+            )
+        if sources is None:
+            cursor.execute(f'DELETE FROM "{table}"')
+        elif sources:
+            sources = sorted(set(sources))
+            cursor.execute(f'DELETE FROM "{table}" WHERE SOURCE IN ({", ".join("?" * len(sources))})', tuple(sources))
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO "{table}" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(r["regel_id"], r["abschnitt"], r["kategorie"], r["wertbereich"], r["seite"], r["kontonummer"],
+                  r["bezeichnung"], r["kontoart"], r["page"], r["source"]) for r in rows],
+            )
+    finally:
+        cursor.close()
+    print(f"Rule index saved: {len(rows)} rows in table {table}.")
+
+
+def load_rule_index_hana(hana_connection, vector_table_name):
+    """
+    Lädt den Regelindex aus der HANA-Tabelle <Vektortabelle>_RULES.
+
+    Args:
+        hana_connection: Aktive HANA-Datenbankverbindung.
+        vector_table_name (str): Name der Vektortabelle.
+
+    Returns:
+        RuleIndex: Der geladene Index (leer, wenn die Tabelle nicht existiert).
+    """
+    table = rule_table_name(vector_table_name)
+    columns = ["regel_id", "abschnitt", "kategorie", "wertbereich", "seite", "kontonummer",
+               "bezeichnung", "kontoart", "page", "source"]
+    cursor = hana_connection.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM SYS.TABLES WHERE SCHEMA_NAME = CURRENT_SCHEMA AND TABLE_NAME = ?", (table,))
+        if cursor.fetchone()[0] == 0:
+            return RuleIndex()
+        cursor.execute(f'SELECT {", ".join(c.upper() for c in columns)} FROM "{table}" ORDER BY SOURCE, REGEL_ID')
+        return RuleIndex([dict(zip(columns, row)) for row in cursor.fetchall()])
+    finally:
+        cursor.close()
+
+
+def save_rule_index_json(path, rows, sources=None):
+    """
+    Speichert die Regelzeilen als lokale JSON-Datei; mit sources werden wie in save_rule_index_hana
+    nur die Regelzeilen dieser Quellen ersetzt.
+    """
+    if sources is not None and os.path.exists(path):
+        sources = set(sources)
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [row for row in json.load(f) if row.get("source") not in sources] + list(rows)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+def load_rule_index_json(path):
+    """Lädt den Regelindex aus einer lokalen JSON-Datei (leer, wenn die Datei fehlt)."""
+    if not os.path.exists(path):
+        return RuleIndex()
+    with open(path, "r", encoding="utf-8") as f:
+        return RuleIndex(json.load(f))
+
+
+# --- Retriever: passende Regelzeilen vor die Handbuch-Chunks stellen ---
+
+def prepend_rule_document(rule_index, question, documents, max_rules=3):
+    """
+    Stellt die zum Geschäftsfall passenden Regelzeilen als erstes Dokument vor die Handbuch-Chunks.
+
+    Args:
+        rule_index (RuleIndex): Regelindex (None oder leer: Dokumente unverändert).
+        question (str): Beschreibung des Geschäftsfalls.
+        documents (list): Abgerufene Handbuch-Chunks.
+        max_rules (int): Maximale Anzahl Regeln.
+
+    Returns:
+        list: Dokumente für den Kontext des Prompts.
+    """
+    rows = rule_index.match_rules(question, limit=max_rules) if rule_index else []
+    if not rows:
+        return list(documents)
+    table = rule_index.to_prompt_table(rows)
+    rule_doc = Document(page_content=f"Passende Kontierungsregeln (strukturierter Index):\n{table}",
+                        metadata={"source": "rule_index"})
+    return [rule_doc] + list(documents)
+
+
+class RuleAwareRetriever(BaseRetriever):
+    """
+    Retriever, der die passenden Regelzeilen des Index als erstes Dokument in den Kontext stellt.
+    """
+
+    base_retriever: Any
+    rule_index: Any
+    max_rules: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents = self.base_retriever.invoke(query)
+        return prepend_rule_document(self.rule_index, query, documents, self.max_rules)
@@ -0,0 +1,122 @@
+# dpa_services.py
+# Gemeinsamer Dienste-Container für Modul A und Modul B.
+#
+# Bisher lädt jede App ihre Konfiguration selbst und baut eigene LLM-, Embedding- und HANA-Clients
+# auf. Läuft Modul A zusammen mit Modul B in einem Prozess (app_dpa.py), teilen sich beide über
+# get_services() eine Instanz je Dienst. Die Dienste werden erst bei der ersten Anforderung erzeugt:
+#
+#   config               Umgebungsvariablen aus der AI-Core-Konfiguration (einmal geladen)
+#   llm                  LLM-Client je Parametersatz (Timeout je Anfrage: DPA_LLM_TIMEOUT)
+#   embedding_model      Embedding-Client (ohne Ratenbegrenzer; jedes Modul setzt seine Priorität;
+#                        Timeout je Anfrage: DPA_EMBEDDING_TIMEOUT)
+#   hana_connection      benannte HANA-Verbindungen ("default" für Abfragen mit communicationTimeout
+#                        DPA_RETRIEVER_TIMEOUT, "ingest" für Modul A, da der Bulk-Writer dort autocommit umschaltet)
+#   embedding_cache, parse_cache, registry
+#
+# Über subscribe/publish_index_change erfährt Modul B im selben Prozess sofort, wenn Modul A
+# den Index geändert hat, statt erst beim nächsten Abfragen der Zeigertabelle.
+#
+# Konfiguration: DPA_AICORE_CONFIG (Standard ~/.aicore/config.json)
+
+import os
+import threading
+
+DEFAULT_LLM_PARAMS = {"max_tokens": 4000, "temperature": 0}
+
+
+class ServiceContainer:
+    """
+    Erzeugt Dienste bei Bedarf genau einmal und hält sie für alle Module des Prozesses.
+    """
+
+    def __init__(self, config_file=None):
+        self.config_file = os.path.expanduser(config_file or os.getenv("DPA_AICORE_CONFIG", "~/.aicore/config.json"))
+        self._lock = threading.RLock()
+        self._instances = {}
+        self._listeners = []
+
+    def get(self, key, factory):
+        """Instanz zu key; beim ersten Aufruf mit factory() erzeugt."""
+        with self._lock:
+            if key not in self._instances:
+                self._instances[key] = factory()
+            return self._instances[key]
+
+    def config(self):
+        from .dpa_modulA import load_env_variables
+        return self.get("config", lambda: load_env_variables(self.config_file))
+
+    def llm(self, **params):
+        """
+        LLM-Client für das Deployment AICORE_DEPLOYMENT_MODEL (Standard-Parameter: DEFAULT_LLM_PARAMS);
+        Tokens jedes Aufrufs werden im Token- und Kostenbuch gebucht (dpa_ledger).
+        """
+        from gen_ai_hub.proxy.langchain.init_models import init_llm
+        from .dpa_ledger import meter_llm
+        from .dpa_resilience import apply_client_timeout, client_timeout
+        self.config()
+        params = {**DEFAULT_LLM_PARAMS, **params}
+        model_name = str(os.getenv("AICORE_DEPLOYMENT_MODEL"))
+        return self.get(("llm", model_name, tuple(sorted(params.items()))),
+                        lambda: apply_client_timeout(meter_llm(init_llm(model_name=model_name, **params), model_name),
+                                                     client_timeout("llm")))
+
+    def embedding_model(self):
+        """Embedding-Client für AICORE_DEPLOYMENT_MODEL_EMBEDDING."""
+        from gen_ai_hub.proxy.langchain.init_models import init_embedding_model
+        from .dpa_resilience import apply_client_timeout, client_timeout
+        self.config()
+        model_name = str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING"))
+        return self.get(("embedding", model_name),
+                        lambda: apply_client_timeout(init_embedding_model(model_name), client_timeout("embedding")))
+
+    def hana_connection(self, name="default"):
+        """Benannte HANA-Verbindung (autocommit=True)."""
+        from .dpa_modulA import setup_hana_connection
+        from .dpa_resilience import client_timeout
+        self.config()
+        timeout = client_timeout("retriever") if name == "default" else None
+        return self.get(("hana", name), lambda: setup_hana_connection(timeout))
+
+    def embedding_cache(self):
+        from .dpa_embedding_cache import open_embedding_cache
+        return self.get("embedding_cache", open_embedding_cache)
+
+    def parse_cache(self):
+        from .dpa_parse_cache import open_parse_cache
+        return self.get("parse_cache", open_parse_cache)
+
+    def registry(self):
+        from .dpa_registry import open_registry
+        return self.get("registry", open_registry)
+
+    def subscribe(self, callback):
+        """Registriert callback(vector_table, version) für Indexänderungen im Prozess."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def publish_index_change(self, vector_table, version=None):
+        """
+        Benachrichtigt alle Abonnenten (version: neue Indexversion aus dpa_index_version);
+        Fehler eines Abonnenten betreffen die anderen nicht.
+        """
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(vector_table, version)
+            except Exception as e:
+                print(f"Indexänderung konnte nicht übernommen werden: {e}")
+
+
+_services = None
+_services_lock = threading.Lock()
+
+
+def get_services():
+    """Prozessweiter Dienste-Container."""
+    global _services
+    with _services_lock:
+        if _services is None:
+            _services = ServiceContainer()
+        return _services
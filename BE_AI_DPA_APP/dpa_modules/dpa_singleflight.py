@@ -0,0 +1,208 @@
+# dpa_singleflight.py
+# Zusammenfassen gleichzeitiger, identischer Anfragen in Modul B ("single flight"):
+# Teilt ein Teamleiter eine Standard-Buchungsfrage, senden mehrere Buchhalter denselben Text
+# innerhalb weniger Sekunden an /process. Nur die erste Anfrage führt Retrieval und LLM-Aufruf
+# aus; alle weiteren warten auf dasselbe Ergebnis bzw. hängen sich an denselben Token-Stream.
+
+import contextvars
+import re
+import threading
+import unicodedata
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .dpa_resilience import emit_token
+
+
+def normalize_question(text):
+    """
+    Normalisiert eine Eingabe für den Vergleich gleichzeitiger Anfragen.
+
+    Unicode-Normalform, Groß-/Kleinschreibung und Leerraum werden vereinheitlicht.
+
+    Args:
+        text (str): Eingabe des Buchhalters.
+
+    Returns:
+        str: Normalisierter Schlüssel.
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class Flight:
+    """
+    Eine laufende Anfrage: sammelt die Tokens des LLM und das Endergebnis für alle Wartenden.
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.generation = 0
+        self.done = False
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self._cond = threading.Condition()
+
+    def publish(self, token):
+        """Hängt ein Token an den Stream an und weckt alle Abonnenten."""
+        with self._cond:
+            self.tokens.append(token)
+            self._cond.notify_all()
+
+    def reset(self):
+        """Verwirft die bisherigen Tokens (z.B. abgebrochener LLM-Versuch, siehe dpa_resilience.AttemptStream)."""
+        with self._cond:
+            self.tokens = []
+            self.generation += 1
+            self._cond.notify_all()
+
+    def finish(self, result=None, error=None):
+        """Setzt Ergebnis bzw. Fehler und beendet den Stream."""
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def wait(self):
+        """
+        Wartet auf das Endergebnis.
+
+        Returns:
+            Ergebnis der Anfrage (z.B. dict aus run_posting_pipeline).
+
+        Raises:
+            Exception: Der Fehler der ausführenden Anfrage wird an alle Wartenden weitergegeben.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def events(self):
+        """
+        Liefert den Token-Stream ab dem ersten Token (auch für spät hinzukommende Abonnenten).
+
+        Yields:
+            dict: {"token": str} je Token, {"reset": True}, wenn die bisherigen Tokens verworfen wurden,
+                  zum Schluss {"done": True, "result": ...} bzw. {"done": True, "error": str}.
+        """
+        position = 0
+        generation = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.done or self.generation != generation or len(self.tokens) > position)
+                reset = self.generation != generation
+                if reset:
+                    generation, position = self.generation, 0
+                neue_tokens = self.tokens[position:]
+                position = len(self.tokens)
+                done = self.done
+            if reset:
+                yield {"reset": True}
+            for token in neue_tokens:
+                yield {"token": token}
+            if done:
+                if self.error is not None:
+                    yield {"done": True, "error": str(self.error)}
+                else:
+                    yield {"done": True, "result": self.result}
+                return
+
+    def callback_handler(self):
+        """Callback für LangChain, der die LLM-Tokens dieser Anfrage veröffentlicht."""
+        return FlightCallbackHandler(self)
+
+
+class FlightCallbackHandler(BaseCallbackHandler):
+    """
+    Veröffentlicht die Tokens eines LLM-Aufrufs im Stream einer Flight.
+
+    Liefert das LLM keine einzelnen Tokens (streaming=False), wird die vollständige Antwort
+    am Ende als ein Token veröffentlicht. Über die Resilienz-Schicht gelten nur die Tokens des
+    führenden bzw. erfolgreichen Versuchs (emit_token).
+    """
+
+    def __init__(self, flight):
+        self.flight = flight
+        self.streamed = False
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.streamed = True
+        emit_token(self.flight, token)
+
+    def on_llm_end(self, response, **kwargs):
+        if not self.streamed and response.generations and response.generations[0]:
+            emit_token(self.flight, response.generations[0][0].text)
+
+
+class SingleFlight:
+    """
+    Führt je normalisiertem Schlüssel höchstens eine Anfrage gleichzeitig aus.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                leader = True
+            else:
+                leader = False
+            flight.waiters += 1
+            return flight, leader
+
+    def _execute(self, key, flight, fn):
+        try:
+            result = fn(flight)
+        except Exception as e:
+            error, result = e, None
+        else:
+            error = None
+        # Erst aus der Tabelle entfernen, dann beenden: spätere Anfragen starten eine neue Ausführung
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(result, error)
+
+    def run(self, key, fn):
+        """
+        Führt fn(flight) aus oder wartet auf die bereits laufende Ausführung mit demselben Schlüssel.
+
+        Args:
+            key (str): Schlüssel, z.B. normalize_question(input_text).
+            fn (callable): Erhält die Flight (für flight.callback_handler()) und liefert das Ergebnis.
+
+        Returns:
+            tuple: (Ergebnis, shared) - shared ist True, wenn das Ergebnis einer anderen Anfrage übernommen wurde.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            self._execute(key, flight, fn)
+        return flight.wait(), not leader
+
+    def start(self, key, fn):
+        """
+        Wie run, kehrt aber sofort zurück; die Ausführung läuft in einem Hintergrund-Thread, damit
+        der Stream unabhängig von der Verbindung des ersten Abonnenten weiterläuft.
+
+        Returns:
+            tuple: (Flight, shared)
+        """
+        flight, leader = self._join(key)
+        if leader:
+            # Kontextvariablen (z.B. Auftrag im Token- und Kostenbuch) gelten auch im Hintergrund-Thread
+            threading.Thread(target=contextvars.copy_context().run, args=(self._execute, key, flight, fn),
+                             daemon=True).start()
+        return flight, not leader
+
+    def in_flight(self):
+        """Anzahl der aktuell laufenden Ausführungen."""
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,457 @@
+# dpa_snapshot.py
+# Export und Import der Vektortabelle als lokaler, spaltenweiser Snapshot.
+#
+# Ein Snapshot ist ein Verzeichnis mit:
+#
+#   manifest.json    Tabelle, Zeilen, Dimension, Datentyp, Embedding-Modell, Indexversion
+#   vectors.f32      Vektoren als rohes Array (Zeilen x Dimension, little-endian float32;
+#                    bzw. vectors.f16 mit float16) - direkt per np.memmap lesbar
+#   norms.f32        L2-Norm je Vektor (für die Kosinus-Ähnlichkeit ohne Lesen aller Vektoren)
+#   texts.bin/.idx   Texte (UTF-8 hintereinander) und Offsets (int64, Zeilen + 1)
+#   metadata.bin/.idx Metadaten als JSON, ebenso abgelegt
+#   rules.json       Regelindex der Tabelle (falls vorhanden)
+#
+# Modul B kann mit DPA_SNAPSHOT_DIR aus dem Snapshot starten (VectorSnapshot per mmap statt
+# Abfragen an HANA), sofern Tabelle und Embedding-Modell zur aktiven Generation passen. Zugleich ist
+# der Snapshot ein reproduzierbarer Offline-Datensatz für Retrieval-Benchmarks.
+# Mit DPA_SNAPSHOT_QUANTIZATION (int8/float16) hält VectorSnapshot nur eine quantisierte Kopie im
+# Arbeitsspeicher und bewertet die Kandidaten exakt nach (dpa_quantize).
+#
+# Aufruf (aus BE_AI_DPA_APP):
+#   python -m dpa_modules.dpa_snapshot export snapshots/handbuch --dtype float16
+#   python -m dpa_modules.dpa_snapshot import snapshots/handbuch --blue-green
+#   python -m dpa_modules.dpa_snapshot build static/uploads snapshots/bench --fake-embeddings
+#   python -m dpa_modules.dpa_snapshot info snapshots/handbuch
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
+
+from .dpa_bulk_writer import store_writer
+from .dpa_checkpoint import CHUNKING_VERSION
+from .dpa_quantize import QuantizedIndex
+from .dpa_rule_index import RuleIndex
+
+FORMAT_VERSION = 1
+DTYPES = {"float32": ("f32", np.float32), "float16": ("f16", np.float16)}
+
+
+class SnapshotWriter:
+    """
+    Schreibt einen Snapshot zeilenweise in ein temporäres Verzeichnis; close() macht ihn atomar sichtbar.
+    """
+
+    def __init__(self, directory, rows, dimension, dtype="float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Nicht unterstützter Datentyp: {dtype}")
+        self.directory = directory
+        self.tmp = directory.rstrip(os.sep) + ".tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.rows, self.dimension, self.dtype = rows, dimension, dtype
+        suffix, np_dtype = DTYPES[dtype]
+        self.vector_file = f"vectors.{suffix}"
+        self.vectors = np.memmap(os.path.join(self.tmp, self.vector_file), dtype=np_dtype, mode="w+",
+                                 shape=(max(rows, 1), dimension))
+        self.norms = np.zeros(rows, dtype=np.float32)
+        self._texts = open(os.path.join(self.tmp, "texts.bin"), "wb")
+        self._metadata = open(os.path.join(self.tmp, "metadata.bin"), "wb")
+        self._text_offsets = [0]
+        self._metadata_offsets = [0]
+        self.count = 0
+
+    def append(self, text, metadata, vector):
+        if self.count >= self.rows:
+            raise ValueError(f"Mehr als die angekündigten {self.rows} Zeilen.")
+        vector = np.asarray(vector, dtype=np.float32)
+        self.vectors[self.count] = vector
+        # Norm des gespeicherten (ggf. gerundeten) Vektors, damit Ähnlichkeiten konsistent sind
+        self.norms[self.count] = np.linalg.norm(self.vectors[self.count].astype(np.float32))
+        self._text_offsets.append(self._text_offsets[-1] + self._texts.write(text.encode("utf-8")))
+        meta = json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8")
+        self._metadata_offsets.append(self._metadata_offsets[-1] + self._metadata.write(meta))
+        self.count += 1
+
+    def close(self, **manifest):
+        """
+        Schließt den Snapshot ab und ersetzt ein bestehendes Verzeichnis gleichen Namens.
+
+        Returns:
+            dict: Manifest des Snapshots.
+        """
+        if self.count != self.rows:
+            raise ValueError(f"{self.count} Zeilen geschrieben, angekündigt {self.rows}.")
+        self.vectors.flush()
+        del self.vectors
+        self._texts.close()
+        self._metadata.close()
+        self.norms.tofile(os.path.join(self.tmp, "norms.f32"))
+        np.asarray(self._text_offsets, dtype=np.int64).tofile(os.path.join(self.tmp, "texts.idx"))
+        np.asarray(self._metadata_offsets, dtype=np.int64).tofile(os.path.join(self.tmp, "metadata.idx"))
+        manifest = dict(manifest, format_version=FORMAT_VERSION, rows=self.rows, dimension=self.dimension,
+                        dtype=self.dtype, vectors=self.vector_file, distance="cosine",
+                        created_at=datetime.now().isoformat(timespec="seconds"))
+        with open(os.path.join(self.tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        old = self.directory.rstrip(os.sep) + ".old"
+        if os.path.exists(self.directory):
+            shutil.rmtree(old, ignore_errors=True)
+            os.replace(self.directory, old)
+        os.replace(self.tmp, self.directory)
+        shutil.rmtree(old, ignore_errors=True)
+        return manifest
+
+
+class VectorSnapshot(VectorStore):
+    """
+    Schreibgeschützter Vektorspeicher auf einem Snapshot (Vektoren per mmap, Kosinus-Ähnlichkeit wie HanaDB).
+    Bietet die in Modul B genutzten Methoden von HanaDB (similarity_search_with_score_by_vector, as_retriever).
+    """
+
+    def __init__(self, directory, embedding=None, quantization=None, overfetch=None):
+        """
+        Args:
+            directory (str): Snapshot-Verzeichnis.
+            embedding (Embeddings, optional): Für Suchen mit Text (similarity_search_with_score).
+            quantization (str, optional): "int8" oder "float16" für die Kandidatensuche
+                (Standard: DPA_SNAPSHOT_QUANTIZATION, leer = exakte Suche über alle Vektoren).
+            overfetch (int, optional): Kandidaten je Treffer für die Nachbewertung (Standard: DPA_RESCORE_OVERFETCH).
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Snapshot-Format {self.manifest.get('format_version')} wird nicht unterstützt.")
+        self.embedding = embedding
+        rows, dimension = self.manifest["rows"], self.manifest["dimension"]
+        np_dtype = DTYPES[self.manifest["dtype"]][1]
+        self.vectors = np.memmap(os.path.join(directory, self.manifest["vectors"]), dtype=np_dtype, mode="r",
+                                 shape=(max(rows, 1), dimension))[:rows]
+        self.norms = np.fromfile(os.path.join(directory, "norms.f32"), dtype=np.float32)
+        self._texts = np.memmap(os.path.join(directory, "texts.bin"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(os.path.join(directory, "texts.bin")) else np.zeros(0, dtype=np.uint8)
+        self._text_offsets = np.fromfile(os.path.join(directory, "texts.idx"), dtype=np.int64)
+        with open(os.path.join(directory, "metadata.bin"), "rb") as f:
+            metadata = f.read()
+        offsets = np.fromfile(os.path.join(directory, "metadata.idx"), dtype=np.int64)
+        self._metadata = [json.loads(metadata[offsets[i]:offsets[i + 1]]) for i in range(rows)]
+        quantization = os.getenv("DPA_SNAPSHOT_QUANTIZATION", "") if quantization is None else quantization
+        self.quantized = QuantizedIndex(self.vectors, self.norms, quantization, overfetch) \
+            if quantization and rows else None
+
+    @property
+    def table_name(self):
+        return self.manifest["table"]
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def text(self, i):
+        return bytes(self._texts[self._text_offsets[i]:self._text_offsets[i + 1]]).decode("utf-8")
+
+    def document(self, i):
+        return Document(page_content=self.text(i), metadata=dict(self._metadata[i]))
+
+    def rule_index(self):
+        """Regelindex aus dem Snapshot (None, wenn keiner exportiert wurde)."""
+        path = os.path.join(self.directory, "rules.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return RuleIndex(json.load(f))
+
+    def _mask(self, filter):
+        # Einfache Gleichheitsfilter auf Metadaten (wie {"source": ...} in Modul A)
+        if not filter:
+            return None
+        return np.array([all(meta.get(key) == value for key, value in filter.items()) for meta in self._metadata],
+                        dtype=bool)
+
+    def scores(self, embedding, block_rows=4096):
+        """Kosinus-Ähnlichkeit zu allen Zeilen (blockweise, damit float16 nicht vollständig umgewandelt wird)."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), block_rows):
+            block = np.asarray(self.vectors[start:start + block_rows], dtype=np.float32)
+            scores[start:start + block_rows] = block @ query
+        norms = np.where(self.norms > 0, self.norms, 1.0)
+        return scores / (norms * query_norm)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None):
+        if not len(self):
+            return []
+        mask = self._mask(filter)
+        if self.quantized is not None:
+            top, scores = self.quantized.search(embedding, k, mask)
+            return [(self.document(i), float(score)) for i, score in zip(top, scores)]
+        scores = self.scores(embedding)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, len(self) if mask is None else int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.document(i), float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("Snapshots sind schreibgeschützt; bitte neu exportieren.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Snapshots werden mit export_snapshot bzw. build_snapshot erstellt.")
+
+
+def _parse_vector(value):
+    # TO_NVARCHAR(VEC_VECTOR) liefert "[0.1,0.2,...]"
+    return np.fromstring(value[1:-1], dtype=np.float32, sep=",")
+
+
+def export_snapshot(hana_connection, directory, table_name=None, model_name=None, dtype="float32", fetch_size=1000):
+    """
+    Exportiert eine Vektortabelle (Standard: aktive Generation) in einen Snapshot.
+
+    Args:
+        hana_connection: Aktive HANA-Datenbankverbindung.
+        directory (str): Zielverzeichnis (wird atomar ersetzt).
+        table_name (str, optional): Vektortabelle (Standard: resolve_active_table()).
+        model_name (str, optional): Embedding-Modell (Standard: AICORE_DEPLOYMENT_MODEL_EMBEDDING).
+        dtype (str): "float32" oder "float16".
+        fetch_size (int): Zeilen je fetchmany.
+
+    Returns:
+        dict: Manifest des Snapshots.
+    """
+    from .dpa_bluegreen import count_rows, read_pointer, resolve_active_table
+    from .dpa_index_version import read_index_version
+    from .dpa_rule_index import load_rule_index_hana, save_rule_index_json
+    alias = str(os.getenv("hdb_table_name"))
+    table_name = table_name or resolve_active_table(hana_connection, alias)
+    rows = count_rows(hana_connection, table_name)
+    pointer = read_pointer(hana_connection, alias)
+    version = read_index_version(hana_connection, alias)["version"]
+
+    writer = None
+    cursor = hana_connection.cursor()
+    try:
+        cursor.execute(f'SELECT VEC_TEXT, VEC_META, TO_NVARCHAR(VEC_VECTOR) FROM "{table_name}"')
+        while True:
+            batch = cursor.fetchmany(fetch_size)
+            if not batch:
+                break
+            for text, meta, vector in batch:
+                vector = _parse_vector(vector)
+                if writer is None:
+                    writer = SnapshotWriter(directory, rows, len(vector), dtype)
+                writer.append(text, json.loads(meta) if meta else {}, vector)
+    finally:
+        cursor.close()
+    if writer is None:
+        raise ValueError(f"Tabelle {table_name} enthält keine Vektoren.")
+
+    rule_index = load_rule_index_hana(hana_connection, table_name)
+    if rule_index:
+        save_rule_index_json(os.path.join(writer.tmp, "rules.json"), rule_index.rows)
+    manifest = writer.close(
+        table=table_name,
+        model=model_name or str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING")),
+        index_version={"generation": pointer["generation"] if pointer else 0, "chunking": CHUNKING_VERSION,
+                       "version": version},
+    )
+    print(f"Snapshot exported: {rows} rows of {table_name} to {directory} ({dtype}).")
+    return manifest
+
+
+def build_snapshot(directory, documents, embeddings, table_name="OFFLINE", model_name=None, dtype="float32",
+                   rule_rows=None, batch_size=64):
+    """
+    Erstellt einen Snapshot direkt aus Chunks (ohne HANA), z.B. als Offline-Datensatz für Benchmarks.
+
+    Returns:
+        dict: Manifest des Snapshots.
+    """
+    writer = None
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        vectors = embeddings.embed_documents([doc.page_content for doc in batch])
+        for doc, vector in zip(batch, vectors):
+            if writer is None:
+                writer = SnapshotWriter(directory, len(documents), len(vector), dtype)
+            writer.append(doc.page_content, doc.metadata, vector)
+    if writer is None:
+        raise ValueError("Keine Dokumente für den Snapshot.")
+    if rule_rows:
+        with open(os.path.join(writer.tmp, "rules.json"), "w", encoding="utf-8") as f:
+            json.dump(rule_rows, f, ensure_ascii=False, indent=2)
+    return writer.close(table=table_name, model=model_name or str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING")),
+                        index_version={"generation": 0, "chunking": CHUNKING_VERSION})
+
+
+def import_snapshot(snapshot, hana_database, batch_size=500):
+    """
+    Schreibt alle Zeilen eines Snapshots mit den gespeicherten Vektoren in eine Vektortabelle
+    (ohne erneute Embedding-Aufrufe).
+
+    Returns:
+        int: Anzahl der geschriebenen Zeilen.
+    """
+    write, writer = store_writer(hana_database)
+    try:
+        for start in range(0, len(snapshot), batch_size):
+            stop = min(start + batch_size, len(snapshot))
+            documents = [snapshot.document(i) for i in range(start, stop)]
+            vectors = np.asarray(snapshot.vectors[start:stop], dtype=np.float32).tolist()
+            write([doc.page_content for doc in documents], [doc.metadata for doc in documents], vectors)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(f"Snapshot imported: {len(snapshot)} rows into {hana_database.table_name}.")
+    return len(snapshot)
+
+
+def load_snapshot_store(directory, embeddings, table_name, model_name=None, index_version=None):
+    """
+    Öffnet den Snapshot für Modul B, wenn er zur aktiven Tabelle und zum Embedding-Modell passt.
+    Mit index_version (dpa_index_version) wird ein Snapshot älterer Indexversion nicht verwendet.
+
+    Returns:
+        VectorSnapshot | None: None, wenn kein Snapshot konfiguriert ist oder er nicht passt.
+    """
+    if not directory or not os.path.exists(os.path.join(directory, "manifest.json")):
+        return None
+    model_name = model_name or str(os.getenv("AICORE_DEPLOYMENT_MODEL_EMBEDDING"))
+    try:
+        snapshot = VectorSnapshot(directory, embeddings)
+    except Exception as e:
+        print(f"Snapshot {directory} not usable: {e}")
+        return None
+    if snapshot.manifest["table"] != table_name or snapshot.manifest["model"] != model_name:
+        print(f"Snapshot {directory} skipped: table {snapshot.manifest['table']} / model {snapshot.manifest['model']} "
+              f"do not match {table_name} / {model_name}.")
+        return None
+    snapshot_version = snapshot.manifest.get("index_version", {}).get("version")
+    if index_version is not None and snapshot_version is not None and snapshot_version != index_version:
+        print(f"Snapshot {directory} skipped: index version {snapshot_version} is outdated (current {index_version}).")
+        return None
+    print(f"Vector snapshot mapped: {len(snapshot)} rows of {table_name} from {directory}.")
+    return snapshot
+
+
+def main(argv=None):
+    """Kommandozeile für Export, Import, Offline-Aufbau und Anzeige von Snapshots."""
+    parser = argparse.ArgumentParser(description="Snapshots der Vektortabelle (Export/Import, mmap-fähig)")
+    parser.add_argument("--config", default=os.path.expanduser("~/.aicore/config.json"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Vektortabelle in einen Snapshot exportieren")
+    export.add_argument("directory")
+    export.add_argument("--table", help="Vektortabelle (Standard: aktive Generation)")
+    export.add_argument("--dtype", choices=sorted(DTYPES), default="float32")
+    imp = commands.add_parser("import", help="Snapshot in eine Vektortabelle schreiben")
+    imp.add_argument("directory")
+    imp.add_argument("--table", help="Zieltabelle (Standard: aktive Generation, wird vorher geleert)")
+    imp.add_argument("--blue-green", action="store_true", help="In eine neue Generation schreiben und aktivieren")
+    build = commands.add_parser("build", help="Offline-Snapshot aus PDF-Dateien erstellen (ohne HANA)")
+    build.add_argument("paths", nargs="+", help="Verzeichnisse, PDF-Dateien oder Glob-Muster, zuletzt das Zielverzeichnis")
+    build.add_argument("--dtype", choices=sorted(DTYPES), default="float32")
+    build.add_argument("--fake-embeddings", action="store_true", help="Deterministische lokale Vektoren statt AI Core")
+    info = commands.add_parser("info", help="Manifest eines Snapshots anzeigen")
+    info.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        print(json.dumps(VectorSnapshot(args.directory).manifest, ensure_ascii=False, indent=2))
+        return 0
+
+    from .dpa_modulA import load_env_variables, setup_embedding_model, setup_hana_connection
+    if args.command != "build" or not args.fake_embeddings:
+        load_env_variables(args.config)
+
+    if args.command == "build":
+        from .dpa_ingest import find_pdfs
+        from .dpa_modulA import load_pdf, split_pdf_to_chunks
+        from .dpa_rule_index import extract_rule_rows
+        *patterns, directory = args.paths
+        files = find_pdfs(patterns)
+        if not files:
+            print("Keine PDF-Dateien gefunden.", file=sys.stderr)
+            return 2
+        if args.fake_embeddings:
+            from .dpa_fakes import FakeEmbeddings
+            embeddings, model_name = FakeEmbeddings(), "fake"
+        else:
+            from .dpa_embedding_cache import CachedEmbeddings, open_embedding_cache
+            embeddings, model_name = setup_embedding_model(), None
+            cache = open_embedding_cache()
+            if cache is not None:
+                embeddings = CachedEmbeddings(embeddings, cache)
+        documents, rule_rows = [], []
+        for path in files:
+            docs = load_pdf(path)
+            documents.extend(split_pdf_to_chunks(docs))
+            rule_rows.extend(extract_rule_rows(docs, source=os.path.basename(path)))
+        manifest = build_snapshot(directory, documents, embeddings, model_name=model_name, dtype=args.dtype,
+                                  rule_rows=rule_rows)
+        print(f"Offline snapshot: {manifest['rows']} rows, dimension {manifest['dimension']} in {directory}")
+        return 0
+
+    hana_connection = setup_hana_connection()
+    if args.command == "export":
+        export_snapshot(hana_connection, args.directory, args.table, dtype=args.dtype)
+        return 0
+
+    from langchain_community.vectorstores.hanavector import HanaDB
+    from .dpa_bluegreen import create_shadow_store, resolve_active_table, switch_active_table, validate_shadow
+    from .dpa_rule_index import save_rule_index_hana
+    embeddings = setup_embedding_model()
+    snapshot = VectorSnapshot(args.directory, embeddings)
+    alias = str(os.getenv("hdb_table_name"))
+    if args.blue_green:
+        active_table = resolve_active_table(hana_connection, alias)
+        generation, target = create_shadow_store(hana_connection, embeddings, alias)
+    else:
+        target = HanaDB(embedding=embeddings, connection=hana_connection,
+                        table_name=args.table or resolve_active_table(hana_connection, alias))
+        target.delete(filter={})
+    rows = import_snapshot(snapshot, target)
+    rule_index = snapshot.rule_index()
+    if rule_index:
+        save_rule_index_hana(hana_connection, target.table_name, rule_index.rows)
+    if not args.blue_green:
+        from .dpa_index_version import bump_index_version
+        bump_index_version(hana_connection, alias, target.table_name, source=f"snapshot {args.directory}")
+    if args.blue_green:
+        validation = validate_shadow(hana_connection, target, rows, active_table=active_table)
+        if not validation["valid"]:
+            print(f"FEHLER Prüfung {target.table_name}, {active_table} bleibt aktiv: {' '.join(validation['errors'])}",
+                  file=sys.stderr)
+            return 1
+        switch_active_table(hana_connection, alias, target.table_name, generation)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# dpa_splitter.py
+# Zerlegung von Eingaben mit mehreren Geschäftsfällen in unabhängige Einzelfälle
+#
+# Buchhalter fügen häufig mehrere Geschäftsfälle in eine Eingabe ein, z.B.
+#   - Als Geschäftsfall soll eine Rückstellung ... gebucht werden.
+#     * Die Instandhaltungsleistung ...
+#   - Als Geschäftsfall soll weiterhin die Auflösung der Rückstellung ... gebucht werden.
+# Jeder Aufzählungspunkt der obersten Ebene ist ein Geschäftsfall; eingerückte Unterpunkte
+# ("*", "+", eingerückte "-") gehören zum vorhergehenden Geschäftsfall.
+#
+# Zerlegt wird nur, wenn jeder Aufzählungspunkt für sich ein Geschäftsfall ist (eigenes Verb wie
+# "buchen"/"post" oder Betrag und Geschäftsfall-Begriff). Eine Rechnung mit Detailpunkten
+# ("- Kreditor AAA", "- 1.000 EUR netto", "- Vorsteuer 190 EUR") bleibt ein Geschäftsfall.
+# Bezieht sich ein späterer Fall auf frühere ("Auflösung der Rückstellung", "die gebildete
+# Rückstellung"), erhält er die früheren Fälle über case_contexts als Kontext für das LLM.
+# Rückbezüge werden für Deutsch, Englisch, Französisch, Italienisch, Niederländisch und Finnisch
+# erkannt; Eingaben in anderen Sprachen werden nicht zerlegt.
+
+import re
+
+from .dpa_fastpath import BETRAG_REGEX
+from .dpa_language import detect_language
+
+# Aufzählungszeichen der obersten Ebene: "-", "•" oder Nummerierung "1." / "1)"
+TOP_LEVEL_REGEX = re.compile(r"^(?:[-•]|\d+[.)])\s+")
+# Einzeilige Eingaben: " - " nach Satzende trennt Geschäftsfälle
+INLINE_SPLIT_REGEX = re.compile(r"(?:^|(?<=[.!?;:]))\s*-\s+(?=\S)")
+# Verben, mit denen ein Aufzählungspunkt einen eigenen Geschäftsfall beschreibt
+VERB_REGEX = re.compile(
+    r"\b(buch\w*|gebucht|verbuch\w*|kontier\w*|zahl(e|en|t)\b|bezahl\w*|begleich\w*|überweis\w*|bild(e|en|et)\b|gebildet"
+    r"|auflös\w*|aufgelöst|erfass\w*|abschreib\w*|post(ed|ing|s)?\b|book(ed|ing|s)?\b|pay(s|ing)?\b|paid|record(ed|ing|s)?\b"
+    r"|recogni[sz]\w*|revers\w*|comptabilis\w*|contabilizz\w*|registra\w*|geboekt|boek(en|ing)\b|kirja\w*)",
+    re.IGNORECASE,
+)
+# Geschäftsfall-Begriffe, die zusammen mit einem Betrag einen Geschäftsfall ausmachen
+KATEGORIE_REGEX = re.compile(
+    r"rechnung|rückstellung|zahlung|abschreibung|gutschrift|anzahlung|abgrenzung|invoice|provision|payment"
+    r"|depreciation|credit note|accrual",
+    re.IGNORECASE,
+)
+# Rückbezüge auf frühere Geschäftsfälle derselben Eingabe, für jede Sprache, in der VERB_REGEX zerlegt
+RUECKBEZUG_REGEX = re.compile(
+    # de
+    r"\b(weiterhin|ebenfalls|anschließend|danach|zuvor|obig\w*|vorgenannt\w*|genannt\w*|gebildet\w*|diese[rsnm]?\b"
+    r"|derselben|auflösung der|inanspruchnahme der"
+    # en
+    r"|also|above|aforementioned|previous\w*|same|subsequent\w*|recogni[sz]ed|reversal of the|this provision"
+    # fr
+    r"|également|aussi|ensuite|précédent\w*|ci-dessus|susmentionn\w*|constitué\w*|comptabilisé\w*|même\w*"
+    r"|reprise de|cette provision"
+    # it
+    r"|anche|inoltre|successivament\w*|precedent\w*|suddett\w*|sopra|riconosciut\w*|costituit\w*|stess[oaie]\b"
+    r"|ripresa del\w*|questa riserva|registrazione della riserva"
+    # nl
+    r"|ook|eveneens|vervolgens|daarna|bovengenoemd\w*|vorige?|opgenomen|geboekte|gevormde|dezelfde|terugname van"
+    r"|deze voorziening"
+    # fi
+    r"|myös|lisäksi|sitten|edellä|aiemm\w*|kyseis\w*|kyseinen|kirjattu|muodostettu|saman\w*|varauksen purkami\w*"
+    r"|tämä varaus)",
+    re.IGNORECASE,
+)
+# Einleitung des Kontexts für das LLM (Sprache der Eingabe, sonst Englisch)
+KONTEXT_TEXTE = {
+    "de": ("Vorherige Geschäftsfälle derselben Eingabe (nur Kontext, nicht erneut kontieren):",
+           "Zu kontierender Geschäftsfall:"),
+    "en": ("Previous business cases of the same input (context only, do not post them again):",
+           "Business case to post:"),
+    "fr": ("Opérations précédentes de la même saisie (contexte uniquement, ne pas les comptabiliser à nouveau) :",
+           "Opération à comptabiliser :"),
+    "it": ("Operazioni precedenti dello stesso input (solo contesto, non registrarle di nuovo):",
+           "Operazione da registrare:"),
+    "nl": ("Eerdere boekingsgevallen uit dezelfde invoer (alleen context, niet opnieuw boeken):",
+           "Te boeken boekingsgeval:"),
+    "fi": ("Saman syötteen aiemmat liiketapahtumat (vain kontekstiksi, älä kirjaa niitä uudelleen):",
+           "Kirjattava liiketapahtuma:"),
+}
+
+
+def split_business_cases(text):
+    """
+    Zerlegt eine Eingabe in einzelne Geschäftsfälle (Reihenfolge bleibt erhalten).
+
+    Text vor dem ersten Aufzählungspunkt (Einleitung) wird jedem Geschäftsfall vorangestellt,
+    damit gemeinsame Angaben nicht verloren gehen.
+
+    Args:
+        text (str): Eingabe des Buchhalters.
+
+    Returns:
+        list: Liste der Geschäftsfälle als Text; bei nur einem Fall oder wenn ein Aufzählungspunkt
+        keinen eigenen Geschäftsfall beschreibt die unveränderte Eingabe.
+    """
+    text = (text or "").strip()
+    if not text:
+        return [text]
+    lines = text.splitlines()
+    if len(lines) > 1:
+        einleitung, cases = [], []
+        for line in lines:
+            if TOP_LEVEL_REGEX.match(line):
+                cases.append([TOP_LEVEL_REGEX.sub("", line, count=1)])
+            elif cases:
+                cases[-1].append(line)
+            elif line.strip():
+                einleitung.append(line.strip())
+        cases = ["\n".join(case).strip() for case in cases]
+    else:
+        einleitung, cases = [], [c.strip() for c in INLINE_SPLIT_REGEX.split(text)]
+        if not text.startswith("-"):
+            einleitung, cases = [cases[0]], cases[1:]
+    cases = [case for case in cases if case]
+    if len(cases) <= 1 or not all(is_business_case(case) for case in cases):
+        return [text]
+    # Ohne Erkennung von Rückbezügen (siehe KONTEXT_TEXTE) bleibt die Eingabe ein Ganzes
+    if detect_language(text) not in KONTEXT_TEXTE:
+        return [text]
+    if einleitung:
+        prefix = " ".join(einleitung)
+        cases = [f"{prefix}\n{case}" for case in cases]
+    return cases
+
+
+def is_business_case(text):
+    """
+    Prüft, ob ein Aufzählungspunkt für sich einen Geschäftsfall beschreibt.
+
+    Args:
+        text (str): Aufzählungspunkt (ohne Aufzählungszeichen).
+
+    Returns:
+        bool: True bei eigenem Verb oder bei Betrag mit Geschäftsfall-Begriff.
+    """
+    if VERB_REGEX.search(text):
+        return True
+    betrag = any(m.group("w1") or m.group("w2") for m in BETRAG_REGEX.finditer(text))
+    return betrag and bool(KATEGORIE_REGEX.search(text))
+
+
+def case_contexts(cases):
+    """
+    Kontext je Geschäftsfall: Fälle mit Rückbezug erhalten die früheren Fälle derselben Eingabe.
+
+    Args:
+        cases (list): Ergebnis von split_business_cases().
+
+    Returns:
+        list: Je Geschäftsfall der Kontexttext oder None.
+    """
+    return [
+        "\n".join(f"- {frueher}" for frueher in cases[:i]) if i > 0 and RUECKBEZUG_REGEX.search(case) else None
+        for i, case in enumerate(cases)
+    ]
+
+
+def with_context(case, context):
+    """
+    Frage an das LLM: früherer Kontext, danach der zu kontierende Geschäftsfall.
+
+    Args:
+        case (str): Geschäftsfall.
+        context (str | None): Ergebnis von case_contexts() für diesen Fall.
+
+    Returns:
+        str: Geschäftsfall, ggf. mit vorangestelltem Kontext.
+    """
+    if not context:
+        return case
+    kontext, fall = KONTEXT_TEXTE.get(detect_language(case), KONTEXT_TEXTE["en"])
+    return f"{kontext}\n{context}\n\n{fall}\n{case}"
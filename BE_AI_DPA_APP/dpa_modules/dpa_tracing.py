@@ -0,0 +1,308 @@
+# dpa_tracing.py
+# Span-basiertes Tracing der Pipeline von Modul B anstelle der ausführlichen Kettenausgabe (verbose=True).
+#
+# Bisher gab jede Anfrage den vollständig formatierten Prompt auf stdout aus. Das kostet unter Last
+# spürbar I/O-Zeit und liefert keine Zeiten. Stattdessen wird eine Stichprobe der Anfragen (DPA_TRACE_SAMPLE)
+# als Trace mit verschachtelten Spans aufgezeichnet. Jeder Span hat Beginn, Dauer und Größen, z.B.:
+#
+#   split, fastpath, prefetch_lookup, embedding (Texte, Zeichen)
+#   case je Geschäftsfall: retrieval (Score je Chunk), domain_gate, llm_chain
+#     llm_chain: prompt (Formatierung, Zeichen), llm (Tokens), parse (bzw. parse_json in der Stapelverarbeitung)
+#
+# Abgeschlossene Traces liegen in einem Ringpuffer (DPA_TRACE_BUFFER) und optional zusätzlich als eine
+# JSONL-Zeile je Trace in DPA_TRACE_FILE. Modul B zeigt sie unter /traces und als Wasserfall unter
+# /traces/<trace_id>/waterfall. Mit dem Header "X-DPA-Trace: 1" wird eine Anfrage immer aufgezeichnet.
+# Spans gelten über Kontextvariablen auch in den Worker-Threads der Pipeline (contextvars.copy_context).
+#
+# Konfiguration: DPA_TRACE_SAMPLE (Anteil 0..1, Standard 0.1), DPA_TRACE_BUFFER (Traces, Standard 200),
+#                DPA_TRACE_FILE (JSONL, Standard aus), DPA_CHAIN_VERBOSE (bisherige Kettenausgabe, Standard false)
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+_current_trace = contextvars.ContextVar("dpa_trace", default=None)
+_current_span = contextvars.ContextVar("dpa_span", default=None)
+
+
+def chain_verbose():
+    """Ausführliche Ausgabe der LangChain-Ketten (DPA_CHAIN_VERBOSE, nur zur Fehlersuche)."""
+    return os.getenv("DPA_CHAIN_VERBOSE", "false").lower() in ("1", "true", "yes")
+
+
+class Trace:
+    """
+    Spans einer Anfrage; Zeiten relativ zum Beginn des Trace in Millisekunden.
+    """
+
+    def __init__(self, name, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.started = datetime.now().isoformat(timespec="milliseconds")
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {"trace_id": self.trace_id, "name": self.name, "started": self.started,
+                "duration_ms": self.duration_ms, "attrs": self.attrs, "spans": spans}
+
+
+class Span:
+    """Abschnitt eines Trace; Größen und Ergebnisse über set()."""
+
+    def __init__(self, trace, name, parent_id=None, **attrs):
+        self.trace = trace
+        self.name = name
+        self.span_id = trace.next_id()
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def finish(self, end=None, error=None):
+        end = time.perf_counter() if end is None else end
+        record = {"span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+                  "start_ms": round((self.start - self.trace.start) * 1000, 3),
+                  "duration_ms": round((end - self.start) * 1000, 3),
+                  "thread": threading.current_thread().name, "attrs": self.attrs}
+        if error is not None:
+            record["error"] = error
+        self.trace.add(record)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.finish(error=f"{exc_type.__name__}: {exc}" if exc is not None else None)
+        return False
+
+
+class _NoopSpan:
+    """Ersatz außerhalb eines aufgezeichneten Trace (kein Aufwand)."""
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def tracing():
+    """True, wenn der aktuelle Ablauf aufgezeichnet wird (z.B. um teure Größenangaben zu sparen)."""
+    return _current_trace.get() is not None
+
+
+def span(name, **attrs):
+    """
+    Span im aktuellen Trace (Elternteil: der aktuell offene Span), sonst NOOP_SPAN:
+
+        with span("retrieval", k=10) as s:
+            ...
+            s.set(documents=len(documents))
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    parent = _current_span.get()
+    return Span(trace, name, parent.span_id if parent is not None else None, **attrs)
+
+
+class Tracer:
+    """
+    Stichprobe, Ringpuffer und JSONL-Ablage der Traces.
+    """
+
+    def __init__(self, sample_rate=None, buffer_size=None, path=None):
+        self.sample_rate = float(os.getenv("DPA_TRACE_SAMPLE", "0.1")) if sample_rate is None else sample_rate
+        self.buffer = deque(maxlen=int(os.getenv("DPA_TRACE_BUFFER", "200")) if buffer_size is None else buffer_size)
+        self.path = os.getenv("DPA_TRACE_FILE", "") if path is None else path
+        self._lock = threading.Lock()
+
+    def sampled(self, force=False):
+        return force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def record(self, trace):
+        data = trace.to_dict()
+        with self._lock:
+            self.buffer.append(data)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+
+    def recent(self, limit=50):
+        """Übersicht der jüngsten Traces (neueste zuerst)."""
+        with self._lock:
+            traces = list(self.buffer)[-limit:] if limit > 0 else []
+        return [{"trace_id": t["trace_id"], "name": t["name"], "started": t["started"],
+                 "duration_ms": t["duration_ms"], "spans": len(t["spans"]), "attrs": t["attrs"]}
+                for t in reversed(traces)]
+
+    def get(self, trace_id):
+        with self._lock:
+            for trace in self.buffer:
+                if trace["trace_id"] == trace_id:
+                    return trace
+        return None
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Prozessweiter Tracer."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+class trace_request:
+    """
+    Zeichnet einen Ablauf als Trace auf, wenn er in die Stichprobe fällt (oder force=True):
+
+        with trace_request("process", force=..., input_chars=len(text)) as trace:
+            ...   # trace ist None, wenn nicht aufgezeichnet wird
+    """
+
+    def __init__(self, name, force=False, tracer=None, **attrs):
+        self.tracer = tracer or get_tracer()
+        self.trace = Trace(name, **attrs) if self.tracer.sampled(force) else None
+
+    def __enter__(self):
+        if self.trace is not None:
+            self._tokens = (_current_trace.set(self.trace), _current_span.set(None))
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is None:
+            return False
+        _current_span.reset(self._tokens[1])
+        _current_trace.reset(self._tokens[0])
+        self.trace.duration_ms = round((time.perf_counter() - self.trace.start) * 1000, 3)
+        if exc is not None:
+            self.trace.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.record(self.trace)
+        return False
+
+
+def waterfall(trace):
+    """
+    Zeilen für die Wasserfall-Darstellung: Spans in Baumreihenfolge mit Tiefe sowie Versatz und Breite in
+    Prozent der Gesamtdauer.
+    """
+    total = trace["duration_ms"] or max((s["start_ms"] + s["duration_ms"] for s in trace["spans"]), default=1) or 1
+    children = {}
+    for s in trace["spans"]:
+        children.setdefault(s["parent_id"], []).append(s)
+    rows = []
+
+    def walk(parent_id, depth):
+        for s in children.get(parent_id, []):
+            rows.append(dict(s, depth=depth, offset_pct=round(100 * s["start_ms"] / total, 2),
+                             width_pct=max(round(100 * s["duration_ms"] / total, 2), 0.2)))
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+    return rows
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain-Callback für die Dokumenten-Kette: zerlegt den LLM-Aufruf in die Spans prompt
+    (Formatierung bis zum Start des LLM), llm (Aufruf) und parse (Ausgabe bis zum Ende der Kette).
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.trace = parent.trace
+        self._chain_start = None
+        self._llm = None
+        self._llm_end = None
+
+    def on_chain_start(self, serialized, inputs, run_id=None, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._chain_start = time.perf_counter()
+
+    def _start_llm(self, prompt_chars):
+        now = time.perf_counter()
+        if self._chain_start is not None:
+            prompt = Span(self.trace, "prompt", self.parent.span_id, chars=prompt_chars,
+                          estimated_tokens=prompt_chars // 4)
+            prompt.start = self._chain_start
+            prompt.finish(now)
+        self._llm = Span(self.trace, "llm", self.parent.span_id, prompt_chars=prompt_chars)
+        self._llm.start = now
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._start_llm(sum(len(prompt) for prompt in prompts))
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._start_llm(sum(len(str(message.content)) for batch in messages for message in batch))
+
+    def on_llm_end(self, response, **kwargs):
+        if self._llm is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        texts = [generation.text for generations in response.generations for generation in generations]
+        self._llm.set(completion_chars=sum(len(text) for text in texts), prompt_tokens=usage.get("prompt_tokens"),
+                      completion_tokens=usage.get("completion_tokens"))
+        self._llm_end = time.perf_counter()
+        self._llm.finish(self._llm_end)
+        self._llm = None
+
+    def on_llm_error(self, error, **kwargs):
+        if self._llm is not None:
+            self._llm.finish(error=f"{type(error).__name__}: {error}")
+            self._llm = None
+
+    def on_chain_end(self, outputs, run_id=None, parent_run_id=None, **kwargs):
+        if parent_run_id is None and self._llm_end is not None:
+            parse = Span(self.trace, "parse", self.parent.span_id,
+                         output_chars=sum(len(str(value)) for value in (outputs or {}).values()))
+            parse.start = self._llm_end
+            parse.finish()
+
+
+def trace_callbacks(callbacks=None):
+    """Ergänzt callbacks um einen TracingCallbackHandler für den aktuellen Span (nur bei laufendem Trace)."""
+    parent = _current_span.get()
+    if _current_trace.get() is None or parent is None:
+        return callbacks
+    return list(callbacks or []) + [TracingCallbackHandler(parent)]
@@ -0,0 +1,106 @@
+# dpa_upload.py
+# Gestreamte, größenbegrenzte Uploads für Modul A.
+#
+# Bisher puffert Werkzeug den Upload (im Speicher bzw. in einer temporären Datei), upload_pdf speichert
+# ihn mit file.save in den Upload-Ordner, und für den Hash wird die Datei danach erneut gelesen.
+# StreamingUploadRequest lässt Werkzeug jede hochgeladene Datei direkt in eine temporäre Datei im
+# Upload-Ordner schreiben. Dabei werden der SHA-256 berechnet und die Bytes gezählt, und beim
+# Überschreiten der Grenze wird sofort mit 413 abgebrochen. commit benennt die Datei danach atomar
+# um, sodass nie eine halb geschriebene PDF unter ihrem endgültigen Namen liegt.
+#
+# Konfiguration: DPA_MAX_UPLOAD_MB (Standard 100)
+
+import hashlib
+import os
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+def max_upload_bytes():
+    """Größte zulässige Datei in Bytes (DPA_MAX_UPLOAD_MB)."""
+    return int(float(os.getenv("DPA_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+
+
+class HashingUploadStream:
+    """
+    Schreibbare temporäre Datei, die beim Schreiben SHA-256 und Größe mitführt.
+    Nicht übernommene Dateien werden beim Schließen gelöscht.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.max_bytes = max_bytes
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.close()
+            raise RequestEntityTooLarge(f"Datei größer als {self.max_bytes // (1024 * 1024)} MB.")
+        self._sha256.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self):
+        """SHA-256 des bisher geschriebenen Inhalts (hex)."""
+        return self._sha256.hexdigest()
+
+    def commit(self, target):
+        """Schließt die Datei und benennt sie atomar in target um."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.path, target)
+        self.committed = True
+        self.path = target
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read, seek, tell usw. für FileStorage
+        return getattr(self._file, name)
+
+
+class StreamingUploadRequest(Request):
+    """
+    Request-Klasse, die hochgeladene Dateien direkt per HashingUploadStream in den Upload-Ordner
+    (app.config['UPLOAD_FOLDER']) schreibt, höchstens app.config['MAX_UPLOAD_BYTES'] Bytes je Datei.
+    Ist app.config['STREAMING_UPLOAD_ENDPOINTS'] gesetzt, nur für diese Endpunkte (andere Uploads,
+    z.B. die CSV der Stapelverarbeitung in Modul B, werden wie bisher gepuffert).
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        folder = current_app.config.get("UPLOAD_FOLDER")
+        endpoints = current_app.config.get("STREAMING_UPLOAD_ENDPOINTS")
+        if not filename or not folder or (endpoints and self.endpoint not in endpoints):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        max_bytes = current_app.config.get("MAX_UPLOAD_BYTES")
+        if max_bytes and content_length and content_length > max_bytes:
+            raise RequestEntityTooLarge(f"Datei größer als {max_bytes // (1024 * 1024)} MB.")
+        return HashingUploadStream(folder, max_bytes)
+
+
+def save_upload(file, filepath):
+    """
+    Übernimmt eine hochgeladene Datei nach filepath.
+
+    Returns:
+        tuple: (SHA-256, Größe in Bytes); ohne StreamingUploadRequest wird wie bisher gespeichert
+        und anschließend gehasht.
+    """
+    if isinstance(file.stream, HashingUploadStream):
+        file.stream.commit(filepath)
+        return file.stream.sha256, file.stream.size
+    from .dpa_checkpoint import file_sha256
+    file.save(filepath)
+    return file_sha256(filepath), os.path.getsize(filepath)
@@ -0,0 +1,199 @@
+# dpa_warmup.py
+# Vorwärmen der Caches von Modul B nach dem Start und nach einer neuen Indexversion.
+#
+# Nach jedem Deployment bzw. jeder Ingestion sind Antwort-, Embedding- und Retrieval-Cache leer. Die ersten
+# Anfragen (typischerweise zum Monatsabschluss) zahlen dann Embedding, Retrieval und LLM vollständig.
+# WarmupJob spielt deshalb im Hintergrund die Eingabehistorie (input_history_modulB.json) und optional eine
+# gepflegte Liste von Standard-Geschäftsfällen (DPA_WARMUP_CASES, JSON-Liste oder eine Zeile je Fall)
+# über die Kette von Modul B ab. Jeder Aufruf läuft mit PRIORITY_BULK beim gemeinsamen Ratenbegrenzer
+# (dpa_ratelimit), sodass interaktive Anfragen immer Vorrang haben:
+#
+#   1. Embedding der Eingaben        -> Embedding-Cache (dpa_embedding_cache)
+#   2. Retrieval je Geschäftsfall    -> lokaler Retrieval-Spiegel (RetrievalPrefetcher, ohne Ablaufzeit)
+#   3. optional LLM (DPA_WARMUP_ANSWERS) -> AnswerCache
+#
+# Der AnswerCache hält fertige Ergebnisse je normalisierter Eingabe, Antwortformat, Vektortabelle und
+# Indexversion; mit einer neuen Indexversion werden alte Einträge nicht mehr getroffen. Ein neuer Lauf
+# (z.B. nach einer weiteren Indexänderung) beendet den laufenden.
+#
+# Konfiguration: DPA_WARMUP (Standard true), DPA_WARMUP_CASES (Datei, optional),
+#                DPA_WARMUP_LIMIT (Eingaben je Lauf, Standard 100), DPA_WARMUP_DELAY (Sekunden, Standard 5),
+#                DPA_WARMUP_ANSWERS (auch LLM-Antworten vorberechnen, Standard false),
+#                DPA_ANSWER_CACHE_SIZE (Einträge, Standard 512, 0 = aus)
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .dpa_ratelimit import PRIORITY_BULK, priority_scope
+from .dpa_singleflight import normalize_question
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+class AnswerCache:
+    """
+    Begrenzter LRU-Speicher fertiger Pipeline-Ergebnisse von Modul B.
+    """
+
+    def __init__(self, size=None):
+        self.size = int(os.getenv("DPA_ANSWER_CACHE_SIZE", "512")) if size is None else size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text, table_name, index_version=None, output_format="html"):
+        return (normalize_question(text), output_format, table_name, index_version)
+
+    def get(self, text, table_name, index_version=None, output_format="html"):
+        """
+        Returns:
+            dict | None: Ergebnis von run_posting_pipeline oder None.
+        """
+        if self.size <= 0:
+            return None
+        key = self.key(text, table_name, index_version, output_format)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, text, table_name, index_version, result, output_format="html"):
+        """Legt ein Ergebnis von run_posting_pipeline ab."""
+        if self.size <= 0 or not result:
+            return
+        key = self.key(text, table_name, index_version, output_format)
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {"entries": entries, "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+def load_warmup_cases(history_file=None, cases_file=None, limit=None):
+    """
+    Eingaben für die Vorwärmung: zuerst die jüngsten Einträge der Historie, dann die Standard-Geschäftsfälle,
+    ohne Dubletten (normalisiert) und ohne Trennzeilen der Historie ("--- ... --->").
+
+    Args:
+        history_file (str, optional): Eingabehistorie (JSON-Liste).
+        cases_file (str, optional): Standard-Geschäftsfälle (Standard: DPA_WARMUP_CASES).
+        limit (int, optional): Höchstzahl (Standard: DPA_WARMUP_LIMIT).
+
+    Returns:
+        list: Eingabetexte.
+    """
+    cases_file = cases_file or os.getenv("DPA_WARMUP_CASES")
+    limit = int(os.getenv("DPA_WARMUP_LIMIT", "100")) if limit is None else limit
+    texts = []
+    if history_file and os.path.exists(history_file):
+        with open(history_file, "r", encoding="utf-8") as f:
+            texts.extend(reversed(json.load(f)))
+    if cases_file and os.path.exists(cases_file):
+        with open(cases_file, "r", encoding="utf-8") as f:
+            content = f.read()
+        if content.lstrip().startswith("["):
+            texts.extend(json.loads(content))
+        else:
+            texts.extend(line for line in content.splitlines() if not line.startswith("#"))
+    result, seen = [], set()
+    for text in texts:
+        text = str(text).strip()
+        key = normalize_question(text)
+        if not key or key in seen or (text.startswith("---") and text.endswith(">")):
+            continue
+        seen.add(key)
+        result.append(text)
+    return result[:limit]
+
+
+class WarmupJob:
+    """
+    Führt warm(text) für alle Vorwärm-Eingaben in einem Hintergrund-Thread mit niedriger Priorität aus.
+    """
+
+    def __init__(self, warm, load_cases, delay=None, enabled=None):
+        """
+        Args:
+            warm (callable): warm(text) wärmt die Caches für eine Eingabe vor.
+            load_cases (callable): Liefert die Eingaben des Laufs (z.B. load_warmup_cases).
+            delay (float, optional): Wartezeit vor Beginn (Standard: DPA_WARMUP_DELAY).
+            enabled (bool, optional): Standard: DPA_WARMUP.
+        """
+        self.warm = warm
+        self.load_cases = load_cases
+        self.delay = float(os.getenv("DPA_WARMUP_DELAY", "5")) if delay is None else delay
+        self.enabled = _env_flag("DPA_WARMUP", "true") if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._stop = None
+        self._status = {"state": "idle"}
+
+    def start(self, reason="startup"):
+        """Startet einen neuen Lauf; ein noch laufender wird beendet."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+            stop = self._stop = threading.Event()
+            self._status = {"state": "scheduled", "reason": reason}
+        threading.Thread(target=self._run, args=(stop, reason), name="dpa-warmup", daemon=True).start()
+        return True
+
+    def stop(self):
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+
+    def _update(self, stop, **status):
+        with self._lock:
+            if stop is self._stop:
+                self._status.update(status)
+
+    def _run(self, stop, reason):
+        if stop.wait(self.delay):
+            return
+        start = time.perf_counter()
+        try:
+            cases = self.load_cases()
+        except Exception as e:
+            self._update(stop, state="failed", error=str(e))
+            return
+        self._update(stop, state="running", total=len(cases), done=0, failed=0)
+        done = failed = 0
+        with priority_scope(PRIORITY_BULK):
+            for text in cases:
+                if stop.is_set():
+                    return
+                try:
+                    self.warm(text)
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"Warm-up failed for '{text[:40]}': {e}")
+                self._update(stop, done=done, failed=failed)
+        self._update(stop, state="finished", seconds=round(time.perf_counter() - start, 3))
+        print(f"Warm-up finished ({reason}): {done} inputs, {failed} failed.")
+
+    def status(self):
+        with self._lock:
+            return dict(self._status, enabled=self.enabled)
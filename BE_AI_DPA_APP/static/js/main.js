@@ -36,6 +36,7 @@ $(document).ready(function() {
         
         let inputText = $('#input-text').val().trim();
         if (!inputText) return;
+        clearTimeout(prefetchTimer);
         
         let $sendBtn = $('#send-btn');
         let $outputContainer = $('#output-container');
@@ -67,6 +68,31 @@ $(document).ready(function() {
         });
     });
     
+    // Spekulatives Retrieval: nach einer Tipp-Pause wird die Teileingabe an /prefetch gesendet,
+    // damit beim Absenden Embedding und Dokumentenabruf bereits erledigt sind
+    let prefetchTimer = null;
+    let prefetchRequest = null;
+    let lastPrefetched = '';
+    $('#input-text').on('input', function() {
+        clearTimeout(prefetchTimer);
+        prefetchTimer = setTimeout(function() {
+            let partialText = $('#input-text').val().trim();
+            if (partialText.length < 20 || partialText === lastPrefetched) return;
+            if (prefetchRequest) prefetchRequest.abort();
+            lastPrefetched = partialText;
+            prefetchRequest = $.ajax({
+                url: '/prefetch',
+                method: 'POST',
+                data: {
+                    input_text: partialText
+                },
+                complete: function() {
+                    prefetchRequest = null;
+                }
+            });
+        }, 600);
+    });
+    
     // Historie-Einträge klickbar machen
     $(document).on('click', '.history-item', function() {
         let text = $(this).text();